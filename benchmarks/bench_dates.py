@@ -0,0 +1,73 @@
+"""Benchmark the vectorized date parser against the original two-step date path.
+
+Old path: clean_date() per row in the extractor, then pd.to_datetime(format='mixed')
+in the cleaner. New path: date_parsing.parse_date_column() on the raw API strings.
+
+    python benchmarks/bench_dates.py [rows]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_pipeline'))
+import date_parsing  # noqa: E402
+
+def old_clean_date(date_str):
+    """clean_date() as it was in clinicaltrials_extract.py"""
+    if not date_str:
+        return ""
+    try:
+        return datetime.strptime(date_str, "%B %d, %Y").strftime("%Y-%m-%d")
+    except:
+        try:
+            return datetime.strptime(date_str, "%B %Y").strftime("%Y-%m")
+        except:
+            return date_str
+
+def make_dates(rows, seed=42):
+    """Random mix of the date shapes the API returns, plus blanks"""
+    rng = random.Random(seed)
+    shapes = ["%Y-%m-%d", "%Y-%m", "%B %d, %Y", "%B %Y"]
+    values = []
+    for _ in range(rows):
+        if rng.random() < 0.05:
+            values.append("")
+            continue
+        day = date(1995, 1, 1) + timedelta(days=rng.randrange(12000))
+        values.append(day.strftime(rng.choice(shapes)))
+    return values
+
+def old_path(values):
+    cleaned = pd.Series([old_clean_date(v) for v in values]).astype(str)
+    cleaned = cleaned.replace('', pd.NaT)
+    return pd.to_datetime(cleaned, errors='coerce', format='mixed')
+
+def new_path(values):
+    return date_parsing.parse_date_column(pd.Series(values))
+
+def best_of(func, values, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(values)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    values = make_dates(rows)
+
+    old_time, old_dates = best_of(old_path, values)
+    new_time, (new_dates, month_only) = best_of(new_path, values)
+
+    mismatches = int((old_dates.fillna(pd.Timestamp(0)) != new_dates.fillna(pd.Timestamp(0))).sum())
+    print(f"Rows: {rows:,}")
+    print(f"Old path (clean_date + format='mixed'): {old_time:.3f}s")
+    print(f"New path (parse_date_column):          {new_time:.3f}s")
+    print(f"Speedup: {old_time / new_time:.1f}x")
+    print(f"Month-only values flagged: {int(month_only.sum()):,}")
+    print(f"Different parsed dates: {mismatches}")
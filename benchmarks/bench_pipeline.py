@@ -0,0 +1,235 @@
+"""Time and memory-profile every pipeline step on synthetic data and compare with a baseline.
+
+Starts the stub API with N synthetic studies, then runs in a scratch directory:
+extract, each cleaner of Clean_files.py, the MySQL prep (null normalization and the
+*_mysql_ready files) and the import. Every step runs in its own process, so its
+peak RSS is its own. The import goes to a scratch SQLite file unless --mysql is
+given (then the db.ini / DB_* settings are used, and the tables must be empty).
+
+    python benchmarks/bench_pipeline.py [--studies 10000|100000|1000000] [--concurrency 4]
+                                        [--baseline benchmarks/baseline.json] [--save-baseline]
+                                        [--tolerance 0.25] [--mysql] [--keep]
+
+Exits with 1 when a step is slower or bigger than its baseline by more than the tolerance.
+The peak RSS is only compared when the baseline was recorded with the same Python and
+library versions: importing pyarrow alone adds about 35 MB to every step.
+"""
+import argparse
+import importlib.metadata
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import stub_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_DIR = os.path.join(HERE, '..', 'data_pipeline')
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+
+# Steps shorter than this are too noisy to flag as regressions
+MIN_SECONDS = 0.5
+
+# Libraries whose versions (or absence) change the peak RSS of the steps
+TRACKED_LIBRARIES = ['pandas', 'numpy', 'pyarrow']
+
+# Every step prints one "BENCH {json}" line with the seconds of its measured part
+PRELUDE = """
+import json, time
+def report(seconds, rows):
+    print("BENCH " + json.dumps({'seconds': seconds, 'rows': rows}))
+"""
+
+CLEANERS = {
+    'trials': 'clean_trials_data',
+    'locations': 'clean_locations_data',
+    'conditions': 'clean_conditions_data',
+    'interventions': 'clean_interventions_data',
+}
+
+# The pipeline modules import requests and pandas on first use, so every step
+# imports what it needs up front to keep import time out of the measured part
+STEPS = {
+    'extract': """
+import requests
+import clinicaltrials_extract
+start = time.perf_counter()
+if not clinicaltrials_extract.run_extract():
+    raise SystemExit("extract failed")
+elapsed = time.perf_counter() - start
+if clinicaltrials_extract.table_io.active_format() == 'parquet':
+    import pyarrow.parquet as pq
+    report(elapsed, pq.ParquetFile('trials.parquet').metadata.num_rows)
+else:
+    report(elapsed, sum(1 for _ in open('trials.csv', encoding='utf-8')) - 1)
+""",
+    **{f'clean_{table}': f"""
+import pandas
+import Clean_files
+start = time.perf_counter()
+df = Clean_files.{cleaner}()
+elapsed = time.perf_counter() - start
+# Handed to the prep step, outside the measured part
+df.to_pickle('{table}_cleaned.pkl')
+report(elapsed, len(df))
+""" for table, cleaner in CLEANERS.items()},
+    'prepare': f"""
+import pandas as pd
+import table_io
+frames = {{table: pd.read_pickle(f'{{table}}_cleaned.pkl') for table in {list(CLEANERS)!r}}}
+start = time.perf_counter()
+for table, df in frames.items():
+    table_io.write_table(table_io.normalize_nulls(df), table, 'mysql_ready')
+report(time.perf_counter() - start, sum(len(df) for df in frames.values()))
+""",
+    'import': """
+import pandas
+import SQL3
+start = time.perf_counter()
+if not SQL3.import_mysql_ready_files():
+    raise SystemExit("import failed")
+elapsed = time.perf_counter() - start
+report(elapsed, sum(len(SQL3.read_table(table)) for table in SQL3.TABLES))
+""",
+}
+
+def run_step(name, workdir, env):
+    """Run one step in a child process and return {'seconds', 'rows', 'peak_rss_mb'}"""
+    log_path = os.path.join(workdir, f"{name}.log")
+    with open(log_path, 'w', encoding='utf-8') as log:
+        proc = subprocess.Popen([sys.executable, '-c', PRELUDE + STEPS[name]], cwd=workdir, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        peak_rss_mb = None
+        if hasattr(os, 'wait4'):
+            # wait4 returns the resource usage of exactly this child
+            _, status, usage = os.wait4(proc.pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+            scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+            peak_rss_mb = round(usage.ru_maxrss / scale, 1)
+        else:
+            returncode = proc.wait()
+
+    with open(log_path, encoding='utf-8') as log:
+        lines = log.read().splitlines()
+    reports = [line for line in lines if line.startswith('BENCH ')]
+    if returncode != 0 or not reports:
+        tail = '\n'.join(lines[-20:])
+        raise RuntimeError(f"step {name} failed (exit code {returncode}), last output:\n{tail}")
+
+    result = json.loads(reports[-1][len('BENCH '):])
+    result['seconds'] = round(result['seconds'], 3)
+    result['peak_rss_mb'] = peak_rss_mb
+    return result
+
+def step_env(api_url, workdir, concurrency, use_mysql):
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': os.path.abspath(PIPELINE_DIR),
+        'CT_API_URL': api_url,
+        'CT_CONCURRENCY': str(concurrency),
+        # The stub has no rate limit to respect
+        'CT_REQUESTS_PER_SECOND': '100000',
+        'CT_CACHE_DIR': '',
+        'CT_INCREMENTAL': '0',
+        'PIPELINE_METRICS_FILE': '',
+        'PIPELINE_PROFILE_DIR': '',
+    })
+    if not use_mysql:
+        env.update({'DB_BACKEND': 'sqlite', 'DB_DATABASE': os.path.join(workdir, 'bench.sqlite')})
+    return env
+
+def library_versions():
+    """Python and TRACKED_LIBRARIES versions of this environment (None when not installed)"""
+    versions = {'python': platform.python_version()}
+    for name in TRACKED_LIBRARIES:
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+def version_changes(recorded, current):
+    """'name recorded -> current' for every version that differs from the baseline's"""
+    if recorded is None:
+        return ['the baseline has no recorded versions']
+    return [f"{name} {recorded.get(name) or 'missing'} -> {version or 'missing'}"
+            for name, version in current.items() if recorded.get(name) != version]
+
+def compare(results, baseline, tolerance, check_rss=True):
+    """Print each step next to its baseline and return the names of regressed steps"""
+    regressions = []
+    print(f"\n{'step':<22}{'seconds':>10}{'baseline':>10}{'change':>9}{'peak MB':>10}{'baseline':>10}{'rows':>12}")
+    for name, result in results.items():
+        before = (baseline or {}).get(name)
+        line = f"{name:<22}{result['seconds']:>10.2f}"
+        if before:
+            change = result['seconds'] / max(before['seconds'], 1e-9) - 1
+            line += f"{before['seconds']:>10.2f}{change * 100:>+8.0f}%"
+            slower = change > tolerance and result['seconds'] - before['seconds'] > MIN_SECONDS
+            bigger = (check_rss and result['peak_rss_mb'] and before.get('peak_rss_mb')
+                      and result['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance))
+            if slower or bigger:
+                regressions.append(name)
+        else:
+            line += f"{'-':>10}{'':>9}"
+        line += f"{result['peak_rss_mb'] or 0:>10.0f}"
+        line += f"{before['peak_rss_mb'] or 0:>10.0f}" if before else f"{'-':>10}"
+        line += f"{result['rows']:>12,}"
+        print(line + ("  <-- regression" if name in regressions else ""))
+    return regressions
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic studies")
+    parser.add_argument("--studies", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=1, help="CT_CONCURRENCY for the extract")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown / growth (0.25 = 25%%)")
+    parser.add_argument("--mysql", action="store_true", help="import into the configured MySQL database")
+    parser.add_argument("--workdir", help="scratch directory (default: a new temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ct_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    server, api_url = stub_server.start_in_background(args.studies, args.seed)
+    print(f"Benchmarking {args.studies:,} synthetic studies in {workdir}")
+
+    results = {}
+    try:
+        env = step_env(api_url, workdir, args.concurrency, args.mysql)
+        for name in STEPS:
+            print(f"▶️  {name}...", flush=True)
+            results[name] = run_step(name, workdir, env)
+    finally:
+        server.shutdown()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baselines = load_baselines(args.baseline)
+    key = str(args.studies)
+    versions = library_versions()
+    changes = version_changes(baselines[key].get('versions'), versions) if key in baselines else []
+    if changes and not args.save_baseline:
+        print(f"\n⚠️  Peak RSS not compared, the environment differs from the baseline: {'; '.join(changes)}")
+    regressions = compare(results, baselines.get(key, {}).get('steps'), args.tolerance, check_rss=not changes)
+
+    if args.save_baseline:
+        baselines[key] = {'versions': versions, 'machine': platform.platform(),
+                          'concurrency': args.concurrency, 'steps': results}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"\nBaseline for {args.studies:,} studies saved to {args.baseline}")
+    elif regressions:
+        print(f"\n❌ Regressions against the baseline: {', '.join(regressions)}")
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""Benchmark the study projection against the original per-study row builder.
+
+Old path: json.loads() of the page, then study_to_rows() per study and writerow() per
+row. New path: study_projection.decode_json() (orjson when installed), project() of the
+whole page into column buffers and writerows() per table. Both write to in-memory CSVs,
+which must come out identical.
+
+    python benchmarks/bench_projection.py [pages] [page_size]
+"""
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+import synthetic_data
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_pipeline'))
+import study_projection  # noqa: E402
+from date_parsing import normalize_date_text  # noqa: E402
+
+TABLES = list(study_projection.table_headers())
+
+def old_study_to_rows(study):
+    """study_to_rows() as it was in clinicaltrials_extract.py"""
+    protocol = study.get("protocolSection", {})
+    ident_module = protocol.get("identificationModule", {})
+    nct_id = ident_module.get("nctId", "")
+    if not nct_id:
+        return None
+
+    status_module = protocol.get("statusModule", {})
+    design_module = protocol.get("designModule", {})
+    sponsors_module = protocol.get("sponsorCollaboratorsModule") or protocol.get("sponsorsCollaboratorsModule", {})
+    conditions_module = protocol.get("conditionsModule", {})
+    arms_interventions_module = protocol.get("armsInterventionsModule", {})
+    contacts_locations_module = protocol.get("contactsLocationsModule", {})
+
+    if isinstance(design_module.get("enrollmentInfo"), dict):
+        enrollment = design_module["enrollmentInfo"].get("count", "")
+    else:
+        enrollment = status_module.get("enrollment", "")
+        enrollment = enrollment.get("count", "") if isinstance(enrollment, dict) else enrollment
+
+    phases = design_module.get("phases", [])
+    trial_row = [
+        nct_id,
+        ident_module.get("briefTitle", ""),
+        status_module.get("overallStatus", ""),
+        phases[0] if phases else "",
+        design_module.get("studyType", ""),
+        sponsors_module.get("leadSponsor", {}).get("name", "") if sponsors_module.get("leadSponsor") else "",
+        normalize_date_text(status_module.get("startDateStruct", {}).get("date", "")),
+        normalize_date_text(status_module.get("primaryCompletionDateStruct", {}).get("date", "")),
+        enrollment
+    ]
+    location_rows = [[nct_id, location.get("country", ""), location.get("state", ""),
+                      location.get("city", ""), location.get("facility", "")]
+                     for location in contacts_locations_module.get("locations", [])]
+    condition_rows = [[nct_id, condition] for condition in conditions_module.get("conditions", [])]
+    intervention_rows = [[nct_id, intervention.get("type", ""), intervention.get("name", "")]
+                         for intervention in arms_interventions_module.get("interventions", [])]
+    return trial_row, location_rows, condition_rows, intervention_rows
+
+def new_outputs():
+    buffers = {table: io.StringIO() for table in TABLES}
+    return buffers, {table: csv.writer(buffer) for table, buffer in buffers.items()}
+
+def old_path(payloads, write=True):
+    buffers, writers = new_outputs()
+    seen = set()
+    for payload in payloads:
+        for study in json.loads(payload)["studies"]:
+            rows = old_study_to_rows(study)
+            if rows is None or rows[0][0] in seen:
+                continue
+            seen.add(rows[0][0])
+            if write:
+                writers["trials"].writerow(rows[0])
+                for table, table_rows in zip(TABLES[1:], rows[1:]):
+                    writers[table].writerows(table_rows)
+    return buffers
+
+def new_path(payloads, write=True):
+    # Start from a cold date cache, as a fresh extract would
+    study_projection.CONVERTERS['normalize_date_text'].cache_clear()
+    buffers, writers = new_outputs()
+    seen = set()
+    for payload in payloads:
+        columns = study_projection.new_columns()
+        study_projection.project(study_projection.decode_json(payload)["studies"], seen, columns)
+        if write:
+            for table, writer in writers.items():
+                writer.writerows(study_projection.column_rows(columns, table))
+    return buffers
+
+def old_transform(pages):
+    return [old_study_to_rows(study) for studies in pages for study in studies]
+
+def new_transform(pages):
+    study_projection.CONVERTERS['normalize_date_text'].cache_clear()
+    seen = set()
+    for studies in pages:
+        study_projection.project(studies, seen, study_projection.new_columns())
+
+def time_transform(func, pages, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(pages)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def best_of(func, payloads, write=True, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(payloads, write)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    payloads = [json.dumps({'studies': synthetic_data.study_page(pages * page_size, page_size, page * page_size)[0]})
+                .encode('utf-8') for page in range(pages)]
+
+    decoded = [json.loads(payload)["studies"] for payload in payloads]
+    old_projection = time_transform(old_transform, decoded)
+    new_projection = time_transform(new_transform, decoded)
+    old_decoded, _ = best_of(old_path, payloads, write=False)
+    new_decoded, _ = best_of(new_path, payloads, write=False)
+    old_time, old_buffers = best_of(old_path, payloads)
+    new_time, new_buffers = best_of(new_path, payloads)
+
+    different = [table for table in TABLES if old_buffers[table].getvalue() != new_buffers[table].getvalue()]
+    rows = sum(buffer.getvalue().count('\n') for buffer in new_buffers.values())
+    print(f"Pages: {pages} x {page_size} studies, {sum(map(len, payloads)) / 1e6:.1f} MB of JSON, {rows:,} CSV rows")
+    print(f"JSON decoder: {'orjson' if study_projection.orjson else 'json'}")
+    print(f"{'':<34}{'old':>10}{'new':>10}{'speedup':>9}")
+    for label, before, after in [("transform (ms/page)", old_projection, new_projection),
+                                 ("decode + transform (ms/page)", old_decoded, new_decoded),
+                                 ("decode + transform + CSV (ms/page)", old_time, new_time)]:
+        print(f"{label:<34}{before / pages * 1000:>10.1f}{after / pages * 1000:>10.1f}{before / after:>8.1f}x")
+    print(f"Tables with different output: {', '.join(different) or 'none'}")
@@ -0,0 +1,264 @@
+"""Benchmark representative dashboard queries on the original and the redesigned schema.
+
+Copies the data of an already imported database into two scratch databases, one with
+the original single-column indexes and one built by schema.py, then times the same
+queries on both and prints the speedup.
+
+    python benchmarks/bench_queries.py [--source clinical_trials] [--layout flat|lookup]
+                                       [--partition] [--repeat 5]
+
+Connection settings come from the pipeline's db.ini / DB_* variables (see db.py).
+With DB_BACKEND=sqlite the source is a SQLite file (an import with the SQLite
+backend, or embedded_db.py with EMBEDDED_ENGINE=sqlite) and the scratch databases
+are files next to it; only the flat layout exists there.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_pipeline'))
+import db  # noqa: E402
+import embedded_db  # noqa: E402
+import schema  # noqa: E402
+
+# The four tables exactly as the original SQL_script.sql created them
+BASELINE_DDL = [
+    """CREATE TABLE trials (
+        nct_id VARCHAR(20) PRIMARY KEY, title TEXT, status VARCHAR(50), phase VARCHAR(20),
+        study_type VARCHAR(50), sponsor VARCHAR(255) DEFAULT 'Unknown', start_date DATE,
+        completion_date DATE, enrollment INT DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_status (status), INDEX idx_phase (phase), INDEX idx_study_type (study_type),
+        INDEX idx_start_date (start_date))""",
+    """CREATE TABLE locations (
+        location_id INT AUTO_INCREMENT PRIMARY KEY, nct_id VARCHAR(20), country VARCHAR(100),
+        state VARCHAR(100), city VARCHAR(100), facility VARCHAR(255),
+        FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE,
+        INDEX idx_country (country), INDEX idx_state (state), INDEX idx_nct_id (nct_id))""",
+    """CREATE TABLE conditions (
+        condition_id INT AUTO_INCREMENT PRIMARY KEY, nct_id VARCHAR(20), condition_name VARCHAR(255),
+        FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE,
+        INDEX idx_condition (condition_name), INDEX idx_nct_id (nct_id))""",
+    """CREATE TABLE interventions (
+        intervention_id INT AUTO_INCREMENT PRIMARY KEY, nct_id VARCHAR(20), intervention_type VARCHAR(100),
+        intervention_name VARCHAR(255),
+        FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE,
+        INDEX idx_type (intervention_type), INDEX idx_nct_id (nct_id))""",
+]
+
+# The same tables and indexes in SQLite, where indexes are separate statements with
+# database-wide names
+SQLITE_BASELINE_DDL = [
+    """CREATE TABLE trials (
+        nct_id VARCHAR(20) PRIMARY KEY, title TEXT, status VARCHAR(50), phase VARCHAR(20),
+        study_type VARCHAR(50), sponsor VARCHAR(255) DEFAULT 'Unknown', start_date DATE,
+        completion_date DATE, enrollment INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE locations (
+        location_id INTEGER PRIMARY KEY, nct_id VARCHAR(20) REFERENCES trials(nct_id) ON DELETE CASCADE,
+        country VARCHAR(100), state VARCHAR(100), city VARCHAR(100), facility VARCHAR(255))""",
+    """CREATE TABLE conditions (
+        condition_id INTEGER PRIMARY KEY, nct_id VARCHAR(20) REFERENCES trials(nct_id) ON DELETE CASCADE,
+        condition_name VARCHAR(255))""",
+    """CREATE TABLE interventions (
+        intervention_id INTEGER PRIMARY KEY, nct_id VARCHAR(20) REFERENCES trials(nct_id) ON DELETE CASCADE,
+        intervention_type VARCHAR(100), intervention_name VARCHAR(255))""",
+]
+SQLITE_BASELINE_INDEXES = [
+    "CREATE INDEX idx_status ON trials (status)",
+    "CREATE INDEX idx_phase ON trials (phase)",
+    "CREATE INDEX idx_study_type ON trials (study_type)",
+    "CREATE INDEX idx_start_date ON trials (start_date)",
+    "CREATE INDEX idx_country ON locations (country)",
+    "CREATE INDEX idx_state ON locations (state)",
+    "CREATE INDEX idx_locations_nct_id ON locations (nct_id)",
+    "CREATE INDEX idx_condition ON conditions (condition_name)",
+    "CREATE INDEX idx_conditions_nct_id ON conditions (nct_id)",
+    "CREATE INDEX idx_type ON interventions (intervention_type)",
+    "CREATE INDEX idx_interventions_nct_id ON interventions (nct_id)",
+]
+
+# Columns copied from the source database (present in every schema version)
+COPY_COLUMNS = {
+    'trials': ['nct_id', 'title', 'status', 'phase', 'study_type', 'sponsor',
+               'start_date', 'completion_date', 'enrollment'],
+    'locations': ['nct_id', 'country', 'state', 'city', 'facility'],
+    'conditions': ['nct_id', 'condition_name'],
+    'interventions': ['nct_id', 'intervention_type', 'intervention_name'],
+}
+
+# Date functions of the queries in each backend's SQL
+SQL_FUNCTIONS = {
+    'mysql': {'year': "YEAR(start_date)", 'days': "DATEDIFF(completion_date, start_date)",
+              'today': "CURDATE()"},
+    'sqlite': {'year': "strftime('%Y', start_date)", 'days': "julianday(completion_date) - julianday(start_date)",
+               'today': "date('now')"},
+}
+
+# What the Executive Summary, Geographic Analysis and Medical Insights pages ask for
+QUERIES = {
+    'trials by status': """
+        SELECT status, COUNT(*) FROM trials GROUP BY status""",
+    'trials by phase and status': """
+        SELECT phase, status, COUNT(*) FROM trials GROUP BY phase, status""",
+    'trials by start year': """
+        SELECT {year}, COUNT(*) FROM trials
+        WHERE start_date >= '2000-01-01' GROUP BY {year}""",
+    'avg duration of completed trials': """
+        SELECT AVG({days}) FROM trials
+        WHERE status = 'Completed' AND start_date >= '2000-01-01' AND completion_date <= {today}""",
+    'top 10 conditions': """
+        SELECT condition_name, COUNT(DISTINCT nct_id) AS n FROM conditions
+        GROUP BY condition_name ORDER BY n DESC LIMIT 10""",
+    'countries of active trials': """
+        SELECT l.country, COUNT(DISTINCT l.nct_id) FROM locations l
+        JOIN trials t ON t.nct_id = l.nct_id
+        WHERE t.status IN ('Recruiting', 'Active') GROUP BY l.country""",
+    'conditions vs phases (completed)': """
+        SELECT c.condition_name, t.phase, COUNT(*) FROM conditions c
+        JOIN trials t ON t.nct_id = c.nct_id
+        WHERE t.status = 'Completed' GROUP BY c.condition_name, t.phase""",
+    'interventions by phase': """
+        SELECT i.intervention_type, t.phase, COUNT(DISTINCT i.nct_id) FROM interventions i
+        JOIN trials t ON t.nct_id = i.nct_id GROUP BY i.intervention_type, t.phase""",
+}
+
+def backend_queries(backend):
+    return {label: sql.format(**SQL_FUNCTIONS[backend]) for label, sql in QUERIES.items()}
+
+def build_database(cursor, name, ddl, source, child_statements, layout='flat'):
+    """Create a scratch database from DDL and copy the source data into it"""
+    cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+    cursor.execute(f"CREATE DATABASE {name}")
+    cursor.execute(f"USE {name}")
+    for statement in ddl:
+        cursor.execute(statement)
+
+    for table, columns in COPY_COLUMNS.items():
+        start = time.perf_counter()
+        for statement in child_statements(table, f"{source}.{table}", columns):
+            cursor.execute(statement)
+        print(f"  {name}.{table}: copied in {time.perf_counter() - start:.1f}s")
+
+    cursor.execute("ANALYZE TABLE " + ", ".join(schema.physical_table(t, layout) for t in COPY_COLUMNS))
+    cursor.fetchall()
+
+def build_sqlite_database(path, ddl, indexes, source):
+    """Create a scratch SQLite file from DDL, copy the source file's data into it and index it"""
+    if os.path.exists(path):
+        os.remove(path)
+    connection = db.connect(path, {**db.load_config(), 'backend': 'sqlite'})
+    for statement in ddl:
+        connection.execute(statement)
+
+    connection.execute("ATTACH DATABASE ? AS source", [source])
+    for table, columns in COPY_COLUMNS.items():
+        start = time.perf_counter()
+        column_list = ', '.join(columns)
+        connection.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM source.{table}")
+        print(f"  {os.path.basename(path)}.{table}: copied in {time.perf_counter() - start:.1f}s")
+    connection.commit()
+    connection.execute("DETACH DATABASE source")
+
+    # Indexing once after the copy is faster than maintaining the indexes per row
+    for statement in indexes:
+        connection.execute(statement)
+    connection.execute("ANALYZE")
+    connection.commit()
+    return connection
+
+def time_queries(cursors, queries, repeat):
+    """Median wall time in milliseconds of every query on every cursor, after one warm-up run.
+
+    The databases take turns on every run, so a change in the machine's load hits
+    all of them alike. Returns one {query: ms} per cursor.
+    """
+    results = [{} for _ in cursors]
+    for label, sql in queries.items():
+        timings = [[] for _ in cursors]
+        for run in range(repeat + 1):
+            for cursor, cursor_timings in zip(cursors, timings):
+                start = time.perf_counter()
+                cursor.execute(sql)
+                cursor.fetchall()
+                if run:
+                    cursor_timings.append((time.perf_counter() - start) * 1000)
+        for result, cursor_timings in zip(results, timings):
+            result[label] = statistics.median(cursor_timings)
+    return results
+
+def flat_insert(table, source, columns):
+    column_list = ', '.join(columns)
+    return [f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {source}"]
+
+def benchmark_mysql(args):
+    baseline_db = "ct_bench_baseline"
+    redesign_db = "ct_bench_redesign_names" if args.layout == "lookup" else "ct_bench_redesign"
+    queries = backend_queries('mysql')
+
+    # No default database: the benchmark creates and switches between its own
+    connection = db.connect(database='')
+    cursor = connection.cursor()
+    try:
+        print(f"Building benchmark databases from {args.source}...")
+        build_database(cursor, baseline_db, BASELINE_DDL, args.source, flat_insert)
+        build_database(cursor, redesign_db, schema.build_schema(args.layout, args.partition), args.source,
+                       lambda table, source, columns: schema.child_insert_statements(table, source, columns, args.layout),
+                       args.layout)
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+    connections = [db.connect(database=name) for name in (baseline_db, redesign_db)]
+    try:
+        return time_queries([connection.cursor() for connection in connections], queries, args.repeat)
+    finally:
+        for connection in connections:
+            connection.close()
+
+def benchmark_sqlite(args):
+    if args.layout != "flat" or args.partition:
+        raise SystemExit("SQLite only has the flat layout, without partitions")
+    source = os.path.abspath(args.source)
+    if not os.path.exists(source):
+        raise SystemExit(f"{source} does not exist, import into it with DB_BACKEND=sqlite first")
+    queries = backend_queries('sqlite')
+    folder = os.path.dirname(source)
+
+    print(f"Building benchmark databases from {source}...")
+    connections = []
+    try:
+        for name, ddl, indexes in [
+            ("ct_bench_baseline.sqlite", SQLITE_BASELINE_DDL, SQLITE_BASELINE_INDEXES),
+            ("ct_bench_redesign.sqlite", embedded_db.create_statements('sqlite'),
+             embedded_db.index_statements('sqlite')),
+        ]:
+            connections.append(build_sqlite_database(os.path.join(folder, name), ddl, indexes, source))
+        return time_queries([connection.cursor() for connection in connections], queries, args.repeat)
+    finally:
+        for connection in connections:
+            connection.close()
+
+if __name__ == "__main__":
+    config = db.load_config()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default=config['database'],
+                        help="database with imported data (a file path with DB_BACKEND=sqlite)")
+    parser.add_argument("--layout", default="flat", choices=["flat", "lookup"])
+    parser.add_argument("--partition", action="store_true", help="partition trials by start year")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        if config['backend'] == 'sqlite':
+            baseline, redesign = benchmark_sqlite(args)
+        else:
+            baseline, redesign = benchmark_mysql(args)
+    except db.DB_ERRORS as e:
+        raise SystemExit(f"❌ {e}")
+
+    print(f"\n{'query':<36}{'baseline ms':>12}{'redesign ms':>13}{'speedup':>9}")
+    for label in QUERIES:
+        print(f"{label:<36}{baseline[label]:>12.1f}{redesign[label]:>13.1f}"
+              f"{baseline[label] / max(redesign[label], 1e-9):>8.1f}x")
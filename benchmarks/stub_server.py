@@ -0,0 +1,77 @@
+"""Local HTTP stub of the ClinicalTrials.gov v2 /studies endpoint serving synthetic studies.
+
+Supports pageSize, pageToken and filter.overallStatus (so the concurrent extract can slice
+by status). Other query parameters are accepted and ignored.
+
+    python benchmarks/stub_server.py --studies 100000 --port 8000
+    CT_API_URL=http://127.0.0.1:8000/api/v2/studies python data_pipeline/clinicaltrials_extract.py
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import synthetic_data
+
+class StudiesHandler(BaseHTTPRequestHandler):
+    # Set on the server class by make_server
+    total = 0
+    seed = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/api/v2/studies':
+            self.send_error(404)
+            return
+
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            page_size = min(int(params.get('pageSize', 10)), 1000)
+            start = int(params.get('pageToken', 0))
+        except ValueError:
+            self.send_error(400, "Bad pageSize or pageToken")
+            return
+
+        studies, next_start = synthetic_data.study_page(self.total, page_size, start,
+                                                        params.get('filter.overallStatus'), self.seed)
+        body = {'studies': studies}
+        if next_start is not None:
+            body['nextPageToken'] = str(next_start)
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(studies, seed=0, host='127.0.0.1', port=0):
+    """HTTP server for `studies` synthetic studies (port 0 = any free port)"""
+    handler = type('Handler', (StudiesHandler,), {'total': studies, 'seed': seed})
+    return ThreadingHTTPServer((host, port), handler)
+
+def start_in_background(studies, seed=0):
+    """Start a stub on a free port in a daemon thread, returning (server, api_url)"""
+    server = make_server(studies, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/api/v2/studies"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--studies", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = make_server(args.studies, args.seed, args.host, args.port)
+    print(f"Serving {args.studies:,} synthetic studies on http://{args.host}:{args.port}/api/v2/studies")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
\ No newline at end of file
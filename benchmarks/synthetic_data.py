@@ -0,0 +1,160 @@
+"""Deterministic synthetic ClinicalTrials.gov API v2 studies for benchmarks.
+
+Study i is generated from (seed, i) alone, so any page of a 1M-study data set can be
+produced on demand without holding the others in memory. The values are messy the way
+the registry is: country and phase spellings vary, names carry stray whitespace and
+case differences, dates come as YYYY-MM-DD, YYYY-MM and the older "Month D, YYYY" /
+"Month YYYY" text, and some fields are missing.
+
+    python benchmarks/synthetic_data.py 3     # print three studies
+"""
+import json
+import random
+import sys
+
+# overallStatus values with rough registry frequencies
+STATUSES = [
+    ('COMPLETED', 40), ('RECRUITING', 15), ('UNKNOWN', 12), ('TERMINATED', 7),
+    ('ACTIVE_NOT_RECRUITING', 7), ('NOT_YET_RECRUITING', 5), ('WITHDRAWN', 5),
+    ('ENROLLING_BY_INVITATION', 2), ('SUSPENDED', 1), ('AVAILABLE', 1),
+    ('NO_LONGER_AVAILABLE', 1), ('TEMPORARILY_NOT_AVAILABLE', 1), ('APPROVED_FOR_MARKETING', 1),
+    ('WITHHELD', 2),
+]
+STATUS_TABLE = [status for status, weight in STATUSES for _ in range(weight)]
+
+PHASES = [[], ['EARLY_PHASE1'], ['PHASE1'], ['PHASE1', 'PHASE2'], ['PHASE2'], ['PHASE2', 'PHASE3'],
+          ['PHASE3'], ['PHASE4'], ['NA']]
+
+STUDY_TYPES = ['INTERVENTIONAL'] * 7 + ['OBSERVATIONAL'] * 2 + ['EXPANDED_ACCESS']
+
+# (country spellings, states, cities)
+COUNTRIES = [
+    (['United States', 'USA', 'US', 'United States of America'],
+     ['California', 'Texas', 'New York', 'Massachusetts', 'Florida', 'Ohio'],
+     ['Boston', 'Houston', 'New York', 'Los Angeles', 'Cleveland', 'Miami', 'San Francisco']),
+    (['United Kingdom', 'UK', 'Great Britain'], ['England', 'Scotland'], ['London', 'Manchester', 'Glasgow']),
+    (['Germany'], [''], ['Berlin', 'Munich', 'Heidelberg', 'Hamburg']),
+    (['France'], [''], ['Paris', 'Lyon', 'Marseille']),
+    (['China', "People's Republic of China"], ['Beijing', 'Shanghai', 'Guangdong'], ['Beijing', 'Shanghai', 'Guangzhou']),
+    (['Canada'], ['Ontario', 'Quebec', 'British Columbia'], ['Toronto', 'Montreal', 'Vancouver']),
+    (['Japan'], [''], ['Tokyo', 'Osaka']),
+    (['Spain'], [''], ['Madrid', 'Barcelona']),
+    (['Italy'], [''], ['Milan', 'Rome']),
+    (['Korea, Republic of', 'South Korea'], [''], ['Seoul']),
+]
+
+FACILITY_KINDS = ['University Hospital', 'Medical Center', 'Cancer Center', 'Research Site',
+                  'Clinical Research Institute', 'General Hospital']
+
+CONDITIONS = ['Melanoma', 'Non-Small Cell Lung Cancer', 'NSCLC', 'Breast Cancer', 'Colorectal Cancer',
+              'Prostate Cancer', 'Renal Cell Carcinoma', 'Hepatocellular Carcinoma', 'Glioblastoma',
+              'Lymphoma', 'Multiple Myeloma', 'Head and Neck Squamous Cell Carcinoma', 'Bladder Cancer',
+              'Ovarian Cancer', 'Pancreatic Cancer', 'Gastric Cancer', 'Leukemia', 'Solid Tumor']
+
+INTERVENTIONS = [
+    ('DRUG', ['Pembrolizumab', 'Nivolumab', 'Ipilimumab', 'Atezolizumab', 'Durvalumab', 'Cemiplimab',
+              'Carboplatin', 'Paclitaxel', 'Placebo']),
+    ('BIOLOGICAL', ['CAR-T Cells', 'Dendritic Cell Vaccine', 'Oncolytic Virus', 'Tumor Infiltrating Lymphocytes']),
+    ('RADIATION', ['Stereotactic Body Radiation Therapy', 'Radiotherapy']),
+    ('PROCEDURE', ['Surgery', 'Biopsy']),
+    ('OTHER', ['Laboratory Biomarker Analysis', 'Quality-of-Life Assessment']),
+    ('DEVICE', ['Tumor Treating Fields']),
+]
+
+SPONSORS = ['Merck Sharp & Dohme LLC', 'Bristol-Myers Squibb', 'National Cancer Institute (NCI)',
+            'M.D. Anderson Cancer Center', 'Memorial Sloan Kettering Cancer Center', 'Hoffmann-La Roche',
+            'AstraZeneca', 'Regeneron Pharmaceuticals', 'Dana-Farber Cancer Institute', 'Sun Yat-sen University']
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
+          'October', 'November', 'December']
+
+def status_of(i, seed=0):
+    """Status of study i, cheap enough for the stub to filter slices by scanning indices"""
+    return STATUS_TABLE[((i + seed * 7919) * 2654435761 >> 7) % len(STATUS_TABLE)]
+
+def messy(rng, name):
+    """Occasional stray whitespace and case differences, as typed into the registry"""
+    roll = rng.random()
+    if roll < 0.05:
+        return f"  {name} "
+    if roll < 0.08:
+        return name.upper()
+    if roll < 0.11:
+        return name.lower()
+    return name
+
+def date_text(rng, year, month, day):
+    shape = rng.random()
+    if shape < 0.55:
+        return f"{year}-{month:02d}-{day:02d}"
+    if shape < 0.85:
+        return f"{year}-{month:02d}"
+    if shape < 0.95:
+        return f"{MONTHS[month - 1]} {day}, {year}"
+    return f"{MONTHS[month - 1]} {year}"
+
+def make_study(i, seed=0):
+    """One v2-shaped study with the modules the extractor reads"""
+    rng = random.Random(seed * 1_000_003 + i)
+    protocol = {
+        'identificationModule': {'nctId': f"NCT{i:08d}",
+                                 'briefTitle': f"Study {i} of {rng.choice(INTERVENTIONS[0][1])} in "
+                                               f"{rng.choice(CONDITIONS)}"},
+        'statusModule': {'overallStatus': status_of(i, seed)},
+        'designModule': {'studyType': rng.choice(STUDY_TYPES), 'phases': rng.choice(PHASES)},
+        'conditionsModule': {'conditions': [messy(rng, name) for name in
+                                            rng.sample(CONDITIONS, rng.choice([1, 1, 2, 2, 3, 4]))]},
+    }
+
+    status = protocol['statusModule']
+    if rng.random() < 0.97:
+        year, month, day = rng.randint(1998, 2027), rng.randint(1, 12), rng.randint(1, 28)
+        status['startDateStruct'] = {'date': date_text(rng, year, month, day)}
+        if rng.random() < 0.9:
+            end_year = year + rng.randint(0, 6)
+            status['primaryCompletionDateStruct'] = {'date': date_text(rng, end_year, rng.randint(1, 12), day)}
+    if rng.random() < 0.95:
+        protocol['designModule']['enrollmentInfo'] = {'count': int(rng.lognormvariate(4, 1.2)),
+                                                      'type': rng.choice(['ACTUAL', 'ESTIMATED'])}
+    if rng.random() < 0.98:
+        protocol['sponsorCollaboratorsModule'] = {'leadSponsor': {'name': messy(rng, rng.choice(SPONSORS)),
+                                                                  'class': 'INDUSTRY'}}
+
+    interventions = []
+    for _ in range(rng.choice([0, 1, 1, 2, 2, 3, 5])):
+        kind, names = rng.choice(INTERVENTIONS)
+        interventions.append({'type': kind, 'name': messy(rng, rng.choice(names))})
+    if interventions:
+        protocol['armsInterventionsModule'] = {'interventions': interventions}
+
+    # Long tail: most studies have a handful of sites, some large trials have hundreds
+    site_count = int(min(rng.paretovariate(0.8), 500))
+    locations = []
+    for _ in range(site_count):
+        spellings, states, cities = rng.choice(COUNTRIES)
+        city = rng.choice(cities)
+        location = {'facility': messy(rng, f"{city} {rng.choice(FACILITY_KINDS)}"),
+                    'city': messy(rng, city), 'country': rng.choice(spellings)}
+        state = rng.choice(states)
+        if state:
+            location['state'] = state
+        locations.append(location)
+    if locations:
+        protocol['contactsLocationsModule'] = {'locations': locations}
+
+    return {'protocolSection': protocol}
+
+def study_page(total, page_size, start=0, status_filter=None, seed=0):
+    """(studies, next start index or None) for one page, optionally only the given statuses"""
+    statuses = set(status_filter.split(',')) if status_filter else None
+    studies = []
+    i = start
+    while i < total and len(studies) < page_size:
+        if statuses is None or status_of(i, seed) in statuses:
+            studies.append(make_study(i, seed))
+        i += 1
+    return studies, (i if i < total else None)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    print(json.dumps({'studies': study_page(count, count)[0]}, indent=2))
\ No newline at end of file
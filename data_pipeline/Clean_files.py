@@ -1,11 +1,114 @@
-import pandas as pd
-import numpy as np
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import os
 import re
+import time
+
+import date_parsing
+import entity_resolution
+import metrics
+import table_io
+import taxonomy
+from lazy_imports import lazy_import
+from name_cache import NameCache
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# Worker processes for the cleaning runner (1 = run everything in this process)
+CLEAN_WORKERS = int(os.environ.get("CLEAN_WORKERS", str(os.cpu_count() or 1)))
+
+# Rows per chunk for the bounded-memory locations/conditions mode (0 = load whole files)
+CLEAN_CHUNK_ROWS = int(os.environ.get("CLEAN_CHUNK_ROWS", "0"))
+
+# Low-cardinality columns loaded as categoricals: their normalization runs once per
+# distinct value instead of once per row
+CATEGORY_COLUMNS = {
+    'trials': ['status', 'phase', 'study_type'],
+    'locations': ['country', 'state'],
+    'conditions': [],
+    'interventions': ['intervention_type']
+}
+
+# Facilities are only compared with facilities in the same place
+FACILITY_BLOCK_COLUMNS = ['country', 'city']
+
+# Canonical facility/city/sponsor/intervention names, persisted between runs
+name_cache = NameCache()
+
+def raw_input_path(table):
+    """Raw extract file the cleaners read: the Parquet output when there is one, else the CSV"""
+    parquet_file = table_io.table_path(table, fmt='parquet')
+    if table_io.active_format() == 'parquet' and os.path.exists(parquet_file):
+        return parquet_file
+    return table_io.table_path(table, fmt='csv')
+
+def as_csv_frame(df, table):
+    """Give a block of the Parquet extract output the dtypes read_csv would have given it"""
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS[table]:
+            df[col] = df[col].astype('category')
+        elif df[col].dtype == object:
+            # None -> NaN, so astype(str) still gives 'nan' for missing values
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def read_raw_table(table):
+    """Read a raw extract table with its low-cardinality columns as categoricals"""
+    path = raw_input_path(table)
+    if path.endswith('.parquet'):
+        # Typed columns straight from the extract blocks, no text parsing
+        df = as_csv_frame(pd.read_parquet(path, memory_map=True), table)
+    else:
+        df = pd.read_csv(path, dtype={col: 'category' for col in CATEGORY_COLUMNS[table]})
+    metrics.current().read_file(path)
+    metrics.current().add('rows_in', len(df))
+    return df
+
+def read_raw_chunks(table, chunk_rows):
+    """Yield a raw extract table in DataFrames of chunk_rows rows"""
+    path = raw_input_path(table)
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_rows):
+            yield as_csv_frame(batch.to_pandas(), table)
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows,
+                               dtype={col: 'category' for col in CATEGORY_COLUMNS[table]})
+
+def map_categories(series, normalize):
+    """Apply a string normalization to the distinct values of a column and broadcast it back.
+
+    normalize receives a small Series of distinct values (plus 'nan' standing in for
+    missing values, as astype(str) would give) and must return one value for each.
+    Values that normalize to the same result are merged into one category.
+    """
+    categorical = series.astype('category')
+    categories = categorical.cat.categories
+    distinct = pd.Series(list(categories.astype(str)) + ['nan'])
+    normalized = normalize(distinct).to_numpy(dtype=object)
+
+    # Missing values have code -1, point them at the trailing 'nan' entry
+    codes = categorical.cat.codes.to_numpy()
+    codes = np.where(codes == -1, len(categories), codes)
+
+    new_codes, new_categories = pd.factorize(normalized, use_na_sentinel=True)
+    result = pd.Categorical.from_codes(new_codes[codes], categories=new_categories)
+    return pd.Series(result, index=series.index, name=series.name)
+
+def memory_report(name, df_before, df_after):
+    """Print deep memory use of a table as loaded and after cleaning"""
+    before_mb = df_before.memory_usage(deep=True).sum() / 1024 ** 2
+    after_mb = df_after.memory_usage(deep=True).sum() / 1024 ** 2
+    as_object_mb = df_after.astype({col: object for col in df_after.columns
+                                    if isinstance(df_after[col].dtype, pd.CategoricalDtype)}
+                                   ).memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"{name} memory: {before_mb:.1f} MB loaded -> {after_mb:.1f} MB cleaned "
+          f"({as_object_mb:.1f} MB with plain string columns)")
 
 def clean_trials_data():
     """Clean and structure trials data"""
-    df = pd.read_csv('trials.csv')
+    df = read_raw_table('trials')
     
     print("Trials data shape:", df.shape)
     print("\nMissing values:")
@@ -20,13 +123,8 @@ def clean_trials_data():
     df_clean['nct_id'] = df_clean['nct_id'].astype(str).str.strip().str.upper()
     
     # Clean text fields - only apply string operations to string columns
-    text_columns = ['title', 'status', 'phase', 'study_type', 'sponsor']
-    for col in text_columns:
-        if col in df_clean.columns:
-            # Convert to string first, then clean
-            df_clean[col] = df_clean[col].astype(str).str.strip()
-            if col != 'phase':  # Don't apply title case to phase yet
-                df_clean[col] = df_clean[col].str.title()
+    df_clean['title'] = df_clean['title'].astype(str).str.strip().str.title()
+    df_clean['sponsor'] = name_cache.canonicalize(df_clean['sponsor'], 'sponsor', lambda v: v.str.strip().str.title())
     
     # Handle missing values
     print("\nBefore cleaning - Missing values:")
@@ -43,7 +141,9 @@ def clean_trials_data():
         'nan': 'N/A',
         '': 'N/A'
     }
-    df_clean['phase'] = df_clean['phase'].str.lower().replace(phase_mapping).fillna('N/A')
+    df_clean['phase'] = map_categories(
+        df_clean['phase'], lambda v: v.str.strip().str.lower().replace(phase_mapping).fillna('N/A'))
+    df_clean['study_type'] = map_categories(df_clean['study_type'], lambda v: v.str.strip().str.title())
     
     # Clean enrollment - convert to numeric
     df_clean['enrollment'] = pd.to_numeric(df_clean['enrollment'], errors='coerce')
@@ -61,16 +161,13 @@ def clean_trials_data():
         'enrolling by invitation': 'Recruiting',
         'active': 'Active'
     }
-    df_clean['status'] = df_clean['status'].str.lower().replace(status_mapping)
+    df_clean['status'] = map_categories(
+        df_clean['status'], lambda v: v.str.strip().str.lower().replace(status_mapping))
     
-    # Date cleaning - handle different date formats
+    # Date cleaning - one explicit format per date shape, month-only values are flagged
     date_columns = ['start_date', 'completion_date']
     for col in date_columns:
-        # First convert to string, then to datetime
-        df_clean[col] = df_clean[col].astype(str)
-        # Replace empty strings with NaT
-        df_clean[col] = df_clean[col].replace('nan', pd.NaT)
-        df_clean[col] = pd.to_datetime(df_clean[col], errors='coerce', format='mixed')
+        df_clean[col], df_clean[f'{col}_month_only'] = date_parsing.parse_date_column(df_clean[col])
     
     # Handle sponsor column (completely missing)
     df_clean['sponsor'] = df_clean['sponsor'].replace('nan', 'Unknown')
@@ -78,15 +175,19 @@ def clean_trials_data():
     # Remove duplicates
     df_clean = df_clean.drop_duplicates(subset=['nct_id'])
     
+    # Spelling variants of one sponsor share a sponsor_id and its most common spelling
+    df_clean = entity_resolution.resolve_entities(df_clean, 'sponsor', [], 'sponsor', 'sponsor_id', prefix_block=True)
+    
     print(f"\nAfter cleaning - Missing values:")
     print(df_clean.isnull().sum())
     print(f"\nCleaned trials data: {df_clean.shape}")
+    memory_report("Trials", df, df_clean)
     
     return df_clean
 
 def clean_locations_data():
     """Clean and structure locations data"""
-    df = pd.read_csv('locations.csv')
+    df = read_raw_table('locations')
     
     print("Locations data shape:", df.shape)
     print("\nMissing values:")
@@ -94,16 +195,24 @@ def clean_locations_data():
     print("\nData types:")
     print(df.dtypes)
     
+    df_clean = resolve_facilities(normalize_locations(df))
+    
+    print(f"\nCleaned locations data: {df_clean.shape}")
+    memory_report("Locations", df, df_clean)
+    return df_clean
+
+def normalize_locations(df):
+    """Normalize location strings and drop rows without location; works on any chunk of rows"""
     df_clean = df.copy()
     
     # Clean NCT ID
     df_clean['nct_id'] = df_clean['nct_id'].astype(str).str.strip().str.upper()
     
-    # Clean location fields - convert to string first
-    location_columns = ['country', 'state', 'city', 'facility']
+    # Clean location fields - each distinct name is normalized once through the name cache
+    location_columns = ['city', 'facility']
     for col in location_columns:
         if col in df_clean.columns:
-            df_clean[col] = df_clean[col].astype(str).str.strip().str.title()
+            df_clean[col] = name_cache.canonicalize(df_clean[col], col, lambda v: v.str.strip().str.title())
     
     # Standardize country names
     country_mapping = {
@@ -114,18 +223,23 @@ def clean_locations_data():
         'Uk': 'UK',
         'Nan': 'Unknown'
     }
-    df_clean['country'] = df_clean['country'].replace(country_mapping)
+    df_clean['country'] = map_categories(
+        df_clean['country'], lambda v: v.str.strip().str.title().replace(country_mapping))
+    df_clean['state'] = map_categories(df_clean['state'], lambda v: v.str.strip().str.title())
     
     # Remove rows with no location information
     df_clean = df_clean[~(df_clean['country'].isin(['Unknown', 'Nan']) & 
                          df_clean['city'].isin(['Unknown', 'Nan']))]
     
-    print(f"\nCleaned locations data: {df_clean.shape}")
     return df_clean
 
+def resolve_facilities(df):
+    """Give spelling variants of one facility in the same country and city a shared facility_id"""
+    return entity_resolution.resolve_entities(df, 'facility', FACILITY_BLOCK_COLUMNS, 'facility', 'facility_id')
+
 def clean_conditions_data():
     """Clean and structure conditions data"""
-    df = pd.read_csv('conditions.csv')
+    df = read_raw_table('conditions')
     
     print("Conditions data shape:", df.shape)
     print("\nMissing values:")
@@ -133,6 +247,17 @@ def clean_conditions_data():
     print("\nData types:")
     print(df.dtypes)
     
+    df_clean = normalize_conditions(df)
+    
+    # Remove duplicates (same condition for same trial)
+    df_clean = df_clean.drop_duplicates()
+    
+    print(f"\nCleaned conditions data: {df_clean.shape}")
+    memory_report("Conditions", df, df_clean)
+    return df_clean
+
+def normalize_conditions(df):
+    """Normalize condition names and drop empty ones; works on any chunk of rows"""
     df_clean = df.copy()
     
     # Clean NCT ID
@@ -145,15 +270,14 @@ def clean_conditions_data():
     df_clean = df_clean[df_clean['condition'] != '']
     df_clean = df_clean[df_clean['condition'] != 'Nan']
     
-    # Remove duplicates (same condition for same trial)
-    df_clean = df_clean.drop_duplicates()
+    # Tag each condition with its taxonomy category ("Nsclc" -> Non-Small Cell Lung Cancer)
+    df_clean['condition_category'] = taxonomy.classify(df_clean['condition'], 'conditions')
     
-    print(f"\nCleaned conditions data: {df_clean.shape}")
     return df_clean
 
 def clean_interventions_data():
     """Clean and structure interventions data"""
-    df = pd.read_csv('interventions.csv')
+    df = read_raw_table('interventions')
     
     print("Interventions data shape:", df.shape)
     print("\nMissing values:")
@@ -167,8 +291,8 @@ def clean_interventions_data():
     df_clean['nct_id'] = df_clean['nct_id'].astype(str).str.strip().str.upper()
     
     # Clean intervention fields
-    df_clean['intervention_type'] = df_clean['intervention_type'].astype(str).str.strip().str.title()
-    df_clean['intervention_name'] = df_clean['intervention_name'].astype(str).str.strip().str.title()
+    df_clean['intervention_name'] = name_cache.canonicalize(
+        df_clean['intervention_name'], 'intervention_name', lambda v: v.str.strip().str.title())
     
     # Standardize intervention types
     type_mapping = {
@@ -182,7 +306,8 @@ def clean_interventions_data():
         'Other': 'Other',
         'Nan': 'Unknown'
     }
-    df_clean['intervention_type'] = df_clean['intervention_type'].replace(type_mapping)
+    df_clean['intervention_type'] = map_categories(
+        df_clean['intervention_type'], lambda v: v.str.strip().str.title().replace(type_mapping))
     
     # Remove empty interventions
     df_clean = df_clean[~(df_clean['intervention_name'].isin(['', 'Nan']))]
@@ -190,39 +315,219 @@ def clean_interventions_data():
     # Remove duplicates
     df_clean = df_clean.drop_duplicates()
     
+    # Tag each intervention with its taxonomy category (Pembrolizumab -> PD-1 Inhibitor)
+    df_clean['intervention_category'] = taxonomy.classify(df_clean['intervention_name'], 'interventions')
+    
     print(f"\nCleaned interventions data: {df_clean.shape}")
+    memory_report("Interventions", df, df_clean)
     return df_clean
 
-# Run cleaning functions
-print("=== CLEANING TRIALS DATA ===")
-trials_clean = clean_trials_data()
+def write_taxonomy_table():
+    """Write the taxonomy_categories lookup (one row per category) and return the file name"""
+    return table_io.write_table(taxonomy.lookup_table(), 'taxonomy_categories', 'mysql_ready')
+
+class FingerprintSet:
+    """Compact set of 64-bit row fingerprints for de-duplicating across chunks.
+
+    Fingerprints are kept in a few sorted uint64 arrays (8 bytes per row instead of a
+    Python object per row) that are merged once there are too many of them.
+    """
+
+    def __init__(self, max_runs=8):
+        self.runs = []
+        self.max_runs = max_runs
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, fingerprints):
+        """Boolean array telling which fingerprints were already added"""
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for run in self.runs:
+            positions = np.searchsorted(run, fingerprints).clip(max=len(run) - 1)
+            found |= run[positions] == fingerprints
+        return found
+
+    def add(self, fingerprints):
+        if len(fingerprints):
+            self.runs.append(np.unique(fingerprints))
+        if len(self.runs) > self.max_runs:
+            self.runs = [np.unique(np.concatenate(self.runs))]
+
+def clean_table_chunked(table, chunk_rows=None):
+    """Clean locations or conditions in fixed-size chunks with bounded memory.
+
+    Each chunk is normalized and written to the MySQL-ready output right away.
+    Conditions are de-duplicated across chunks through a FingerprintSet of row
+    hashes, so no chunk ever has to be compared with the full table. Locations
+    take two passes: the first only adds up the distinct facility names of every
+    chunk for the entity map, the second applies it while writing. Returns the
+    number of rows written.
+    """
+    chunk_rows = chunk_rows or CLEAN_CHUNK_ROWS
+    normalize = {'locations': normalize_locations, 'conditions': normalize_conditions}[table]
+    dedupe = table == 'conditions'
+
+    facility_map = None
+    if table == 'locations':
+        counts = None
+        for chunk in read_raw_chunks(table, chunk_rows):
+            chunk_counts = entity_resolution.value_counts(normalize(chunk), 'facility', FACILITY_BLOCK_COLUMNS)
+            counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+        if counts is not None:
+            facility_map = entity_resolution.build_entity_map(counts.astype(np.int64), 'facility')
+            entity_resolution.report('facility', counts, facility_map)
+
+    seen = FingerprintSet()
+    writer = table_io.ChunkWriter(table, 'mysql_ready')
+    rows_in = rows_out = 0
+
+    for chunk in read_raw_chunks(table, chunk_rows):
+        rows_in += len(chunk)
+        df_clean = normalize(chunk)
+        if facility_map is not None:
+            df_clean = entity_resolution.apply_entity_map(df_clean, 'facility', FACILITY_BLOCK_COLUMNS,
+                                                          facility_map, 'facility_id')
+
+        if dedupe:
+            fingerprints = pd.util.hash_pandas_object(df_clean, index=False).to_numpy()
+            keep = ~(pd.Series(fingerprints).duplicated().to_numpy() | seen.contains(fingerprints))
+            df_clean = df_clean[keep]
+            seen.add(fingerprints[keep])
+
+        writer.write(table_io.normalize_nulls(df_clean))
+        rows_out += len(df_clean)
+
+    writer.close()
+    metrics.current().read_file(raw_input_path(table))
+    metrics.current().wrote_file(writer.path)
+    metrics.current().add('rows_in', rows_in)
+    print(f"Cleaned {table} data in chunks of {chunk_rows:,}: {rows_in:,} -> {rows_out:,} rows")
+    return rows_out
+
+def timed_call(stage_name, func, *args):
+    """Run func in a worker as a metrics stage and return (result, seconds spent in it)"""
+    start = time.perf_counter()
+    with metrics.stage(stage_name) as stage_metrics:
+        if args and isinstance(args[0], pd.DataFrame):
+            # A chunk handed over by the parent process
+            stage_metrics.add('rows_in', len(args[0]))
+        result = func(*args)
+        stage_metrics.set('rows_out', len(result) if isinstance(result, pd.DataFrame) else result)
+        # Persist the names this process learned before handing the result back
+        name_cache.save()
+    return result, time.perf_counter() - start
+
+def run_cleaning(workers=CLEAN_WORKERS, chunk_rows=CLEAN_CHUNK_ROWS):
+    """Run the four cleaners on a process pool and return {table: cleaned DataFrame}.
+
+    trials and interventions are cleaned as whole tables. locations and conditions
+    are split into one chunk per worker so their string normalization spreads over
+    all cores; conditions are de-duplicated and facilities resolved after the
+    chunks are joined.
+    With chunk_rows set, locations and conditions are instead streamed to their
+    output files by clean_table_chunked and their entry is the written row count.
+    """
+    results = {}
+    timings = {}
+    overall_start = time.perf_counter()
+
+    cleaners = [('trials', clean_trials_data), ('locations', clean_locations_data),
+                ('conditions', clean_conditions_data), ('interventions', clean_interventions_data)]
+    if chunk_rows:
+        cleaners[1] = ('locations', lambda: clean_table_chunked('locations', chunk_rows))
+        cleaners[2] = ('conditions', lambda: clean_table_chunked('conditions', chunk_rows))
+
+    if workers <= 1:
+        for name, cleaner in cleaners:
+            print(f"\n=== CLEANING {name.upper()} DATA ===")
+            results[name], timings[name] = timed_call(f"clean.{name}", cleaner)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                'trials': executor.submit(timed_call, "clean.trials", clean_trials_data),
+                'interventions': executor.submit(timed_call, "clean.interventions", clean_interventions_data)
+            }
+            if chunk_rows:
+                # Streaming is sequential within a file, so each file gets one worker
+                for name in ('locations', 'conditions'):
+                    futures[name] = executor.submit(timed_call, f"clean.{name}", clean_table_chunked, name, chunk_rows)
+
+            chunk_futures = {}
+            for name, normalize in [('locations', normalize_locations), ('conditions', normalize_conditions)]:
+                if chunk_rows:
+                    break
+                df = read_raw_table(name)
+                print(f"{name.title()} data shape: {df.shape} -> {workers} chunks")
+                chunk_size = -(-len(df) // workers)
+                chunks = [df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size)]
+                chunk_futures[name] = [executor.submit(timed_call, f"clean.{name}.chunk{number}", normalize, chunk)
+                                       for number, chunk in enumerate(chunks)]
+
+            for name, future in futures.items():
+                results[name], timings[name] = future.result()
+
+            for name, chunk_list in chunk_futures.items():
+                chunk_results = [f.result() for f in chunk_list]
+                df_clean = pd.concat([chunk for chunk, _ in chunk_results], ignore_index=True)
+                if name == 'conditions':
+                    # Duplicates can sit in different chunks
+                    df_clean = df_clean.drop_duplicates()
+                else:
+                    # Variants of a facility can sit in different chunks too
+                    df_clean = resolve_facilities(df_clean)
+                print(f"Cleaned {name} data: {df_clean.shape}")
+                results[name] = df_clean
+                # Chunks run side by side, so the slowest one is the stage time
+                timings[name] = max(elapsed for _, elapsed in chunk_results)
+
+    print(f"\n=== CLEANING TIMINGS ({workers} worker{'s' if workers != 1 else ''}) ===")
+    for name, elapsed in timings.items():
+        print(f"{name.title()}: {elapsed:.2f}s")
+    print(f"Total wall clock: {time.perf_counter() - overall_start:.2f}s")
+
+    return {name: results[name] for name, _ in cleaners}
+
+def main():
+    """Clean every raw file, write the MySQL-ready files and print a data quality summary"""
+    with metrics.stage('clean'):
+        results = run_cleaning()
+
+    record_counts = {}
+    with metrics.stage('clean.write') as write_metrics:
+        for table, df_clean in results.items():
+            if not isinstance(df_clean, pd.DataFrame):
+                # Streamed tables were already written chunk by chunk
+                record_counts[table] = df_clean
+                continue
+
+            # NULL normalization happens once here, so the output loads straight into MySQL
+            df_clean = table_io.normalize_nulls(df_clean)
 
-print("\n=== CLEANING LOCATIONS DATA ===")
-locations_clean = clean_locations_data()
+            # Save cleaned data
+            write_metrics.wrote_file(table_io.write_table(df_clean, table, 'mysql_ready'))
+            write_metrics.add('rows_out', df_clean.shape[0])
+            record_counts[table] = df_clean.shape[0]
+            results[table] = df_clean
 
-print("\n=== CLEANING CONDITIONS DATA ===")
-conditions_clean = clean_conditions_data()
+        # Optional lookup of the taxonomy categories and their groups
+        write_metrics.wrote_file(write_taxonomy_table())
 
-print("\n=== CLEANING INTERVENTIONS DATA ===")
-interventions_clean = clean_interventions_data()
+    print("\nCleaned files saved, ready for MySQL import!")
 
-# Save cleaned data
-trials_clean.to_csv('trials_cleaned.csv', index=False)
-locations_clean.to_csv('locations_cleaned.csv', index=False)
-conditions_clean.to_csv('conditions_cleaned.csv', index=False)
-interventions_clean.to_csv('interventions_cleaned.csv', index=False)
+    # Create a summary report
+    print("\n=== DATA QUALITY SUMMARY ===")
+    for table, count in record_counts.items():
+        print(f"{table.title()}: {count} records")
 
-print("\nCleaned files saved!")
+    trials_clean = results['trials']
 
-# Create a summary report
-print("\n=== DATA QUALITY SUMMARY ===")
-print(f"Trials: {trials_clean.shape[0]} records")
-print(f"Locations: {locations_clean.shape[0]} records") 
-print(f"Conditions: {conditions_clean.shape[0]} records")
-print(f"Interventions: {interventions_clean.shape[0]} records")
+    # Check for any remaining issues
+    print("\n=== REMAINING DATA ISSUES ===")
+    print("Trials - Missing sponsor:", trials_clean['sponsor'].isnull().sum())
+    print("Trials - Missing enrollment:", trials_clean['enrollment'].isnull().sum())
+    print("Trials - Missing phase:", (trials_clean['phase'] == 'N/A').sum())
 
-# Check for any remaining issues
-print("\n=== REMAINING DATA ISSUES ===")
-print("Trials - Missing sponsor:", trials_clean['sponsor'].isnull().sum())
-print("Trials - Missing enrollment:", trials_clean['enrollment'].isnull().sum())
-print("Trials - Missing phase:", (trials_clean['phase'] == 'N/A').sum())
\ No newline at end of file
+# Run cleaning functions (the __main__ guard keeps worker processes from re-running this)
+if __name__ == "__main__":
+    main()
\ No newline at end of file
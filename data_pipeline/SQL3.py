@@ -1,134 +1,356 @@
-import pandas as pd
-import mysql.connector
-from mysql.connector import Error
 import os
-import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def create_db_connection():
-    """Create database connection"""
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='Shabhodaf20@mysql',
-            database='clinical_trials'
-        )
-        return connection
-    except Error as e:
-        print(f"Error: {e}")
-        return None
-
-def clean_row_data(row):
-    """Clean row data by replacing 'nan' strings with None"""
-    cleaned_row = []
-    for value in row:
-        if pd.isna(value) or str(value).lower() == 'nan':
-            cleaned_row.append(None)
+import db
+import metrics
+import schema
+import summary_tables
+import table_io
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+# Rows sent per executemany call (mysql-connector turns each call into one multi-row INSERT)
+BATCH_SIZE = int(os.environ.get("SQL_BATCH_SIZE", "5000"))
+
+# 'executemany' (default) or 'load_data' for the LOAD DATA LOCAL INFILE fast path
+IMPORT_METHOD = os.environ.get("SQL_IMPORT_METHOD", "executemany")
+
+# 'insert' (plain INSERT into empty tables) or 'upsert' (staging tables merged into the
+# live tables, safe to re-run on a populated database)
+IMPORT_MODE = os.environ.get("SQL_IMPORT_MODE", "insert")
+
+# Rebuild the dashboard summary tables after the import (0 = skip)
+REFRESH_SUMMARIES = os.environ.get("SQL_REFRESH_SUMMARIES", "1") == "1"
+
+# Table -> (MySQL-ready CSV, columns in insert order)
+TABLES = {
+    'trials': ('trials_mysql_ready.csv', ['nct_id', 'title', 'status', 'phase', 'study_type', 'sponsor',
+                                          'start_date', 'completion_date', 'enrollment',
+                                          'start_date_month_only', 'completion_date_month_only', 'sponsor_id']),
+    'locations': ('locations_mysql_ready.csv', ['nct_id', 'country', 'state', 'city', 'facility', 'facility_id']),
+    'conditions': ('conditions_mysql_ready.csv', ['nct_id', 'condition_name', 'condition_category']),
+    'interventions': ('interventions_mysql_ready.csv', ['nct_id', 'intervention_type', 'intervention_name',
+                                                        'intervention_category'])
+}
+
+# Tables imported only when their file exists; they do not depend on trials and are
+# replaced as a whole on every import
+OPTIONAL_TABLES = {
+    'taxonomy_categories': ('taxonomy_categories_mysql_ready.csv', ['kind', 'category', 'category_group']),
+}
+
+CHILD_TABLES = ['locations', 'conditions', 'interventions']
+
+# Upsert SQL that differs between the backends (SQLite tables always use the flat layout)
+UPSERT_DIALECTS = {
+    'mysql': {
+        'drop_staging': "DROP TEMPORARY TABLE IF EXISTS {table}",
+        'upsert': "ON DUPLICATE KEY UPDATE {updates}",
+        'update': "{col} = s.{col}",
+        'delete_children': "DELETE c FROM {table} AS c JOIN {staged} AS s ON c.nct_id = s.nct_id",
+    },
+    'sqlite': {
+        'drop_staging': "DROP TABLE IF EXISTS temp.{table}",
+        # WHERE true tells the parser the SELECT ends before ON CONFLICT
+        'upsert': "WHERE true ON CONFLICT (nct_id) DO UPDATE SET {updates}",
+        'update': "{col} = excluded.{col}",
+        'delete_children': "DELETE FROM {table} WHERE nct_id IN (SELECT nct_id FROM {staged})",
+    },
+}
+
+def backend_layout(backend):
+    """Schema layout of the live tables on a backend"""
+    return schema.SCHEMA_LAYOUT if backend == 'mysql' else 'flat'
+
+def to_db_values(df):
+    """Convert NaN/NaT/NA to None for the driver (sentinel strings are already gone after cleaning)"""
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+def read_table(table):
+    """Read one MySQL-ready CSV and convert it to insert-ready Python values"""
+    _, columns = {**TABLES, **OPTIONAL_TABLES}[table]
+    df = table_io.read_table(table, 'mysql_ready')
+    df.columns = columns
+
+    if table == 'trials':
+        # Handle date conversion for MySQL
+        df['start_date'] = pd.to_datetime(df['start_date'], errors='coerce').dt.date
+        df['completion_date'] = pd.to_datetime(df['completion_date'], errors='coerce').dt.date
+        df['enrollment'] = pd.to_numeric(df['enrollment'], errors='coerce').round().astype('Int64')
+
+    return to_db_values(df)
+
+def insert_batches(cursor, table, df, batch_size=BATCH_SIZE, placeholder='%s'):
+    """Insert a DataFrame in batches with executemany, returning the row count"""
+    columns = list(df.columns)
+    sql = (f"INSERT INTO {table} ({', '.join(columns)}) "
+           f"VALUES ({', '.join([placeholder] * len(columns))})")
+
+    rows = list(df.itertuples(index=False, name=None))
+    stage_metrics = metrics.current()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        batch_start = time.perf_counter()
+        cursor.executemany(sql, batch)
+        elapsed = time.perf_counter() - batch_start
+        stage_metrics.observe('insert_batch_latency', elapsed)
+        stage_metrics.append('insert_batch_rows_per_sec', round(len(batch) / max(elapsed, 1e-9)))
+    return len(rows)
+
+def load_data_infile(cursor, table, target=None):
+    """Bulk load one MySQL-ready CSV with LOAD DATA LOCAL INFILE, returning the row count"""
+    csv_file, columns = {**TABLES, **OPTIONAL_TABLES}[table]
+    target = target or table
+
+    # Read every field into a user variable so empty fields become NULL
+    variables = ', '.join(f"@{col}" for col in columns)
+    assignments = []
+    for col in columns:
+        value = f"NULLIF(@{col}, '')"
+        if col == 'enrollment':
+            value = f"ROUND({value})"
+        elif col in ('start_date', 'completion_date'):
+            value = f"DATE({value})"
+        elif col.endswith('_month_only'):
+            value = f"(@{col} IN ('True', '1'))"
+        assignments.append(f"{col} = {value}")
+
+    # to_csv doubles embedded quotes and never backslash-escapes, so backslashes are data
+    # (MySQL's default ESCAPED BY '\\' would eat them and shift fields ending in one)
+    line_terminator = table_io.CSV_LINE_TERMINATOR.encode('unicode_escape').decode()
+    cursor.execute(f"""
+        LOAD DATA LOCAL INFILE '{os.path.abspath(csv_file).replace(os.sep, '/')}'
+        INTO TABLE {target}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+        LINES TERMINATED BY '{line_terminator}'
+        IGNORE 1 LINES
+        ({variables})
+        SET {', '.join(assignments)}
+    """)
+    return cursor.rowcount
+
+def staging_name(table):
+    """Name of the per-session staging table for a live table"""
+    return f"stg_{table}"
+
+def create_staging_tables(cursor, tables=TABLES, backend='mysql'):
+    """Create empty temporary staging tables with the flat columns of the files.
+
+    Temporary tables are private to this connection, have no foreign keys, and
+    creating them does not commit the open transaction.
+    """
+    for table in tables:
+        cursor.execute(UPSERT_DIALECTS[backend]['drop_staging'].format(table=staging_name(table)))
+        cursor.execute(schema.staging_table_sql(table, staging_name(table)))
+
+def insert_staged_children(cursor, table, layout=schema.SCHEMA_LAYOUT):
+    """Copy a staged child table into its live table (through the name lookup in the 'lookup' layout)"""
+    count = 0
+    for statement in schema.child_insert_statements(table, staging_name(table), TABLES[table][1], layout):
+        cursor.execute(statement)
+        count = cursor.rowcount
+    return count
+
+def merge_staging_tables(cursor, backend='mysql'):
+    """Merge the staging tables into the live tables with set-based statements.
+
+    trials rows are upserted on nct_id. Child rows of every staged trial are
+    deleted and re-inserted, so a re-run replaces them instead of doubling them.
+    """
+    dialect = UPSERT_DIALECTS[backend]
+    layout = backend_layout(backend)
+    trial_columns = TABLES['trials'][1]
+    updates = ', '.join(dialect['update'].format(col=col) for col in trial_columns if col != 'nct_id')
+    cursor.execute(f"""
+        INSERT INTO trials ({', '.join(trial_columns)})
+        SELECT {', '.join(trial_columns)} FROM {staging_name('trials')} AS s
+        {dialect['upsert'].format(updates=updates)}
+    """)
+    print(f"🔁 Upserted trials ({cursor.rowcount:,} rows affected)")
+
+    for table in ('locations', 'conditions', 'interventions'):
+        cursor.execute(dialect['delete_children'].format(table=schema.physical_table(table, layout),
+                                                         staged=staging_name('trials')))
+        deleted = cursor.rowcount
+        inserted = insert_staged_children(cursor, table, layout)
+        print(f"🔁 Replaced {table}: {deleted:,} old rows -> {inserted:,} new rows")
+
+def load_table(cursor, table, target, placeholder='%s'):
+    """Load one file into target with the configured method, returning (rows, seconds)"""
+    print(f"\n📥 Importing {table} data{' into ' + target if target != table else ''}...")
+    start = time.perf_counter()
+
+    with metrics.stage(f"import.{table}") as stage_metrics:
+        if IMPORT_METHOD == 'load_data':
+            count = load_data_infile(cursor, table, target)
+            stage_metrics.read_file({**TABLES, **OPTIONAL_TABLES}[table][0])
         else:
-            cleaned_row.append(value)
-    return tuple(cleaned_row)
+            count = insert_batches(cursor, target, read_table(table), placeholder=placeholder)
+            stage_metrics.read_file(table_io.table_path(table, 'mysql_ready'))
+        stage_metrics.set('rows_in', count)
+        stage_metrics.set('rows_out', count)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Imported {count:,} {table} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/sec)")
+    return count, elapsed
+
+def load_child_table(pool, table):
+    """Load and commit one child table on its own pooled connection"""
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            # The lookup layout resolves names from a per-connection staging table (MySQL only)
+            staged = pool.backend == 'mysql' and schema.uses_lookup(table)
+            if staged:
+                create_staging_tables(cursor, [table])
+            result = load_table(cursor, table, staging_name(table) if staged else table, pool.placeholder)
+            if staged:
+                insert_staged_children(cursor, table)
+            connection.commit()
+            return result
+        finally:
+            cursor.close()
+
+def load_optional_table(pool, table):
+    """Replace the rows of an optional table with its file, on its own pooled connection"""
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"DELETE FROM {table}")
+            result = load_table(cursor, table, table, pool.placeholder)
+            connection.commit()
+            return result
+        finally:
+            cursor.close()
 
+def mysql_ready_file(table, fmt):
+    """Existing MySQL-ready file of a table (the CSV when a Parquet one is missing), or None"""
+    file = table_io.table_path(table, 'mysql_ready', fmt)
+    if not os.path.exists(file) and fmt == 'parquet':
+        file = table_io.table_path(table, 'mysql_ready', 'csv')
+    return file if os.path.exists(file) else None
+
+def create_sqlite_tables(connection):
+    """Create the tables in a SQLite file (local tests and benchmarks of the import path)"""
+    for table in list(TABLES) + list(OPTIONAL_TABLES):
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({schema.STAGING_COLUMNS[table]})")
+    connection.commit()
+
+@metrics.stage('import')
 def import_mysql_ready_files():
-    """Import MySQL-ready CSV files to MySQL database"""
+    """Import MySQL-ready CSV files to MySQL database.
+
+    In insert mode trials is loaded and committed first, then the three child tables
+    load in parallel, each on its own pooled connection. Upsert mode runs staging,
+    merge and summary refresh on one connection in a single transaction. Optional
+    tables (the taxonomy lookup) are replaced afterwards when their file exists.
+    """
     
+    # LOAD DATA reads the CSV files directly, the executemany path can use Parquet
+    fmt = 'csv' if IMPORT_METHOD == 'load_data' else table_io.PIPELINE_FORMAT
+
     # Check if MySQL-ready files exist with your specific names
-    files_to_check = ['trials_mysql_ready.csv', 'locations_mysql_ready.csv', 
-                     'conditions_mysql_ready.csv', 'interventions_mysql_ready.csv']
-    
-    for file in files_to_check:
-        if not os.path.exists(file):
-            print(f"❌ Missing MySQL-ready file: {file}")
+    for table in TABLES:
+        file = mysql_ready_file(table, fmt)
+        if not file:
+            print(f"❌ Missing MySQL-ready file: {table_io.table_path(table, 'mysql_ready', fmt)}")
             return False
         else:
             print(f"✅ Found: {file}")
+    optional = [table for table in OPTIONAL_TABLES if mysql_ready_file(table, fmt)]
     
-    connection = create_db_connection()
-    if connection is None:
+    try:
+        pool = db.get_pool()
+    except db.DB_ERRORS as e:
+        print(f"Error: {e}")
         return False
-    
-    cursor = connection.cursor()
+
+    upsert = IMPORT_MODE == 'upsert'
+    # LOAD DATA is MySQL-only
+    if pool.backend == 'sqlite' and IMPORT_METHOD == 'load_data':
+        print("❌ The SQLite backend only supports SQL_IMPORT_METHOD=executemany")
+        return False
+
+    stats = {}
     
     try:
-        print("\n📥 Importing trials data...")
-        trials_df = pd.read_csv('trials_mysql_ready.csv')
-        
-        # Handle date conversion for MySQL
-        trials_df['start_date'] = pd.to_datetime(trials_df['start_date'], errors='coerce').dt.date
-        trials_df['completion_date'] = pd.to_datetime(trials_df['completion_date'], errors='coerce').dt.date
-        
-        trials_count = 0
-        for _, row in trials_df.iterrows():
-            cleaned_row = clean_row_data(row)
-            cursor.execute("""
-                INSERT INTO trials (nct_id, title, status, phase, study_type, sponsor, 
-                                  start_date, completion_date, enrollment)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, cleaned_row)
-            trials_count += 1
-        
-        print(f"✅ Imported {trials_count} trials")
-        
-        print("\n📥 Importing locations data...")
-        locations_df = pd.read_csv('locations_mysql_ready.csv')
-        locations_count = 0
-        for _, row in locations_df.iterrows():
-            cleaned_row = clean_row_data(row)
-            cursor.execute("""
-                INSERT INTO locations (nct_id, country, state, city, facility)
-                VALUES (%s, %s, %s, %s, %s)
-            """, cleaned_row)
-            locations_count += 1
-        print(f"✅ Imported {locations_count} locations")
-        
-        print("\n📥 Importing conditions data...")
-        conditions_df = pd.read_csv('conditions_mysql_ready.csv')
-        conditions_count = 0
-        for _, row in conditions_df.iterrows():
-            cleaned_row = clean_row_data(row)
-            cursor.execute("""
-                INSERT INTO conditions (nct_id, condition_name)
-                VALUES (%s, %s)
-            """, cleaned_row)
-            conditions_count += 1
-        print(f"✅ Imported {conditions_count} conditions")
-        
-        print("\n📥 Importing interventions data...")
-        interventions_df = pd.read_csv('interventions_mysql_ready.csv')
-        interventions_count = 0
-        for _, row in interventions_df.iterrows():
-            cleaned_row = clean_row_data(row)
-            cursor.execute("""
-                INSERT INTO interventions (nct_id, intervention_type, intervention_name)
-                VALUES (%s, %s, %s)
-            """, cleaned_row)
-            interventions_count += 1
-        print(f"✅ Imported {interventions_count} interventions")
-        
-        connection.commit()
+        with pool.connection() as connection:
+            if pool.backend == 'sqlite':
+                create_sqlite_tables(connection)
+
+            cursor = connection.cursor()
+            try:
+                if REFRESH_SUMMARIES:
+                    summary_tables.create_summary_tables(cursor)
+
+                if upsert:
+                    create_staging_tables(cursor, backend=pool.backend)
+                    for table in TABLES:
+                        stats[table] = load_table(cursor, table, staging_name(table), pool.placeholder)
+
+                    print("\n🔀 Merging staging tables into live tables...")
+                    if REFRESH_SUMMARIES:
+                        summary_tables.create_affected_key_tables(cursor, pool.backend)
+                        summary_tables.capture_affected_keys(cursor, staging_name('trials'), pool.backend)
+                    merge_staging_tables(cursor, pool.backend)
+
+                    if REFRESH_SUMMARIES:
+                        print("\n📊 Refreshing dashboard summary tables...")
+                        summary_tables.capture_affected_keys(cursor, staging_name('trials'), pool.backend)
+                        summary_tables.refresh_summaries(cursor, incremental=True, backend=pool.backend)
+                else:
+                    # trials first: the other tables reference it through nct_id
+                    stats['trials'] = load_table(cursor, 'trials', 'trials', pool.placeholder)
+
+                # In upsert mode everything above is one transaction: the dashboard sees all of it or nothing
+                connection.commit()
+            finally:
+                cursor.close()
+
+        if not upsert:
+            # Child tables only depend on trials, so they load side by side
+            with ThreadPoolExecutor(max_workers=pool.size) as executor:
+                futures = {table: executor.submit(load_child_table, pool, table) for table in CHILD_TABLES}
+                for table, future in futures.items():
+                    stats[table] = future.result()
+
+            if REFRESH_SUMMARIES:
+                print("\n📊 Refreshing dashboard summary tables...")
+                with pool.connection() as connection:
+                    cursor = connection.cursor()
+                    summary_tables.refresh_summaries(cursor, backend=pool.backend)
+                    connection.commit()
+                    cursor.close()
+
+        for table in optional:
+            stats[table] = load_optional_table(pool, table)
+
         print("\n🎉 All data imported successfully!")
         
         # Print summary
-        print(f"\n📊 IMPORT SUMMARY:")
-        print(f"Trials: {trials_count:,}")
-        print(f"Locations: {locations_count:,}")
-        print(f"Conditions: {conditions_count:,}")
-        print(f"Interventions: {interventions_count:,}")
+        print(f"\n📊 IMPORT SUMMARY ({pool.backend}, {IMPORT_MODE}/{IMPORT_METHOD}, batch size {BATCH_SIZE:,}):")
+        for table, (count, elapsed) in stats.items():
+            print(f"{table.title()}: {count:,} rows, {count / max(elapsed, 1e-9):,.0f} rows/sec")
         
         return True
         
-    except Error as e:
+    except db.DB_ERRORS as e:
         print(f"❌ Error importing data: {e}")
-        connection.rollback()
         return False
-    finally:
-        cursor.close()
-        connection.close()
 
-# Run the import
-if __name__ == "__main__":
+def main():
     print("🚀 Starting MySQL Import with MySQL-Ready Files...")
     success = import_mysql_ready_files()
     if success:
         print("\n✅ Ready for Power BI! You can now connect to your MySQL database.")
     else:
-        print("\n❌ Import failed. Please check the error messages above.")
\ No newline at end of file
+        print("\n❌ Import failed. Please check the error messages above.")
+    return success
+
+# Run the import
+if __name__ == "__main__":
+    main()
\ No newline at end of file
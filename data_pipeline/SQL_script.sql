@@ -1,25 +1,38 @@
 CREATE DATABASE clinical_trials;
 USE clinical_trials;
 
--- Main trials table (adjusted for your data characteristics)
+-- Main trials table: composite indexes match the status/phase/year visuals and cover
+-- the status-filtered joins and durations,
+-- FULLTEXT makes the title searchable
 CREATE TABLE trials (
-    nct_id VARCHAR(20) PRIMARY KEY,
+    nct_id VARCHAR(20) NOT NULL,
     title TEXT,
     status VARCHAR(50),
     phase VARCHAR(20),
     study_type VARCHAR(50),
     sponsor VARCHAR(255) DEFAULT 'Unknown',
+    sponsor_id VARCHAR(16),
     start_date DATE,
     completion_date DATE,
     enrollment INT DEFAULT 0,
+    start_date_month_only BOOLEAN DEFAULT FALSE,
+    completion_date_month_only BOOLEAN DEFAULT FALSE,
+    start_year SMALLINT AS (COALESCE(YEAR(start_date), 0)) STORED NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (nct_id),
+    INDEX idx_status_phase_start (status, phase, start_date),
     INDEX idx_status (status),
-    INDEX idx_phase (phase),
+    INDEX idx_status_nct_phase (status, nct_id, phase),
+    INDEX idx_status_dates (status, start_date, completion_date),
+    INDEX idx_start_status (start_date, status),
+    INDEX idx_phase_status (phase, status),
     INDEX idx_study_type (study_type),
-    INDEX idx_start_date (start_date)
+    INDEX idx_sponsor (sponsor),
+    INDEX idx_sponsor_id (sponsor_id),
+    FULLTEXT INDEX ft_title (title)
 );
 
--- Locations table
+-- Locations table: (nct_id, country) covers the trial -> country join
 CREATE TABLE locations (
     location_id INT AUTO_INCREMENT PRIMARY KEY,
     nct_id VARCHAR(20),
@@ -27,20 +40,24 @@ CREATE TABLE locations (
     state VARCHAR(100),
     city VARCHAR(100),
     facility VARCHAR(255),
-    FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE,
-    INDEX idx_country (country),
-    INDEX idx_state (state),
-    INDEX idx_nct_id (nct_id)
+    facility_id VARCHAR(16),
+    INDEX idx_nct_country (nct_id, country),
+    INDEX idx_country_nct (country, nct_id),
+    INDEX idx_country_state_city (country, state, city),
+    INDEX idx_facility_id (facility_id),
+    FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE
 );
 
--- Conditions table
+-- Conditions table: (nct_id, condition_name) covers the trial -> condition join
 CREATE TABLE conditions (
     condition_id INT AUTO_INCREMENT PRIMARY KEY,
     nct_id VARCHAR(20),
     condition_name VARCHAR(255),
-    FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE,
-    INDEX idx_condition (condition_name),
-    INDEX idx_nct_id (nct_id)
+    condition_category VARCHAR(255),
+    INDEX idx_nct_condition (nct_id, condition_name),
+    INDEX idx_condition_nct (condition_name, nct_id),
+    INDEX idx_condition_category_nct (condition_category, nct_id),
+    FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE
 );
 
 -- Interventions table
@@ -49,7 +66,61 @@ CREATE TABLE interventions (
     nct_id VARCHAR(20),
     intervention_type VARCHAR(100),
     intervention_name VARCHAR(255),
-    FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE,
-    INDEX idx_type (intervention_type),
-    INDEX idx_nct_id (nct_id)
+    intervention_category VARCHAR(255),
+    INDEX idx_nct_type_name (nct_id, intervention_type, intervention_name),
+    INDEX idx_type_nct (intervention_type, nct_id),
+    INDEX idx_name_nct (intervention_name, nct_id),
+    INDEX idx_intervention_category_nct (intervention_category, nct_id),
+    FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE
+);
+
+-- Taxonomy categories of conditions and interventions with their groups (e.g. Oncology),
+-- loaded when Clean_files.py wrote taxonomy_categories_mysql_ready.csv
+CREATE TABLE taxonomy_categories (
+    kind VARCHAR(20) NOT NULL,
+    category VARCHAR(255) NOT NULL,
+    category_group VARCHAR(100),
+    PRIMARY KEY (kind, category)
+);
+
+-- A normalized layout with lookup tables for condition/intervention names and an optional
+-- start-year partitioning of trials can be generated with schema.py, e.g.
+--   python schema.py lookup
+--   SQL_PARTITION_BY_START_DATE=1 python schema.py flat
+
+-- Pre-aggregated tables for the dashboard pages (filled by SQL3.py after every import)
+CREATE TABLE summary_trials (
+    status VARCHAR(50) NOT NULL,
+    phase VARCHAR(20) NOT NULL,
+    start_year INT NOT NULL,
+    trial_count INT NOT NULL,
+    enrollment_sum BIGINT NOT NULL,
+    duration_days_sum BIGINT NOT NULL,
+    duration_count INT NOT NULL,
+    PRIMARY KEY (status, phase, start_year)
+);
+
+CREATE TABLE summary_country (
+    country VARCHAR(100) NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    trial_count INT NOT NULL,
+    location_count INT NOT NULL,
+    PRIMARY KEY (country, status)
+);
+
+CREATE TABLE summary_conditions (
+    condition_name VARCHAR(255) NOT NULL,
+    phase VARCHAR(20) NOT NULL,
+    trial_count INT NOT NULL,
+    enrollment_sum BIGINT NOT NULL,
+    PRIMARY KEY (condition_name, phase)
+);
+
+CREATE TABLE summary_interventions (
+    intervention_type VARCHAR(100) NOT NULL,
+    intervention_name VARCHAR(255) NOT NULL,
+    phase VARCHAR(20) NOT NULL,
+    trial_count INT NOT NULL,
+    enrollment_sum BIGINT NOT NULL,
+    PRIMARY KEY (intervention_type, intervention_name, phase)
 );
\ No newline at end of file
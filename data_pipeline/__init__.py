@@ -0,0 +1,36 @@
+"""ClinicalTrials.gov -> MySQL pipeline.
+
+The modules import each other by their flat names (`import metrics`), so this
+package appends its directory to sys.path and hands out those same module objects:
+`from data_pipeline import Clean_files` is the Clean_files the pipeline uses.
+Appending keeps installed packages with generic names (db, metrics, ...) visible
+to the rest of the program; one that hides a pipeline module is an ImportError.
+Nothing is imported until it is asked for, e.g.
+
+    from data_pipeline import pipeline
+    pipeline.run_clean_stage('conditions')
+
+The command line is `python -m data_pipeline COMMAND` (see cli.py).
+"""
+import importlib
+import os
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+if PACKAGE_DIR not in sys.path:
+    sys.path.append(PACKAGE_DIR)
+
+MODULES = ['Clean_files', 'SQL3', 'cli', 'clinicaltrials_extract', 'date_parsing', 'db', 'embedded_db',
+           'entity_resolution', 'lazy_imports', 'metrics', 'name_cache', 'pipeline', 'response_cache',
+           'schema', 'study_projection', 'summary_tables', 'table_io', 'taxonomy']
+
+def __getattr__(name):
+    if name in MODULES:
+        module = importlib.import_module(name)
+        if os.path.dirname(os.path.abspath(module.__file__)) != PACKAGE_DIR:
+            raise ImportError(f"{module.__file__} hides data_pipeline/{name}.py, rename or uninstall it")
+        return module
+    raise AttributeError(f"module 'data_pipeline' has no attribute '{name}'")
+
+def __dir__():
+    return sorted(list(globals()) + MODULES)
\ No newline at end of file
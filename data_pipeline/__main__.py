@@ -0,0 +1,6 @@
+import sys
+
+from data_pipeline import cli
+
+if __name__ == "__main__":
+    sys.exit(cli.main())
\ No newline at end of file
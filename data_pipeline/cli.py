@@ -0,0 +1,55 @@
+import argparse
+import sys
+
+import pipeline
+
+# Every command imports its module when it runs, so `status` and `--help` never load pandas
+
+def extract(args):
+    import clinicaltrials_extract
+    return 0 if clinicaltrials_extract.run_extract() else 1
+
+def clean(args):
+    import Clean_files
+    Clean_files.main()
+    return 0
+
+def import_files(args):
+    import SQL3
+    return 0 if SQL3.main() else 1
+
+def embedded(args):
+    import embedded_db
+    embedded_db.main()
+    return 0
+
+def status(args):
+    pipeline.plan_pipeline(args.targets, args.force)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="data_pipeline",
+                                     description="ClinicalTrials.gov extract, cleaning and MySQL import")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    commands.add_parser("extract", help="download new and updated studies into the raw files").set_defaults(func=extract)
+    commands.add_parser("clean", help="clean the raw files into MySQL-ready files").set_defaults(func=clean)
+    commands.add_parser("import", help="import the MySQL-ready files into the database").set_defaults(func=import_files)
+    commands.add_parser("embedded", help="build the embedded DuckDB/SQLite database").set_defaults(func=embedded)
+
+    run = commands.add_parser("run", help="bring the pipeline stages up to date, skipping unchanged ones")
+    pipeline.add_arguments(run)
+    run.set_defaults(func=pipeline.main)
+
+    check = commands.add_parser("status", help="show which stages are up to date and which would run")
+    check.add_argument("targets", nargs="*", help="stages to check, with their dependencies (default: all)")
+    check.add_argument("--force", nargs="+", default=[], metavar="STAGE")
+    check.set_defaults(func=status)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -1,108 +1,159 @@
-import requests
 import json
 import csv
 from datetime import datetime
 import time
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# -------------------------------
-# Helper functions
-# -------------------------------
-
-def clean_date(date_str):
-    if not date_str:
-        return ""
-    try:
-        return datetime.strptime(date_str, "%B %d, %Y").strftime("%Y-%m-%d")
-    except:
-        try:
-            return datetime.strptime(date_str, "%B %Y").strftime("%Y-%m")
-        except:
-            return date_str
+import metrics
+import table_io
+from response_cache import ResponseCache
+from study_projection import api_fields, decode_json, new_columns, project, table_headers
+from lazy_imports import lazy_import
 
-def safe_get_first(lst, default=""):
-    """Safely get first element from list or return default"""
-    return lst[0] if lst and len(lst) > 0 else default
+requests = lazy_import('requests')
 
 # -------------------------------
 # CONFIG
 # -------------------------------
 
 BATCH_SIZE = 100
-all_studies = []
 MAX_RETRIES = 3
 
-print("Starting download from ClinicalTrials.gov API...")
+# Point at a local stub server for testing, e.g. CT_API_URL=http://127.0.0.1:8000/api/v2/studies
+base_url = os.environ.get("CT_API_URL", "https://clinicaltrials.gov/api/v2/studies")
+
+# Number of query slices fetched at the same time (1 = plain sequential download)
+CONCURRENCY = int(os.environ.get("CT_CONCURRENCY", "1"))
+
+# Upper bound on requests per second across all workers
+REQUESTS_PER_SECOND = float(os.environ.get("CT_REQUESTS_PER_SECOND", "1"))
+
+# Optional on-disk response cache, e.g. CT_CACHE_DIR=.http_cache (empty = disabled).
+# CT_CACHE_OFFLINE=1 replays the cache only and never touches the network.
+CACHE_DIR = os.environ.get("CT_CACHE_DIR", "")
+CACHE_TTL_HOURS = float(os.environ.get("CT_CACHE_TTL_HOURS", "24"))
+CACHE_MAX_MB = float(os.environ.get("CT_CACHE_MAX_MB", "500"))
+CACHE_OFFLINE = os.environ.get("CT_CACHE_OFFLINE", "0") == "1"
+
+# Buffered rows (all four tables together) written out as one block. The extract goes
+# to CSV, or to Parquet with PIPELINE_FORMAT=parquet; the checkpoint follows the blocks.
+FLUSH_ROWS = int(os.environ.get("CT_FLUSH_ROWS", "20000"))
+
+# Incremental mode: only ask for studies updated since the last successful run
+INCREMENTAL = os.environ.get("CT_INCREMENTAL", "0") == "1"
+CHECKPOINT_FILE = "extract_checkpoint.json"
+
+# Independent slices of the query space for concurrent mode. Every study has exactly
+# one overall status, so the slices never overlap and can paginate in parallel.
+STATUS_SLICES = [
+    "RECRUITING",
+    "NOT_YET_RECRUITING",
+    "ENROLLING_BY_INVITATION",
+    "ACTIVE_NOT_RECRUITING",
+    "COMPLETED",
+    "TERMINATED",
+    "SUSPENDED",
+    "WITHDRAWN",
+    "UNKNOWN",
+    "AVAILABLE,NO_LONGER_AVAILABLE,TEMPORARILY_NOT_AVAILABLE,APPROVED_FOR_MARKETING,WITHHELD"
+]
 
-# -------------------------------
-# API v2 DOWNLOAD LOOP
-# -------------------------------
+# Correct field names for API v2, from the projection that reads them back out
+fields = api_fields()
 
-base_url = "https://clinicaltrials.gov/api/v2/studies"
-next_page_token = None
-total_studies_retrieved = 0
-
-# Correct field names for API v2
-fields = [
-    "NCTId",
-    "BriefTitle",
-    "Condition",
-    "InterventionName",
-    "InterventionType", 
-    "LocationFacility",
-    "LocationCity",
-    "LocationState",
-    "LocationCountry",
-    "Phase",
-    "StudyType",
-    "OverallStatus",
-    "LeadSponsorName",
-    "StartDate",
-    "PrimaryCompletionDate",
-    "EnrollmentCount"
-]
+# Output tables and their CSV headers
+TABLE_HEADERS = table_headers()
 
-while True:
-    # Build the query parameters for API v2
-    params = {
-        'query.term': 'cancer immunotherapy',
-        'fields': ','.join(fields),
-        'pageSize': BATCH_SIZE
-    }
-    
-    # Add page token if we have one (for pagination)
-    if next_page_token:
-        params['pageToken'] = next_page_token
+class FetchError(Exception):
+    """Raised when a page could not be fetched after MAX_RETRIES attempts"""
 
-    print(f"Fetching batch...{' (page: ' + next_page_token + ')' if next_page_token else ''}")
+response_cache = ResponseCache(
+    CACHE_DIR,
+    ttl_seconds=CACHE_TTL_HOURS * 3600,
+    max_bytes=CACHE_MAX_MB * 1024 * 1024,
+    offline=CACHE_OFFLINE
+) if CACHE_DIR else None
+
+# -------------------------------
+# HTTP helpers
+# -------------------------------
+
+class RateLimiter:
+    """Space requests out so that all threads together stay under a requests/second budget"""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_for = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+def create_session(pool_size=CONCURRENCY):
+    """Create a requests session whose connection pool can serve every worker"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept': 'application/json',
+    })
+    return session
+
+def fetch_page(session, params, limiter):
+    """Fetch one page with retries, returning the decoded JSON or None"""
+    if response_cache:
+        cached = response_cache.get(base_url, params)
+        if cached is not None:
+            print("Response served from cache")
+            metrics.current().add('cache_hits')
+            return cached
+        if response_cache.offline:
+            print("Offline mode: page not in cache")
+            return None
 
     retry_count = 0
-    success = False
-    batch_data = None
-    
-    while retry_count < MAX_RETRIES and not success:
+    stage_metrics = metrics.current()
+
+    while retry_count < MAX_RETRIES:
+        if retry_count:
+            stage_metrics.add('http_retries')
+        limiter.wait()
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'application/json',
-            }
-            
-            response = requests.get(base_url, params=params, headers=headers, timeout=30)
-            
+            request_start = time.perf_counter()
+            response = session.get(base_url, params=params, timeout=30)
+            stage_metrics.observe('http_latency', time.perf_counter() - request_start)
+            stage_metrics.add('http_requests')
+            stage_metrics.add('bytes_read', len(response.content))
+
             print(f"Response status code: {response.status_code}")
-            
+
             if response.status_code != 200:
                 print(f"HTTP Error: {response.status_code}")
                 print(f"Response text: {response.text[:500]}")
+                stage_metrics.add('http_errors')
                 retry_count += 1
                 time.sleep(2)
                 continue
-                
-            # Try to parse JSON
-            batch_data = response.json()
-            success = True
-            
+
+            # Try to parse JSON (orjson when installed)
+            batch_data = decode_json(response.content)
+            if response_cache:
+                response_cache.put(base_url, params, batch_data)
+            return batch_data
+
         except requests.exceptions.RequestException as e:
             print(f"Request failed: {e}")
+            stage_metrics.add('http_errors')
             retry_count += 1
             time.sleep(2)
             continue
@@ -113,150 +164,393 @@ while True:
             time.sleep(2)
             continue
 
-    if not success:
-        print(f"Failed to fetch batch after {MAX_RETRIES} retries. Stopping.")
-        break
-
-    # Extract studies from the response
-    studies = batch_data.get("studies", [])
-    
-    if not studies:
-        print("No more data available.")
-        break
-
-    all_studies.extend(studies)
-    total_studies_retrieved += len(studies)
-    print(f"Retrieved {len(studies)} studies in this batch (Total: {total_studies_retrieved})")
+    return None
 
-    # Check for next page token
-    next_page_token = batch_data.get("nextPageToken")
-    
-    if not next_page_token:
-        print("No more pages available.")
-        break
-
-    time.sleep(1)  # Be respectful to the API
+# -------------------------------
+# API v2 DOWNLOAD LOOP
+# -------------------------------
 
-print(f"Total studies downloaded: {len(all_studies)}")
+def fetch_pages(extra_params=None, session=None, limiter=None, start_token=None):
+    """Yield (studies, next_page_token) for each API page as soon as it arrives.
+
+    next_page_token is None on the last page. Pass start_token to resume a
+    pagination that was interrupted.
+    """
+    session = session or create_session(1)
+    limiter = limiter or RateLimiter(REQUESTS_PER_SECOND)
+    next_page_token = start_token
+
+    while True:
+        # Build the query parameters for API v2
+        params = {
+            'query.term': 'cancer immunotherapy',
+            'fields': ','.join(fields),
+            'pageSize': BATCH_SIZE
+        }
+        params.update(extra_params or {})
+
+        # Add page token if we have one (for pagination)
+        if next_page_token:
+            params['pageToken'] = next_page_token
+
+        print(f"Fetching batch...{' (page: ' + next_page_token + ')' if next_page_token else ''}")
+
+        batch_data = fetch_page(session, params, limiter)
+
+        if batch_data is None:
+            raise FetchError(f"Failed to fetch batch after {MAX_RETRIES} retries. Stopping.")
+
+        # Extract studies from the response
+        studies = batch_data.get("studies", [])
+
+        if not studies:
+            print("No more data available.")
+            return
+
+        # Check for next page token
+        next_page_token = batch_data.get("nextPageToken")
+
+        yield studies, next_page_token
+
+        if not next_page_token:
+            print("No more pages available.")
+            return
+
+def fetch_pages_concurrent(slices=STATUS_SLICES, concurrency=CONCURRENCY, extra_params=None):
+    """Paginate every slice in its own worker and yield (studies, None) in arrival order.
+
+    All workers share one pooled session and one rate limiter. Pages are handed over
+    through a bounded queue, so a slow consumer throttles the downloads instead of
+    letting pages pile up in memory. When the consumer stops early (an exception
+    or close()), the workers are told to stop and the queue is drained, so none
+    of them stays blocked on a full queue.
+    """
+    session = create_session(concurrency)
+    limiter = RateLimiter(REQUESTS_PER_SECOND)
+    pages = queue.Queue(maxsize=concurrency * 2)
+    done = object()
+    errors = []
+    stop = threading.Event()
+
+    def hand_over(item):
+        """Queue an item for the consumer, giving up once it has stopped"""
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
 
-# If we got studies, let's inspect one to understand the structure
-if all_studies:
-    print("\nInspecting first study structure...")
-    first_study = all_studies[0]
-    print(json.dumps(first_study, indent=2)[:2000])  # First 2000 chars
+    def fetch_slice(status_filter):
+        try:
+            slice_params = dict(extra_params or {}, **{'filter.overallStatus': status_filter})
+            for studies, _ in fetch_pages(slice_params, session, limiter):
+                if not hand_over((studies, None)):
+                    return
+        except Exception as e:
+            print(f"Slice {status_filter} failed: {e}")
+            errors.append(e)
+        finally:
+            hand_over(done)
 
-# Only proceed if we have data
-if not all_studies:
-    print("No data to process. Exiting.")
-    exit()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for status_filter in slices:
+            executor.submit(fetch_slice, status_filter)
+
+        remaining = len(slices)
+        while remaining:
+            item = pages.get()
+            if item is done:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        stop.set()
+        while True:
+            try:
+                pages.get_nowait()
+            except queue.Empty:
+                break
+        # Workers finish at most the request they are in the middle of
+        executor.shutdown(cancel_futures=True)
+        session.close()
+
+    # A missing slice means the download is incomplete
+    if errors:
+        raise errors[0]
 
 # -------------------------------
-# CSV WRITERS
+# CHECKPOINT / DELTA MERGE
 # -------------------------------
 
-try:
-    trials_file = open("trials.csv", "w", newline="", encoding="utf-8")
-    trials_writer = csv.writer(trials_file)
-    trials_writer.writerow([
-        "nct_id", "title", "status", "phase",
-        "study_type", "sponsor", "start_date",
-        "completion_date", "enrollment"
-    ])
-
-    locations_file = open("locations.csv", "w", newline="", encoding="utf-8")
-    locations_writer = csv.writer(locations_file)
-    locations_writer.writerow(["nct_id", "country", "state", "city", "facility"])
-
-    conditions_file = open("conditions.csv", "w", newline="", encoding="utf-8")
-    conditions_writer = csv.writer(conditions_file)
-    conditions_writer.writerow(["nct_id", "condition"])
+def load_checkpoint():
+    """Load the extract checkpoint, or an empty one if there is none yet"""
+    if not os.path.exists(CHECKPOINT_FILE):
+        return {}
+    with open(CHECKPOINT_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_checkpoint(checkpoint):
+    """Write the checkpoint atomically so a crash never leaves it half-written"""
+    tmp_file = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_file, CHECKPOINT_FILE)
+
+def merge_delta_columnar():
+    """merge_delta_files for the Parquet extract output, with the same rules"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    delta_tables = {table: pq.read_table(table_io.table_path(table, "delta", "parquet")) for table in TABLE_HEADERS}
+    changed_ids = pc.unique(delta_tables["trials"]["nct_id"])
+
+    for table, delta in delta_tables.items():
+        main_file = table_io.table_path(table, fmt="parquet")
+
+        # Unchanged studies keep their existing rows
+        kept = delta.schema.empty_table()
+        if os.path.exists(main_file):
+            main = pq.read_table(main_file, schema=delta.schema)
+            kept = main.filter(pc.invert(pc.is_in(main["nct_id"], value_set=changed_ids)))
+
+        # A page re-fetched after a resume can put a study in the delta twice: keep the
+        # rows of its first fetch, identical rows within that fetch included
+        nct_ids = delta["nct_id"].to_pandas()
+        fetch = (nct_ids != nct_ids.shift()).cumsum()
+        first_fetch = fetch == fetch.groupby(nct_ids).transform("first")
+        fresh = delta.filter(pa.array(first_fetch.to_numpy()))
+
+        pq.write_table(pa.concat_tables([kept, fresh]), main_file + ".tmp")
+        print(f"Merged {table}: {kept.num_rows} unchanged rows + {fresh.num_rows} updated rows")
+
+    replace_merged_files("parquet")
+
+def replace_merged_files(fmt):
+    """Swap in the merged files only once every table is merged.
+
+    The delta files stay until the run is marked complete, and merging the same
+    deltas twice gives the same tables, so a crash anywhere in the merge is
+    repaired by re-running the extract.
+    """
+    for table in TABLE_HEADERS:
+        main_file = table_io.table_path(table, fmt=fmt)
+        os.replace(main_file + ".tmp", main_file)
+
+def remove_delta_files(fmt):
+    for table in TABLE_HEADERS:
+        delta_file = table_io.table_path(table, "delta", fmt)
+        if os.path.exists(delta_file):
+            os.remove(delta_file)
+
+def merge_delta_files():
+    """Replace the rows of every changed study in the main CSVs with the delta rows"""
+    with open("trials_delta.csv", newline="", encoding="utf-8") as f:
+        changed_ids = {row[0] for row in csv.reader(f) if row}
+    changed_ids.discard("nct_id")
+
+    for table, header in TABLE_HEADERS.items():
+        main_file = f"{table}.csv"
+        delta_file = f"{table}_delta.csv"
+        tmp_file = main_file + ".tmp"
+
+        kept = 0
+        with open(tmp_file, "w", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out)
+            writer.writerow(header)
+
+            # Unchanged studies keep their existing rows
+            if os.path.exists(main_file):
+                with open(main_file, newline="", encoding="utf-8") as f:
+                    reader = csv.reader(f)
+                    next(reader, None)
+                    for row in reader:
+                        if row and row[0] not in changed_ids:
+                            writer.writerow(row)
+                            kept += 1
+
+            # Changed studies get their fresh rows. A page re-fetched after a resume can
+            # put a study in the delta twice, and the rows of one fetch are consecutive:
+            # keep the first fetch of each study, identical rows within it included.
+            updated = 0
+            fetched, current, skip = set(), None, False
+            with open(delta_file, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                for row in reader:
+                    if not row:
+                        continue
+                    if row[0] != current:
+                        current = row[0]
+                        skip = current in fetched
+                        fetched.add(current)
+                    if not skip:
+                        writer.writerow(row)
+                        updated += 1
+
+        print(f"Merged {table}: {kept} unchanged rows + {updated} updated rows")
+
+    replace_merged_files("csv")
 
-    interventions_file = open("interventions.csv", "w", newline="", encoding="utf-8")
-    interventions_writer = csv.writer(interventions_file)
-    interventions_writer.writerow(["nct_id", "intervention_type", "intervention_name"])
-
-    # -------------------------------
-    # EXTRACT FIELDS INTO CSV
-    # -------------------------------
+# -------------------------------
+# STREAMING EXTRACT
+# -------------------------------
 
+@metrics.stage('extract')
+def run_extract():
+    """Download pages and write each one to the four CSVs as soon as it arrives.
+
+    Returns False when the download stopped early (the checkpoint allows a resume).
+    """
+    print("Starting download from ClinicalTrials.gov API...")
+
+    checkpoint = load_checkpoint()
+    run = checkpoint.get("in_progress")
+
+    if run and run["pages_done"]:
+        # A previous run crashed: continue from its last saved page
+        print(f"Resuming interrupted {run['mode']} run from checkpoint (page: {run['page_token']})")
+        append = True
+    else:
+        mode = "incremental" if INCREMENTAL and checkpoint.get("last_success") else "full"
+        if INCREMENTAL and mode == "full":
+            print("No previous successful run found, doing a full extract first.")
+        run = {
+            "mode": mode,
+            "since": checkpoint.get("last_success") if mode == "incremental" else None,
+            "started": datetime.now().strftime("%Y-%m-%d"),
+            "page_token": None,
+            "pages_done": 0
+        }
+        append = False
+
+    extra_params = {}
+    if run["since"]:
+        print(f"Only fetching studies updated since {run['since']}")
+        extra_params['filter.advanced'] = f"AREA[LastUpdatePostDate]RANGE[{run['since']},MAX]"
+
+    suffix = "_delta" if run["mode"] == "incremental" else ""
+    total_studies_retrieved = 0
     studies_processed = 0
-    for study in all_studies:
-        try:
-            # Extract basic information using the flattened structure
-            nct_id = study.get("protocolSection", {}).get("identificationModule", {}).get("nctId", "")
-            if not nct_id:
-                continue
-
-            # Get all the modules
-            ident_module = study.get("protocolSection", {}).get("identificationModule", {})
-            status_module = study.get("protocolSection", {}).get("statusModule", {})
-            design_module = study.get("protocolSection", {}).get("designModule", {})
-            sponsors_module = study.get("protocolSection", {}).get("sponsorsCollaboratorsModule", {})
-            conditions_module = study.get("protocolSection", {}).get("conditionsModule", {})
-            arms_interventions_module = study.get("protocolSection", {}).get("armsInterventionsModule", {})
-            contacts_locations_module = study.get("protocolSection", {}).get("contactsLocationsModule", {})
-
-            # TRIALS - Main table
-            trials_writer.writerow([
-                nct_id,
-                ident_module.get("briefTitle", ""),
-                status_module.get("overallStatus", ""),
-                safe_get_first(design_module.get("phases", [])),
-                design_module.get("studyType", ""),
-                sponsors_module.get("leadSponsor", {}).get("name", "") if sponsors_module.get("leadSponsor") else "",
-                clean_date(status_module.get("startDateStruct", {}).get("date", "")),
-                clean_date(status_module.get("primaryCompletionDateStruct", {}).get("date", "")),
-                status_module.get("enrollment", {}).get("count", "") if isinstance(status_module.get("enrollment"), dict) else status_module.get("enrollment", "")
-            ])
-
-            # LOCATIONS
-            locations = contacts_locations_module.get("locations", [])
-            for location in locations:
-                locations_writer.writerow([
-                    nct_id,
-                    location.get("country", ""),
-                    location.get("state", ""),
-                    location.get("city", ""),
-                    location.get("facility", "")
-                ])
-
-            # CONDITIONS
-            conditions = conditions_module.get("conditions", [])
-            for condition in conditions:
-                conditions_writer.writerow([nct_id, condition])
-
-            # INTERVENTIONS
-            interventions = arms_interventions_module.get("interventions", [])
-            for intervention in interventions:
-                interventions_writer.writerow([
-                    nct_id,
-                    intervention.get("type", ""),
-                    intervention.get("name", "")
-                ])
-                
-            studies_processed += 1
-            
-        except Exception as e:
-            print(f"Error processing study {nct_id}: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
-
-    print(f"Successfully processed {studies_processed} studies")
-    print(f"Trials data written to: trials.csv")
-    print(f"Locations data written to: locations.csv") 
-    print(f"Conditions data written to: conditions.csv")
-    print(f"Interventions data written to: interventions.csv")
-
-except Exception as e:
-    print(f"Error during file operations: {e}")
-    import traceback
-    traceback.print_exc()
-finally:
-    # Ensure files are closed
-    trials_file.close() if 'trials_file' in locals() else None
-    locations_file.close() if 'locations_file' in locals() else None
-    conditions_file.close() if 'conditions_file' in locals() else None
-    interventions_file.close() if 'interventions_file' in locals() else None
-
-print("\nProcess completed!")
\ No newline at end of file
+    seen_nct_ids = set()
+
+    # Page tokens only make sense for a single pagination, so resumable runs are sequential
+    resumable = append or run["mode"] == "incremental" or CONCURRENCY <= 1
+    if append and run["page_token"] is None:
+        # Every page was already downloaded, only the final merge is left
+        pages = iter(())
+    elif resumable:
+        checkpoint["in_progress"] = run
+        save_checkpoint(checkpoint)
+        pages = fetch_pages(extra_params, start_token=run["page_token"])
+    else:
+        print(f"Concurrent mode: {len(STATUS_SLICES)} slices, {CONCURRENCY} workers, {REQUESTS_PER_SECOND} req/s")
+        pages = fetch_pages_concurrent(extra_params=extra_params)
+
+    writers = {}
+    try:
+        for table, header in TABLE_HEADERS.items():
+            # A crash between writing a block and saving the checkpoint left rows the
+            # resumed run fetches again, so cut every file back to the checkpoint
+            writers[table] = table_io.ColumnBlockWriter(table, header, suffix.lstrip("_"), append,
+                                                        run.get("positions", {}).get(table))
+
+        # -------------------------------
+        # EXTRACT FIELDS INTO COLUMN BLOCKS, FLUSHED EVERY FLUSH_ROWS ROWS
+        # -------------------------------
+
+        columns = new_columns()
+        pages_buffered = 0
+        last_page_token = run["page_token"]
+
+        def flush_block():
+            """Write the buffered pages to every table, then checkpoint after the last of them"""
+            nonlocal columns, pages_buffered
+            if not pages_buffered:
+                return
+            for table, writer in writers.items():
+                writer.write(columns[table])
+            columns = new_columns()
+            if resumable:
+                run["page_token"] = last_page_token
+                run["pages_done"] += pages_buffered
+                run["positions"] = {table: writer.position() for table, writer in writers.items()}
+                save_checkpoint(checkpoint)
+            pages_buffered = 0
+
+        for studies, next_page_token in pages:
+            # If this is the first page, inspect one study to understand the structure
+            if total_studies_retrieved == 0:
+                print("\nInspecting first study structure...")
+                print(json.dumps(studies[0], indent=2)[:2000])  # First 2000 chars
+
+            total_studies_retrieved += len(studies)
+            print(f"Retrieved {len(studies)} studies in this batch (Total: {total_studies_retrieved})")
+
+            # Project the page into the column buffers.
+            # seen_nct_ids is the merge step: a study is written once even if two slices return it.
+            studies_processed += project(studies, seen_nct_ids, columns)
+            pages_buffered += 1
+            last_page_token = next_page_token
+
+            if sum(len(table_columns["nct_id"]) for table_columns in columns.values()) >= FLUSH_ROWS:
+                flush_block()
+        flush_block()
+
+        print(f"Total studies downloaded: {total_studies_retrieved}")
+        metrics.current().set('rows_in', total_studies_retrieved)
+        metrics.current().set('rows_out', studies_processed)
+
+        for writer in writers.values():
+            writer.close(complete=True)
+
+        if not total_studies_retrieved:
+            print("No data to process.")
+        else:
+            print(f"Successfully processed {studies_processed} studies")
+            for table, writer in writers.items():
+                print(f"{table.title()} data written to: {writer.path}")
+
+        if run["mode"] == "incremental":
+            if table_io.active_format() == 'parquet':
+                merge_delta_columnar()
+            else:
+                merge_delta_files()
+        for table in TABLE_HEADERS:
+            metrics.current().wrote_file(table_io.table_path(table, fmt=table_io.active_format()))
+
+        # The run is complete: the next incremental run starts from here
+        checkpoint.pop("in_progress", None)
+        checkpoint["last_success"] = run["started"]
+        save_checkpoint(checkpoint)
+        if run["mode"] == "incremental":
+            remove_delta_files(table_io.active_format())
+
+    except FetchError as e:
+        print(e)
+        metrics.current().set('error', str(e))
+        if resumable:
+            print(f"Checkpoint kept in {CHECKPOINT_FILE}, re-run to resume.")
+        return False
+    except Exception as e:
+        print(f"Error during file operations: {e}")
+        import traceback
+        traceback.print_exc()
+        metrics.current().set('error', str(e))
+        return False
+    finally:
+        # Stop the download workers too, not only when the generator is garbage collected
+        if hasattr(pages, "close"):
+            pages.close()
+        # Ensure files are closed (Parquet parts are kept for a resume)
+        for writer in writers.values():
+            writer.close()
+
+    print("\nProcess completed!")
+    return True
+
+if __name__ == "__main__":
+    run_extract()
@@ -0,0 +1,62 @@
+import re
+from datetime import datetime
+
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+# The date shapes returned by ClinicalTrials.gov, with the explicit format for each
+# and whether the value only has month precision
+DATE_PATTERNS = [
+    ('iso_day', r'^\d{4}-\d{2}-\d{2}$', '%Y-%m-%d', False),
+    ('iso_month', r'^\d{4}-\d{2}$', '%Y-%m', True),
+    ('text_day', r'^[A-Za-z]+ \d{1,2}, \d{4}$', '%B %d, %Y', False),
+    ('text_month', r'^[A-Za-z]+ \d{4}$', '%B %Y', True),
+]
+
+COMPILED_PATTERNS = [(name, re.compile(regex), fmt, month_only) for name, regex, fmt, month_only in DATE_PATTERNS]
+
+def normalize_date_text(date_str):
+    """Normalize one API date string to 'YYYY-MM-DD' or 'YYYY-MM' (month precision).
+
+    Unrecognised or invalid values are returned unchanged.
+    """
+    if not date_str:
+        return ""
+    date_str = date_str.strip()
+    for _, pattern, fmt, month_only in COMPILED_PATTERNS:
+        if pattern.match(date_str):
+            try:
+                parsed = datetime.strptime(date_str, fmt)
+            except ValueError:
+                return date_str
+            return parsed.strftime("%Y-%m" if month_only else "%Y-%m-%d")
+    return date_str
+
+def parse_date_column(values):
+    """Parse a column of date strings without per-element format guessing.
+
+    Every value is matched against DATE_PATTERNS with vectorized regexes, then each
+    group is parsed with its explicit format in one to_datetime call. Values that
+    match no pattern fall back to format='mixed'. Returns (dates, month_only):
+    a datetime64 Series (month-precision values land on the 1st) and a boolean
+    Series flagging the values that only had a year and month.
+    """
+    text = pd.Series(values, copy=False).astype('string').str.strip()
+    dates = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    month_only = pd.Series(False, index=text.index)
+    unmatched = text.notna() & (text != '')
+
+    for _, regex, fmt, is_month_only in DATE_PATTERNS:
+        mask = unmatched & text.str.match(regex, na=False)
+        if mask.any():
+            dates[mask] = pd.to_datetime(text[mask], format=fmt, errors='coerce')
+            month_only[mask] = is_month_only
+            unmatched &= ~mask
+
+    # Rare shapes the API is not documented to return
+    if unmatched.any():
+        dates[unmatched] = pd.to_datetime(text[unmatched], errors='coerce', format='mixed')
+
+    month_only &= dates.notna()
+    return dates, month_only
\ No newline at end of file
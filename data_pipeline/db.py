@@ -0,0 +1,158 @@
+import configparser
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Connection settings come from DB_* environment variables, optionally on top of an
+# INI file (DB_CONFIG_FILE, default db.ini) with a [database] section, e.g.
+#
+#   [database]
+#   backend = mysql
+#   host = localhost
+#   user = root
+#   password = secret
+#   database = clinical_trials
+#   pool_size = 4
+DB_CONFIG_FILE = os.environ.get("DB_CONFIG_FILE", "db.ini")
+
+class ConfigError(Exception):
+    """The configured backend cannot be used, e.g. its driver is not installed"""
+
+# Errors of every backend driver that is installed
+try:
+    from mysql.connector import Error as MySQLError
+    DB_ERRORS = (MySQLError, sqlite3.Error, ConfigError)
+except ImportError:
+    DB_ERRORS = (sqlite3.Error, ConfigError)
+
+DEFAULTS = {
+    'backend': 'mysql',
+    'host': 'localhost',
+    'port': '3306',
+    'user': 'root',
+    'password': '',
+    'database': 'clinical_trials',
+    'pool_size': '4',
+}
+
+def load_config(path=DB_CONFIG_FILE):
+    """Merge defaults, the config file and DB_* environment variables (highest priority)"""
+    config = dict(DEFAULTS)
+    if path and os.path.exists(path):
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        if parser.has_section('database'):
+            config.update(parser['database'])
+    for key in DEFAULTS:
+        value = os.environ.get(f"DB_{key.upper()}")
+        if value is not None:
+            config[key] = value
+    return config
+
+def mysql_connector():
+    """The mysql.connector module, or a ConfigError saying how to get past its absence"""
+    try:
+        import mysql.connector
+        import mysql.connector.pooling  # noqa: F401
+    except ImportError:
+        raise ConfigError("DB_BACKEND=mysql needs the MySQL driver: install mysql-connector-python "
+                          "or set DB_BACKEND=sqlite") from None
+    return mysql.connector
+
+def connect(database=None, config=None):
+    """One unpooled connection, for scripts and benchmarks.
+
+    database replaces the configured one; on MySQL '' connects without a default database.
+    """
+    config = config or load_config()
+    database = config['database'] if database is None else database
+    if config['backend'] == 'mysql':
+        options = {'host': config['host'], 'port': int(config['port']),
+                   'user': config['user'], 'password': config['password']}
+        if database:
+            options['database'] = database
+        return mysql_connector().connect(**options)
+    if config['backend'] == 'sqlite':
+        connection = sqlite3.connect(database)
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+    raise ConfigError(f"Unknown database backend: {config['backend']} (DB_BACKEND is mysql or sqlite)")
+
+class SQLitePool:
+    """Minimal fixed-size pool of sqlite3 connections to one database file"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.connections = queue.Queue()
+        for _ in range(size):
+            connection = sqlite3.connect(path, check_same_thread=False)
+            connection.execute("PRAGMA foreign_keys = ON")
+            self.connections.put(connection)
+
+    def get_connection(self):
+        return self.connections.get()
+
+    def release(self, connection):
+        self.connections.put(connection)
+
+class ConnectionPool:
+    """Pool of database connections for MySQL or SQLite.
+
+    placeholder is the parameter marker of the backend ('%s' or '?'), so the same
+    insert code runs on both.
+    """
+
+    def __init__(self, config):
+        self.backend = config['backend']
+        self.size = int(config['pool_size'])
+        self.database = config['database']
+
+        if self.backend == 'mysql':
+            self.placeholder = '%s'
+            self.pool = mysql_connector().pooling.MySQLConnectionPool(
+                pool_name="clinical_trials",
+                pool_size=self.size,
+                host=config['host'],
+                port=int(config['port']),
+                user=config['user'],
+                password=config['password'],
+                database=config['database'],
+                allow_local_infile=True,
+                autocommit=False,
+            )
+        elif self.backend == 'sqlite':
+            self.placeholder = '?'
+            # SQLite has a single writer, more connections would only wait on its lock
+            self.size = 1
+            self.pool = SQLitePool(config['database'], self.size)
+        else:
+            raise ConfigError(f"Unknown database backend: {self.backend} (DB_BACKEND is mysql or sqlite)")
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is rolled back if the block fails and returned to the pool"""
+        connection = self.pool.get_connection()
+        try:
+            yield connection
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            if self.backend == 'mysql':
+                # close() hands a pooled MySQL connection back to its pool
+                connection.close()
+            else:
+                self.pool.release(connection)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Process-wide connection pool, created from load_config() on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(load_config())
+        return _pool
\ No newline at end of file
@@ -0,0 +1,302 @@
+import os
+import sqlite3
+import time
+
+import schema
+import table_io
+from SQL3 import OPTIONAL_TABLES, TABLES, mysql_ready_file
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+# 'auto' uses DuckDB when it is installed (pip install duckdb) and SQLite otherwise
+EMBEDDED_ENGINE = os.environ.get("EMBEDDED_ENGINE", "auto")
+
+# Database file, default clinical_trials.duckdb / clinical_trials.sqlite
+EMBEDDED_DB_PATH = os.environ.get("EMBEDDED_DB_PATH", "")
+
+# SQL that differs between the engines
+DIALECTS = {
+    'duckdb': {
+        'year': "COALESCE(CAST(year(start_date) AS SMALLINT), 0)",
+        'days': "date_diff('day', start_date, completion_date)",
+        'today': "current_date",
+        'row_id': "INTEGER PRIMARY KEY DEFAULT nextval('{table}_id_seq')",
+        # DuckDB foreign keys cannot cascade; the file is rebuilt on every load anyway
+        'trial_fk': "REFERENCES trials(nct_id)",
+    },
+    'sqlite': {
+        'year': "COALESCE(CAST(strftime('%Y', start_date) AS INTEGER), 0)",
+        'days': "julianday(completion_date) - julianday(start_date)",
+        'today': "date('now')",
+        'row_id': "INTEGER PRIMARY KEY",
+        'trial_fk': "REFERENCES trials(nct_id) ON DELETE CASCADE",
+    },
+}
+
+def duckdb_available():
+    """True when the duckdb package is installed"""
+    try:
+        import duckdb  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def resolve_engine(engine=None):
+    engine = engine or EMBEDDED_ENGINE
+    if engine == 'auto':
+        return 'duckdb' if duckdb_available() else 'sqlite'
+    if engine not in DIALECTS:
+        raise ValueError(f"Unknown embedded engine: {engine}")
+    return engine
+
+def default_path(engine):
+    return EMBEDDED_DB_PATH or f"clinical_trials.{engine}"
+
+def connect(path, engine):
+    if engine == 'duckdb':
+        import duckdb
+        return duckdb.connect(path)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    return connection
+
+def create_statements(engine):
+    """Tables of SQL_script.sql (flat layout) in the engine's dialect; indexes follow after the load"""
+    sql = DIALECTS[engine]
+    statements = []
+    if engine == 'duckdb':
+        statements += [f"CREATE SEQUENCE {table}_id_seq" for table in ['locations', 'conditions', 'interventions']]
+
+    statements += [
+        f"""CREATE TABLE trials (
+    nct_id VARCHAR(20) NOT NULL PRIMARY KEY,
+    title TEXT,
+    status VARCHAR(50),
+    phase VARCHAR(20),
+    study_type VARCHAR(50),
+    sponsor VARCHAR(255) DEFAULT 'Unknown',
+    sponsor_id VARCHAR(16),
+    start_date DATE,
+    completion_date DATE,
+    enrollment INTEGER DEFAULT 0,
+    start_date_month_only BOOLEAN DEFAULT FALSE,
+    completion_date_month_only BOOLEAN DEFAULT FALSE,
+    start_year SMALLINT GENERATED ALWAYS AS ({sql['year']}) VIRTUAL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)""",
+        f"""CREATE TABLE locations (
+    location_id {sql['row_id'].format(table='locations')},
+    nct_id VARCHAR(20) {sql['trial_fk']},
+    country VARCHAR(100),
+    state VARCHAR(100),
+    city VARCHAR(100),
+    facility VARCHAR(255),
+    facility_id VARCHAR(16)
+)""",
+        f"""CREATE TABLE conditions (
+    condition_id {sql['row_id'].format(table='conditions')},
+    nct_id VARCHAR(20) {sql['trial_fk']},
+    condition_name VARCHAR(255),
+    condition_category VARCHAR(255)
+)""",
+        f"""CREATE TABLE interventions (
+    intervention_id {sql['row_id'].format(table='interventions')},
+    nct_id VARCHAR(20) {sql['trial_fk']},
+    intervention_type VARCHAR(100),
+    intervention_name VARCHAR(255),
+    intervention_category VARCHAR(255)
+)""",
+        """CREATE TABLE taxonomy_categories (
+    kind VARCHAR(20) NOT NULL,
+    category VARCHAR(255) NOT NULL,
+    category_group VARCHAR(100),
+    PRIMARY KEY (kind, category)
+)""",
+    ]
+    return statements
+
+def index_statements(engine):
+    """The composite indexes of the MySQL schema, plus FTS5 in place of the FULLTEXT title index"""
+    statements = [f"CREATE INDEX {name} ON {table} ({columns})"
+                  for table, indexes in schema.flat_indexes().items()
+                  for name, columns in indexes]
+    if engine == 'sqlite':
+        # DuckDB scans the title column fast enough that search_titles uses ILIKE there
+        statements += [
+            "CREATE VIRTUAL TABLE trials_title_fts USING fts5(title, content='trials', content_rowid='rowid')",
+            "INSERT INTO trials_title_fts (trials_title_fts) VALUES ('rebuild')",
+        ]
+    return statements
+
+def read_load_frame(table, engine):
+    """Read one MySQL-ready file with the pipeline's column types"""
+    _, columns = {**TABLES, **OPTIONAL_TABLES}[table]
+    df = table_io.read_table(table, 'mysql_ready')
+    df.columns = columns
+    df = table_io.apply_schema(df, table)
+
+    if engine == 'sqlite':
+        # SQLite stores dates as ISO text
+        for col in ['start_date', 'completion_date']:
+            if col in df.columns:
+                df[col] = df[col].dt.strftime('%Y-%m-%d')
+        df = df.astype(object)
+        df = df.where(df.notna(), None)
+    return df
+
+def insert_frame(connection, engine, table, df):
+    column_list = ', '.join(df.columns)
+    if engine == 'duckdb':
+        # DuckDB scans the DataFrame directly, no per-row conversion
+        connection.register('incoming', df)
+        connection.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM incoming")
+        connection.unregister('incoming')
+    else:
+        connection.executemany(f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(['?'] * len(df.columns))})",
+                               df.itertuples(index=False, name=None))
+    return len(df)
+
+def build_embedded_db(path=None, engine=None):
+    """Rebuild the embedded database file from the MySQL-ready files, returning row counts"""
+    engine = resolve_engine(engine)
+    path = path or default_path(engine)
+    if os.path.exists(path):
+        os.remove(path)
+
+    print(f"🦆 Building {engine} database {path}...")
+    connection = connect(path, engine)
+    counts = {}
+    try:
+        for statement in create_statements(engine):
+            connection.execute(statement)
+
+        # trials first: the other tables reference it through nct_id
+        for table in TABLES:
+            start = time.perf_counter()
+            counts[table] = insert_frame(connection, engine, table, read_load_frame(table, engine))
+            print(f"✅ Loaded {counts[table]:,} {table} in {time.perf_counter() - start:.2f}s")
+        for table in OPTIONAL_TABLES:
+            if mysql_ready_file(table, table_io.PIPELINE_FORMAT):
+                counts[table] = insert_frame(connection, engine, table, read_load_frame(table, engine))
+                print(f"✅ Loaded {counts[table]:,} {table}")
+
+        # Building indexes once over the loaded data is faster than maintaining them per row
+        start = time.perf_counter()
+        for statement in index_statements(engine):
+            connection.execute(statement)
+        connection.commit()
+        print(f"✅ Built indexes in {time.perf_counter() - start:.2f}s")
+    finally:
+        connection.close()
+    return counts
+
+class EmbeddedDB:
+    """Read-only query API over an embedded database built by build_embedded_db.
+
+    Every method returns a DataFrame. Use query() for anything not covered here.
+    """
+
+    def __init__(self, path=None, engine=None):
+        self.engine = resolve_engine(engine)
+        self.path = path or default_path(self.engine)
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"{self.path} does not exist, run embedded_db.py first")
+        self.sql = DIALECTS[self.engine]
+        self.connection = connect(self.path, self.engine)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def query(self, sql, params=()):
+        """Run any SELECT ('?' placeholders) and return the result as a DataFrame"""
+        if self.engine == 'duckdb':
+            return self.connection.execute(sql, list(params)).df()
+        return pd.read_sql_query(sql, self.connection, params=list(params))
+
+    def trials_by_status(self):
+        return self.query("""
+            SELECT status, COUNT(*) AS trial_count FROM trials
+            GROUP BY status ORDER BY trial_count DESC""")
+
+    def trials_by_phase_status(self):
+        return self.query("""
+            SELECT phase, status, COUNT(*) AS trial_count FROM trials
+            GROUP BY phase, status ORDER BY phase, status""")
+
+    def trials_by_start_year(self, since=2000):
+        return self.query("""
+            SELECT start_year, COUNT(*) AS trial_count FROM trials
+            WHERE start_year >= ? GROUP BY start_year ORDER BY start_year""", [since])
+
+    def average_duration_days(self, status='Completed'):
+        """Mean start-to-completion time of trials with the given status that started in 2000 or later"""
+        return self.query(f"""
+            SELECT AVG({self.sql['days']}) AS avg_days FROM trials
+            WHERE status = ? AND start_date >= '2000-01-01' AND completion_date <= {self.sql['today']}""",
+                          [status])
+
+    def top_conditions(self, limit=10):
+        return self.query("""
+            SELECT condition_name, COUNT(DISTINCT nct_id) AS trial_count FROM conditions
+            WHERE condition_name IS NOT NULL
+            GROUP BY condition_name ORDER BY trial_count DESC, condition_name LIMIT ?""", [limit])
+
+    def trials_by_country(self, statuses=('Recruiting', 'Active'), limit=None):
+        placeholders = ', '.join(['?'] * len(statuses))
+        limit_clause = f" LIMIT {int(limit)}" if limit else ""
+        return self.query(f"""
+            SELECT l.country, COUNT(DISTINCT l.nct_id) AS trial_count FROM locations l
+            JOIN trials t ON t.nct_id = l.nct_id
+            WHERE t.status IN ({placeholders})
+            GROUP BY l.country ORDER BY trial_count DESC{limit_clause}""", statuses)
+
+    def conditions_by_phase(self, status='Completed'):
+        return self.query("""
+            SELECT c.condition_name, t.phase, COUNT(*) AS trial_count FROM conditions c
+            JOIN trials t ON t.nct_id = c.nct_id
+            WHERE t.status = ? GROUP BY c.condition_name, t.phase
+            ORDER BY trial_count DESC""", [status])
+
+    def interventions_by_phase(self):
+        return self.query("""
+            SELECT i.intervention_type, t.phase, COUNT(DISTINCT i.nct_id) AS trial_count FROM interventions i
+            JOIN trials t ON t.nct_id = i.nct_id
+            GROUP BY i.intervention_type, t.phase ORDER BY i.intervention_type, t.phase""")
+
+    def search_titles(self, text, limit=20):
+        """Trials whose title contains text (FTS5 match on SQLite, ILIKE on DuckDB)"""
+        if self.engine == 'sqlite':
+            # Quoted as one FTS5 phrase so user input cannot inject query syntax
+            phrase = '"' + text.replace('"', '""') + '"'
+            return self.query("""
+                SELECT t.nct_id, t.title, t.status, t.phase FROM trials_title_fts f
+                JOIN trials t ON t.rowid = f.rowid
+                WHERE trials_title_fts MATCH ? ORDER BY f.rank LIMIT ?""", [phrase, limit])
+        return self.query("""
+            SELECT nct_id, title, status, phase FROM trials
+            WHERE title ILIKE '%' || ? || '%' ORDER BY nct_id LIMIT ?""", [text, limit])
+
+def main():
+    """Build the database and show a few of the dashboard aggregations"""
+    start = time.perf_counter()
+    counts = build_embedded_db()
+    print(f"\n🎉 Loaded {sum(counts.values()):,} rows in {time.perf_counter() - start:.2f}s")
+
+    with EmbeddedDB() as database:
+        for label, method in [('Trials by status', database.trials_by_status),
+                              ('Top 10 conditions', database.top_conditions),
+                              ('Countries of active trials', lambda: database.trials_by_country(limit=10))]:
+            start = time.perf_counter()
+            result = method()
+            print(f"\n📊 {label} ({(time.perf_counter() - start) * 1000:.1f} ms):")
+            print(result.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
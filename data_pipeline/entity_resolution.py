@@ -0,0 +1,317 @@
+import hashlib
+import os
+
+import metrics
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Cosine similarity of the character trigram vectors from which two names count as the
+# same entity (1 = only names that are equal after key normalization are merged)
+ENTITY_MATCH_THRESHOLD = float(os.environ.get("ENTITY_MATCH_THRESHOLD", "0.8"))
+
+# A trigram shared by more names than this within one block says little about a match;
+# it still counts in the similarity but produces no candidate pairs
+MAX_GRAM_POSTINGS = 200
+
+# Trigram lookups of candidate pairs scored at once (about 60 bytes of scratch memory each)
+LOOKUP_BATCH = 2_000_000
+
+# Names turned into trigrams at once (memory grows with KEY_BATCH x KEY_BYTES)
+KEY_BATCH = 65_536
+
+# Names longer than this many bytes are compared on their first KEY_BYTES bytes
+KEY_BYTES = 64
+
+# Placeholders the cleaners write for a missing name; they never get an entity id
+MISSING_NAMES = {'', 'nan', 'Nan', 'NaN', 'None', 'Unknown'}
+
+# Spelling variants folded before comparing, word by word
+ABBREVIATIONS = {
+    'ctr': 'center', 'cntr': 'center', 'centre': 'center', 'hosp': 'hospital', 'univ': 'university',
+    'inst': 'institute', 'med': 'medical', 'natl': 'national', 'intl': 'international',
+    'dept': 'department', 'st': 'saint', 'mt': 'mount', 'ft': 'fort',
+    # Legal forms say nothing about which organization it is
+    'inc': '', 'llc': '', 'ltd': '', 'co': '', 'corp': '', 'corporation': '', 'gmbh': '', 'ag': '',
+    'plc': '', 'sa': '', 'bv': '',
+}
+ABBREVIATION_PATTERN = r'\b(' + '|'.join(ABBREVIATIONS) + r')\b'
+
+# Accents and other combining marks that NFKD splits off a letter (é -> e + U+0301)
+COMBINING_MARKS = '[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]'
+
+# Keys shorter than this (e.g. a name that was only punctuation or a legal form) say
+# nothing about the organization: such names are never merged with another
+MIN_KEY_LENGTH = 2
+
+# Separates the block from the name in the value keys
+SEPARATOR = '\x1f'
+
+def name_keys(names):
+    """Comparison keys: case folded, no accents or punctuation, abbreviations and legal forms folded.
+
+    "M.D. Anderson Cancer Ctr" and "MD Anderson Cancer Center" both become
+    "md anderson cancer center". Letters of every script are kept, so
+    "北京协和医院" and "Пироговский университет" keep keys of their own.
+    """
+    keys = names.str.normalize('NFKD').str.replace(COMBINING_MARKS, '', regex=True)
+    keys = keys.str.casefold().str.replace('&', ' and ', regex=False)
+    # Dotted abbreviations stay one word (M.D. -> md)
+    keys = keys.str.replace(r"[.']", '', regex=True).str.replace(r'[\W_]+', ' ', regex=True)
+    keys = keys.str.replace(ABBREVIATION_PATTERN, lambda m: ABBREVIATIONS[m.group(1)], regex=True)
+    return keys.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def trigram_postings(keys):
+    """(entity, trigram) pairs of every key, as two 32-bit arrays sorted by entity.
+
+    Keys are padded with a space on both sides, so first and last letters form
+    their own trigrams, and cut to KEY_BYTES bytes. The trigrams of KEY_BATCH
+    keys at a time are computed at once on a fixed-width byte matrix.
+    """
+    entities, grams = [], []
+    for first in range(0, len(keys), KEY_BATCH):
+        batch = keys[first:first + KEY_BATCH]
+        encoded = np.array([f" {key} ".encode('utf-8')[:KEY_BYTES] for key in batch], dtype=f'S{KEY_BYTES}')
+        matrix = np.frombuffer(encoded.tobytes(), dtype=np.uint8).reshape(len(batch), KEY_BYTES)
+        lengths = np.char.str_len(encoded)
+
+        batch_grams = ((matrix[:, :-2].astype(np.uint32) << 16) | (matrix[:, 1:-1].astype(np.uint32) << 8)
+                       | matrix[:, 2:])
+        valid = np.arange(KEY_BYTES - 2) < (lengths - 2)[:, None]
+        batch_entities = np.repeat(np.arange(first, first + len(batch), dtype=np.int64), valid.sum(axis=1))
+
+        # A trigram that repeats within one key counts once
+        unique = np.unique((batch_entities << 24) | batch_grams[valid])
+        entities.append((unique >> 24).astype(np.int32))
+        grams.append((unique & 0xFFFFFF).astype(np.uint32))
+    return np.concatenate(entities), np.concatenate(grams)
+
+def prefix_mask(entities, gram_of, weights, idf, threshold):
+    """Postings two names must share one of to reach threshold (prefix filtering).
+
+    Each name's trigrams are ordered rarest first; once the remaining trigrams
+    weigh less than threshold (vector norm) they cannot lift a pair above it on
+    their own, so only the trigrams before that point are indexed. Common
+    trigrams mostly fall behind it, which keeps the candidate lists short.
+    """
+    rank = np.empty(len(idf), dtype=np.int64)
+    rank[np.lexsort((np.arange(len(idf)), -idf))] = np.arange(len(idf))
+    # entities is sorted, so the order only moves trigrams within a name
+    order = np.argsort((entities.astype(np.int64) << 24) | rank[gram_of])
+    squared = weights[order] ** 2
+    before = np.cumsum(squared)
+    before -= squared
+    starts = np.r_[0, np.flatnonzero(entities[1:] != entities[:-1]) + 1]
+    before -= np.repeat(before[starts], np.diff(np.r_[starts, len(order)]))
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order] = 1 - before >= threshold ** 2 - 1e-9
+    return mask
+
+def candidate_pairs(groups, entities):
+    """Distinct entity pairs that share a posting group, as (left, right) with left < right.
+
+    groups must be sorted, with entities ascending within a group. Pairs are built
+    by comparing each posting with the one d places further on, for growing d;
+    only positions still inside their group stay in play, so the work equals the
+    number of pairs.
+    """
+    stride = int(entities.max()) + 1 if len(entities) else 1
+    pair_keys = []
+    positions = np.arange(len(groups) - 1)
+    distance = 1
+    while positions.size:
+        positions = positions[groups[positions + distance] == groups[positions]]
+        pair_keys.append(np.unique(entities[positions].astype(np.int64) * stride + entities[positions + distance]))
+        distance += 1
+        positions = positions[positions + distance < len(groups)]
+
+    pair_keys = np.unique(np.concatenate(pair_keys)) if pair_keys else np.array([], dtype=np.int64)
+    return pair_keys // stride, pair_keys % stride
+
+def pair_similarity(left, right, entities, gram_of, weights):
+    """Cosine similarity of every (left, right) pair over all of their trigrams.
+
+    entities must be sorted, with gram_of ascending within an entity. Each
+    trigram of the left name is looked up in the right name's postings with one
+    binary search; pairs go through in batches of LOOKUP_BATCH lookups, ordered
+    by right name so the searches stay within one small stretch of the postings.
+    """
+    by_right = np.lexsort((left, right))
+    left, right = left[by_right], right[by_right]
+    posting_keys = (entities.astype(np.int64) << 24) | gram_of
+    starts = np.searchsorted(entities, np.arange(int(entities.max()) + 2 if len(entities) else 1))
+    lengths = np.diff(starts)
+    similarity = np.zeros(len(left))
+    ends = np.cumsum(lengths[left])
+    first = 0
+    while first < len(left):
+        done = ends[first - 1] if first else 0
+        last = max(first + 1, int(np.searchsorted(ends, done + LOOKUP_BATCH, side='right')))
+        batch_left, batch_right = left[first:last], right[first:last]
+        counts = lengths[batch_left]
+        pair = np.repeat(np.arange(len(batch_left)), counts)
+        offsets = np.arange(len(pair)) - np.repeat(np.cumsum(counts) - counts, counts)
+        postings = starts[batch_left][pair] + offsets
+        lookup = (batch_right[pair] << 24) | gram_of[postings]
+        found = np.minimum(np.searchsorted(posting_keys, lookup), len(posting_keys) - 1)
+        shared = posting_keys[found] == lookup
+        similarity[first:last] = np.bincount(
+            pair[shared], weights=weights[postings[shared]] * weights[found[shared]], minlength=len(batch_left))
+        first = last
+    restored = np.empty_like(similarity)
+    restored[by_right] = similarity
+    return restored
+
+def connected_components(count, left, right):
+    """Component label (smallest member) of every node, for the edges left[i] - right[i]"""
+    labels = np.arange(count)
+    while True:
+        lowest = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, lowest)
+        np.minimum.at(updated, right, lowest)
+        # Pointer jumping: follow every label to its own label
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+def row_keys(df, name_column, block_columns=()):
+    """One string per row identifying its (block, name) value"""
+    block = pd.Series('', index=df.index, dtype=object)
+    for position, col in enumerate(block_columns):
+        block = block + ('|' if position else '') + df[col].astype(str).str.lower()
+    return block + SEPARATOR + df[name_column].astype(str)
+
+def value_codes(df, name_column, block_columns=()):
+    """(codes, keys): the position in keys of every row, and the row_keys() of its distinct values.
+
+    The columns are factorized and combined as integer codes, so the key strings
+    are only built for one row of each distinct combination, not for every row.
+    Combinations that only differ in the case of a block column share a key.
+    """
+    codes = np.zeros(len(df), dtype=np.int64)
+    for col in [*block_columns, name_column]:
+        col_codes, uniques = pd.factorize(df[col])
+        # Missing values get code -1; shift them to 0 so the combined codes stay distinct
+        codes = pd.factorize(codes * (len(uniques) + 1) + col_codes + 1)[0]
+    first = np.unique(codes, return_index=True)[1]
+    keys, key_of = np.unique(row_keys(df.iloc[first], name_column, block_columns).to_numpy(dtype=object),
+                             return_inverse=True)
+    return key_of[codes], keys
+
+def value_counts(df, name_column, block_columns=()):
+    """Row count of every distinct (block, name) value; counts of several chunks can be added up"""
+    codes, keys = value_codes(df, name_column, block_columns)
+    return pd.Series(np.bincount(codes, minlength=len(keys)), index=keys).sort_values(ascending=False, kind='stable')
+
+def build_entity_map(counts, kind, threshold=ENTITY_MATCH_THRESHOLD, prefix_block=False):
+    """Cluster the distinct values of one name column into entities.
+
+    counts is a value_counts() result. Only names within the same block (e.g. the
+    same country and city) are compared; with prefix_block the first letters of
+    the name's first word are added to the block, for columns that have no
+    natural one. Names that are equal after name_keys() are merged outright, the
+    rest are merged when the cosine similarity of their IDF-weighted character
+    trigram vectors reaches threshold and they contain the same numbers. Names
+    whose key is shorter than MIN_KEY_LENGTH are never merged. Every cluster is
+    named after its most common spelling and gets a stable id (a hash of kind,
+    block and its key).
+
+    Returns a DataFrame indexed like counts with 'canonical' and 'entity_id'.
+    """
+    values = pd.Series(counts.index, dtype=object).str.split(SEPARATOR, n=1, expand=True)
+    values.columns = ['block', 'name']
+    values['count'] = counts.to_numpy()
+    values.index = counts.index
+
+    mapping = pd.DataFrame({'canonical': values['name'], 'entity_id': None}, index=counts.index)
+    named = values[~values['name'].isin(MISSING_NAMES)].copy()
+    if named.empty:
+        return mapping
+
+    named['key'] = name_keys(named['name'])
+    # A degenerate key stands for the exact name alone ('\0' never occurs in a key)
+    degenerate = named['key'].str.len() < MIN_KEY_LENGTH
+    named.loc[degenerate, 'key'] = '\0' + named.loc[degenerate, 'name']
+    if prefix_block:
+        named['block'] = named['block'] + '#' + named['key'].str.split(' ', n=1).str[0].str[:4]
+
+    # Entities: distinct (block, key)
+    entity_of, entity_values = pd.factorize(named['block'] + SEPARATOR + named['key'])
+    entity_blocks, entity_keys = pd.Series(entity_values).str.split(SEPARATOR, n=1, expand=True).T.to_numpy()
+    entity_count = len(entity_values)
+
+    labels = np.arange(entity_count)
+    if threshold < 1 and entity_count > 1:
+        entities, grams = trigram_postings(entity_keys)
+        gram_ids, gram_of = np.unique(grams, return_inverse=True)
+        gram_of = gram_of.astype(np.int32)
+        idf = np.log((1 + entity_count) / (1 + np.bincount(gram_of))) + 1
+        weights = idf[gram_of]
+        weights = weights / np.sqrt(np.bincount(entities, weights=weights ** 2, minlength=entity_count))[entities]
+
+        # Posting groups: one per (block, trigram) over the indexed prefixes
+        block_of = pd.factorize(entity_blocks)[0]
+        indexed = np.flatnonzero(prefix_mask(entities, gram_of, weights, idf, threshold))
+        order = indexed[np.lexsort((entities[indexed], gram_of[indexed], block_of[entities[indexed]]))]
+        group_keys = block_of[entities[order]].astype(np.int64) * len(gram_ids) + gram_of[order]
+        group_ids = np.cumsum(np.r_[True, group_keys[1:] != group_keys[:-1]]) - 1
+        keep = np.bincount(group_ids)[group_ids] <= MAX_GRAM_POSTINGS
+
+        left, right = candidate_pairs(group_ids[keep], entities[order][keep])
+        # Numbers must agree: "Research Site 12" and "Research Site 13" are different sites
+        digits = pd.factorize(pd.Series(entity_keys).str.replace(r'\D+', ' ', regex=True).str.strip())[0]
+        comparable = ~pd.Series(entity_keys).str.startswith('\0').to_numpy()
+        compared = (digits[left] == digits[right]) & comparable[left] & comparable[right]
+        left, right = left[compared], right[compared]
+        matched = pair_similarity(left, right, entities, gram_of, weights) >= threshold - 1e-9
+        labels = connected_components(entity_count, left[matched], right[matched])
+
+    # Canonical spelling: the most common name of the cluster (ties: alphabetical)
+    named['cluster'] = labels[entity_of]
+    ranked = named.sort_values(['cluster', 'count', 'name'], ascending=[True, False, True])
+    canonical = ranked.drop_duplicates('cluster').set_index('cluster')
+    cluster_ids = {cluster: hashlib.sha1(f"{kind}|{row.block}|{row.key}".encode('utf-8')).hexdigest()[:12]
+                   for cluster, row in zip(canonical.index, canonical.itertuples(index=False))}
+
+    mapping.loc[named.index, 'canonical'] = canonical['name'].reindex(named['cluster']).to_numpy()
+    mapping.loc[named.index, 'entity_id'] = named['cluster'].map(cluster_ids).to_numpy()
+    return mapping
+
+def apply_entity_map(df, name_column, block_columns, mapping, id_column):
+    """Replace a name column with its canonical names and add the entity ids in id_column.
+
+    Rows whose value is not in mapping, or is a missing placeholder, keep their name
+    and get no id.
+    """
+    codes, keys = value_codes(df, name_column, block_columns)
+    positions = mapping.index.get_indexer(keys)[codes]
+    found = positions >= 0
+    found[found] = mapping['entity_id'].notna().to_numpy()[positions[found]]
+    df = df.copy()
+    canonical = df[name_column].to_numpy(dtype=object, copy=True)
+    canonical[found] = mapping['canonical'].to_numpy()[positions[found]]
+    ids = np.full(len(df), None, dtype=object)
+    ids[found] = mapping['entity_id'].to_numpy()[positions[found]]
+    df[name_column] = canonical
+    df[id_column] = ids
+    return df
+
+def resolve_entities(df, name_column, block_columns, kind, id_column, prefix_block=False):
+    """build_entity_map + apply_entity_map for a table that is in memory as a whole"""
+    counts = value_counts(df, name_column, block_columns)
+    mapping = build_entity_map(counts, kind, prefix_block=prefix_block)
+    report(kind, counts, mapping)
+    return apply_entity_map(df, name_column, block_columns, mapping, id_column)
+
+def report(kind, counts, mapping):
+    """Print how many distinct names collapsed into how many entities and record it in the stage metrics"""
+    named = mapping['entity_id'].notna()
+    entities = mapping.loc[named, 'entity_id'].nunique()
+    metrics.current().set(f'{kind}_names', int(named.sum()))
+    metrics.current().set(f'{kind}_entities', entities)
+    print(f"🔗 {kind}: {int(named.sum()):,} distinct names -> {entities:,} entities "
+          f"({int(counts[named.to_numpy()].sum()):,} rows)")
+    return entities
\ No newline at end of file
@@ -0,0 +1,25 @@
+import importlib
+
+class LazyModule:
+    """Stand-in for a module that is imported the first time one of its attributes is used.
+
+    `pd = lazy_import('pandas')` keeps pandas out of the startup of commands that
+    never touch a DataFrame (status, --dry-run, --help). After the first use the
+    module's attributes are copied onto the stand-in, so later lookups cost the
+    same as on the module itself. importlib's import lock makes the first use safe
+    from several threads at once.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_lazy_name'] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._lazy_name)
+        self.__dict__.update(vars(module))
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._lazy_name}'>"
+
+def lazy_import(name):
+    return LazyModule(name)
\ No newline at end of file
@@ -0,0 +1,215 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# One JSON line per finished stage is appended here ('' = off)
+PIPELINE_METRICS_FILE = os.environ.get("PIPELINE_METRICS_FILE", "pipeline_metrics.jsonl")
+
+# Directory for a cProfile dump per stage ('' = off)
+PIPELINE_PROFILE_DIR = os.environ.get("PIPELINE_PROFILE_DIR", "")
+
+# Shared by every process of one run (worker processes inherit it through the environment)
+RUN_ID = os.environ.setdefault("PIPELINE_RUN_ID", time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}")
+
+# Upper bounds (ms) of the latency histogram buckets
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+class StageMetrics:
+    """Counters, timings and histograms of one stage; safe to update from several threads"""
+
+    def __init__(self, name):
+        self.name = name
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, amount=1):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, key, value):
+        with self.lock:
+            self.values[key] = value
+
+    def append(self, key, value):
+        with self.lock:
+            self.values.setdefault(key, []).append(value)
+
+    def read_file(self, path):
+        """Count a file this stage read in bytes_read"""
+        if os.path.exists(path):
+            self.add('bytes_read', os.path.getsize(path))
+
+    def wrote_file(self, path):
+        """Count a file this stage wrote in bytes_written"""
+        if os.path.exists(path):
+            self.add('bytes_written', os.path.getsize(path))
+
+    def observe(self, key, seconds):
+        """Record one duration in the latency histogram under key"""
+        ms = seconds * 1000
+        with self.lock:
+            histogram = self.values.setdefault(key, {
+                'count': 0, 'sum_ms': 0.0, 'max_ms': 0.0,
+                'buckets': {str(bound): 0 for bound in LATENCY_BUCKETS_MS + ['inf']}})
+            histogram['count'] += 1
+            histogram['sum_ms'] += ms
+            histogram['max_ms'] = max(histogram['max_ms'], ms)
+            bucket = next((bound for bound in LATENCY_BUCKETS_MS if ms <= bound), 'inf')
+            histogram['buckets'][str(bucket)] += 1
+
+class NullMetrics(StageMetrics):
+    """Stand-in when no stage is open, so instrumented code never has to check"""
+
+    def __init__(self):
+        super().__init__(None)
+
+    def add(self, key, amount=1):
+        pass
+
+    def set(self, key, value):
+        pass
+
+    def append(self, key, value):
+        pass
+
+    def observe(self, key, seconds):
+        pass
+
+_local = threading.local()
+_open_stages = []
+_open_lock = threading.Lock()
+# pid of the process whose profiler is running (a forked worker inherits the variable)
+_profiling_pid = None
+
+def current():
+    """Innermost stage of this thread, else the innermost stage open in the process.
+
+    The fallback lets worker threads (e.g. the concurrent fetch slices) report into
+    the stage that started them without passing it around.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        return stack[-1]
+    with _open_lock:
+        return _open_stages[-1] if _open_stages else NullMetrics()
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far (and of its finished child processes)"""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+def write_record(record):
+    if not PIPELINE_METRICS_FILE:
+        return
+    line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+    # One write() on an O_APPEND descriptor, so lines from parallel workers do not interleave
+    fd = os.open(PIPELINE_METRICS_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def stage(name):
+    """Measure a block as one stage and append its record to the metrics file.
+
+    Yields the StageMetrics for rows_in / rows_out / bytes counters and anything
+    else the stage wants to report. With PIPELINE_PROFILE_DIR set, the outermost
+    stage is also profiled into <dir>/<stage>.prof (one profiler per process at a
+    time; stages that start while it runs are only measured).
+    """
+    global _profiling_pid
+    metrics = StageMetrics(name)
+    stack = _local.__dict__.setdefault('stack', [])
+    profiler = None
+    with _open_lock:
+        if PIPELINE_PROFILE_DIR and _profiling_pid != os.getpid():
+            profiler = cProfile.Profile()
+            _profiling_pid = os.getpid()
+
+    stack.append(metrics)
+    with _open_lock:
+        _open_stages.append(metrics)
+    status = 'ok'
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield metrics
+    except BaseException:
+        status = 'failed'
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        if 'error' in metrics.values:
+            # Reported by a stage that handles its own errors
+            status = 'failed'
+        wall = time.perf_counter() - start
+        stack.pop()
+        with _open_lock:
+            _open_stages.remove(metrics)
+
+        record = {'run_id': RUN_ID, 'stage': name, 'status': status, 'pid': os.getpid(),
+                  'finished': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  'wall_seconds': round(wall, 4), 'cpu_seconds': round(time.process_time() - cpu_start, 4)}
+        record['peak_rss_mb'], record['peak_rss_children_mb'] = peak_rss_mb()
+        record.update(metrics.values)
+        for key in ('rows_in', 'rows_out'):
+            if key in record and wall > 0:
+                record[f'{key}_per_sec'] = round(record[key] / wall, 1)
+        write_record(record)
+
+        if profiler:
+            os.makedirs(PIPELINE_PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PIPELINE_PROFILE_DIR, f"{name}.prof"))
+            with _open_lock:
+                _profiling_pid = None
+
+def load_runs(path=PIPELINE_METRICS_FILE):
+    """{run_id: [records]} in file order"""
+    runs = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                runs.setdefault(record['run_id'], []).append(record)
+    return runs
+
+# Print the last run per stage, with the wall time change against the run before it
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else PIPELINE_METRICS_FILE
+    runs = load_runs(path)
+    if not runs:
+        print(f"No metrics in {path}")
+        sys.exit(0)
+
+    run_ids = list(runs)
+    latest = runs[run_ids[-1]]
+    previous = {record['stage']: record for record in runs[run_ids[-2]]} if len(run_ids) > 1 else {}
+
+    print(f"Run {run_ids[-1]}" + (f" (compared with {run_ids[-2]})" if previous else ""))
+    print(f"{'stage':<28}{'status':>8}{'wall s':>10}{'change':>9}{'rows out':>12}{'MB written':>12}{'peak MB':>9}")
+    for record in latest:
+        before = previous.get(record['stage'])
+        change = ""
+        if before and before['wall_seconds'] > 0:
+            change = f"{(record['wall_seconds'] / before['wall_seconds'] - 1) * 100:+.0f}%"
+        print(f"{record['stage']:<28}{record['status']:>8}{record['wall_seconds']:>10.2f}{change:>9}"
+              f"{record.get('rows_out', 0):>12,}{record.get('bytes_written', 0) / 1e6:>12.1f}"
+              f"{record['peak_rss_mb'] or 0:>9.0f}")
\ No newline at end of file
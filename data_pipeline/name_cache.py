@@ -0,0 +1,164 @@
+import json
+import os
+import re
+from collections import OrderedDict
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Bump when the normalization rules in Clean_files.py change, so old canonical names are dropped
+# (version 1 stored names after the synonym rules)
+NAME_CACHE_VERSION = 2
+
+NAME_CACHE_FILE = os.environ.get("NAME_CACHE_FILE", "name_cache.json")
+NAME_CACHE_MAX_ENTRIES = int(os.environ.get("NAME_CACHE_MAX_ENTRIES", "500000"))
+
+# Start of the synonyms value in a cache file
+SYNONYMS_KEY = re.compile(r'"synonyms"\s*:\s*')
+
+def read_synonyms(path=NAME_CACHE_FILE, block_size=65536):
+    """Synonym rules of a cache file, without parsing its entries.
+
+    save() writes the rules before the entries, so this normally reads the first
+    block of the file only, however many names are cached.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    decoder = json.JSONDecoder()
+    text = ""
+    try:
+        with open(path, encoding="utf-8") as f:
+            while True:
+                block = f.read(block_size)
+                text += block
+                match = SYNONYMS_KEY.search(text)
+                if match:
+                    try:
+                        return decoder.raw_decode(text, match.end())[0]
+                    except ValueError:
+                        pass  # cut off by the end of the block
+                if not block:
+                    return {}
+    except OSError:
+        return {}
+
+class NameCache:
+    """Persistent raw -> canonical map for facility, city, sponsor and intervention names.
+
+    canonicalize() normalizes each distinct raw value of a column once, remembers the
+    result, and broadcasts it back to every row, so the cost scales with the number
+    of distinct names instead of rows. Entries are evicted least-recently-used once
+    there are more than max_entries. The file also holds editable synonym rules
+    ({kind: {normalized name: canonical name}}). The cache stores names before those
+    rules and the rules are applied on every call, so editing them takes effect for
+    names that are already cached.
+    """
+
+    def __init__(self, path=NAME_CACHE_FILE, max_entries=NAME_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.dirty = False
+        self.hits = self.misses = 0
+        # The file is read on first use, so importing Clean_files stays cheap
+        self._entries = self._synonyms = None
+
+    def _ensure_loaded(self):
+        if self._entries is None:
+            self._entries, self._synonyms = self._load()
+
+    @property
+    def entries(self):
+        self._ensure_loaded()
+        return self._entries
+
+    @entries.setter
+    def entries(self, entries):
+        self._entries = entries
+
+    @property
+    def synonyms(self):
+        self._ensure_loaded()
+        return self._synonyms
+
+    def _load(self):
+        entries = OrderedDict()
+        synonyms = {}
+        if not self.path or not os.path.exists(self.path):
+            return entries, synonyms
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️ Ignoring unreadable name cache {self.path}")
+            return entries, synonyms
+
+        synonyms = data.get("synonyms", {})
+        if data.get("version") == NAME_CACHE_VERSION:
+            # Stored oldest first, so the order is the LRU order
+            for kind, raw, canonical in data.get("entries", []):
+                entries[(kind, raw)] = canonical
+        return entries, synonyms
+
+    def canonicalize(self, series, kind, normalize):
+        """Return series with every value replaced by its canonical name.
+
+        normalize gets a Series of raw strings (missing values as 'nan', like
+        astype(str) gives) and returns the normalized strings.
+        """
+        raw_values = series.astype(object).where(series.notna(), 'nan')
+        codes, uniques = pd.factorize(raw_values)
+        uniques = [str(value) for value in uniques]
+
+        entries = self.entries
+        canonical = np.empty(len(uniques), dtype=object)
+        missing = []
+        for i, raw in enumerate(uniques):
+            key = (kind, raw)
+            if key in entries:
+                entries.move_to_end(key)
+                canonical[i] = entries[key]
+            else:
+                missing.append(i)
+        self.hits += len(uniques) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            normalized = normalize(pd.Series([uniques[i] for i in missing], dtype=object))
+            for i, value in zip(missing, normalized.tolist()):
+                canonical[i] = value
+                entries[(kind, uniques[i])] = value
+            self.dirty = True
+            self._evict()
+
+        rules = self.synonyms.get(kind)
+        if rules:
+            canonical = np.array([rules.get(value, value) for value in canonical], dtype=object)
+
+        return pd.Series(canonical[codes], index=series.index, name=series.name)
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        """Write the cache, keeping entries other processes saved in the meantime"""
+        if not self.dirty or not self.path:
+            return
+        merged, synonyms = self._load()
+        for key, canonical in self.entries.items():
+            merged.pop(key, None)
+            merged[key] = canonical
+        self.entries = merged
+        self._evict()
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": NAME_CACHE_VERSION,
+                "synonyms": synonyms or self.synonyms,
+                "entries": [[kind, raw, canonical] for (kind, raw), canonical in self.entries.items()]
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
\ No newline at end of file
@@ -0,0 +1,438 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import metrics
+import table_io
+
+# Fingerprints of the last successful run of every stage
+PIPELINE_STATE_FILE = os.environ.get("PIPELINE_STATE_FILE", "pipeline_state.json")
+
+# Stages that may run at the same time (cleaners run in processes, loads in threads)
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "4"))
+
+# The API is not an input we can hash, so the extract is redone once its output is this old
+PIPELINE_EXTRACT_MAX_AGE_HOURS = float(os.environ.get("PIPELINE_EXTRACT_MAX_AGE_HOURS", "24"))
+
+TABLES = ['trials', 'locations', 'conditions', 'interventions']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class Stage:
+    """One node of the pipeline DAG.
+
+    The fingerprint of a stage covers its code files, its settings, the files it
+    reads and the last run of dependencies that only write to the database.
+    A stage is skipped when the fingerprint matches the last successful run and
+    its output files are unchanged, so a stage whose own input file came out the
+    same is skipped even if its dependency ran. use_processes runs the stage in the
+    worker process pool (CPU-bound cleaning) instead of the thread pool.
+    """
+
+    def __init__(self, name, func, args=(), deps=(), inputs=(), outputs=(), code=(), config=None,
+                 max_age_hours=None, use_processes=False):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.config = config or {}
+        self.max_age_hours = max_age_hours
+        self.use_processes = use_processes
+
+# -------------------------------
+# STAGE FUNCTIONS (module level so worker processes can unpickle them)
+# -------------------------------
+
+def run_extract_stage():
+    import clinicaltrials_extract
+    # run_extract reports errors itself and keeps the checkpoint for a resume
+    if not clinicaltrials_extract.run_extract():
+        raise RuntimeError("extract did not complete")
+
+def run_clean_stage(table):
+    """Clean one raw table and write its MySQL-ready file, returning the row count"""
+    import Clean_files
+
+    cleaners = {
+        'trials': Clean_files.clean_trials_data,
+        'locations': Clean_files.clean_locations_data,
+        'conditions': Clean_files.clean_conditions_data,
+        'interventions': Clean_files.clean_interventions_data,
+    }
+    with metrics.stage(f"clean.{table}") as stage_metrics:
+        if Clean_files.CLEAN_CHUNK_ROWS and table in ('locations', 'conditions'):
+            # Streamed straight to the MySQL-ready file
+            count = Clean_files.clean_table_chunked(table)
+        else:
+            df_clean = table_io.normalize_nulls(cleaners[table]())
+            stage_metrics.wrote_file(table_io.write_table(df_clean, table, 'mysql_ready'))
+            count = len(df_clean)
+        stage_metrics.set('rows_out', count)
+        Clean_files.name_cache.save()
+    return count
+
+def run_taxonomy_stage():
+    """Write the taxonomy_categories lookup, returning its row count"""
+    import taxonomy
+
+    with metrics.stage("clean.taxonomy") as stage_metrics:
+        df = taxonomy.lookup_table()
+        stage_metrics.wrote_file(table_io.write_table(df, 'taxonomy_categories', 'mysql_ready'))
+        stage_metrics.set('rows_out', len(df))
+    return len(df)
+
+def run_load_stage(table):
+    """Replace the rows of one table in the database with its MySQL-ready file"""
+    import db
+    import schema
+    import SQL3
+
+    pool = db.get_pool()
+    if pool.backend == 'sqlite':
+        if SQL3.IMPORT_METHOD == 'load_data':
+            raise ValueError("The SQLite backend does not support SQL_IMPORT_METHOD=load_data")
+        with pool.connection() as connection:
+            SQL3.create_sqlite_tables(connection)
+
+    # Emptying trials cascades to the child tables, which reload after it anyway
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"DELETE FROM {schema.physical_table(table) if pool.backend == 'mysql' else table}")
+        connection.commit()
+        cursor.close()
+
+    if table in SQL3.OPTIONAL_TABLES:
+        return SQL3.load_optional_table(pool, table)[0]
+    if table != 'trials':
+        return SQL3.load_child_table(pool, table)[0]
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        count, _ = SQL3.load_table(cursor, 'trials', 'trials', pool.placeholder)
+        connection.commit()
+        cursor.close()
+    return count
+
+def run_summary_stage():
+    import db
+    import summary_tables
+
+    pool = db.get_pool()
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        summary_tables.create_summary_tables(cursor)
+        summary_tables.refresh_summaries(cursor, backend=pool.backend)
+        connection.commit()
+        cursor.close()
+
+# -------------------------------
+# DAG
+# -------------------------------
+
+def code_files(*modules):
+    return [os.path.join(HERE, f"{module}.py") for module in modules]
+
+def output_format():
+    """Format the extract and cleaning stages actually write (CSV when pyarrow is missing)"""
+    return table_io.active_format()
+
+def build_stages():
+    """extract -> clean/prepare per table -> load per table -> summaries, keyed by stage name"""
+    import db
+    import Clean_files
+    import name_cache
+    import schema
+    import SQL3
+    import taxonomy
+
+    fmt = output_format()
+    db_config = db.load_config()
+    # Where the rows go: pointing at another database reloads it, a new password does not
+    db_target = {key: db_config[key] for key in ('backend', 'host', 'port', 'database')}
+
+    stages = [Stage(
+        'extract', run_extract_stage,
+        outputs=[table_io.table_path(table, fmt=fmt) for table in TABLES],
+        code=code_files('clinicaltrials_extract', 'response_cache', 'date_parsing', 'study_projection', 'table_io'),
+        config={'api_url': os.environ.get("CT_API_URL", ""), 'format': fmt},
+        max_age_hours=PIPELINE_EXTRACT_MAX_AGE_HOURS,
+    )]
+
+    for table in TABLES:
+        # Cleaning and MySQL preparation (null normalization, *_mysql_ready files) are one
+        # step since Clean_files2.py was folded into Clean_files.py
+        stages.append(Stage(
+            f'clean_{table}', run_clean_stage, args=(table,),
+            deps=['extract'],
+            # Conditions and interventions are tagged from the taxonomy vocabulary
+            inputs=[table_io.table_path(table, fmt=fmt)]
+                   + ([taxonomy.TAXONOMY_FILE] if table in ('conditions', 'interventions') else []),
+            outputs=[table_io.table_path(table, 'mysql_ready', fmt)],
+            code=code_files('Clean_files', 'table_io', 'date_parsing', 'name_cache', 'entity_resolution',
+                            'taxonomy'),
+            config={'format': fmt, 'chunk_rows': Clean_files.CLEAN_CHUNK_ROWS,
+                    'entity_match_threshold': Clean_files.entity_resolution.ENTITY_MATCH_THRESHOLD,
+                    # Learned names are only a cache, but synonyms change the output. Only
+                    # the synonyms section is read, not the (large) learned names.
+                    'synonyms': name_cache.read_synonyms(Clean_files.name_cache.path)},
+            use_processes=True,
+        ))
+
+    for table in TABLES:
+        stages.append(Stage(
+            f'load_{table}', run_load_stage, args=(table,),
+            # Reloading trials empties the child tables through the foreign keys
+            deps=[f'clean_{table}'] + ([] if table == 'trials' else ['load_trials']),
+            inputs=[table_io.table_path(table, 'mysql_ready', fmt)],
+            code=code_files('SQL3', 'schema', 'db'),
+            config={'db': db_target, 'method': SQL3.IMPORT_METHOD, 'layout': schema.SCHEMA_LAYOUT},
+        ))
+
+    # Optional lookup of the taxonomy categories, straight from the vocabulary
+    stages += [
+        Stage(
+            'clean_taxonomy', run_taxonomy_stage,
+            inputs=[taxonomy.TAXONOMY_FILE],
+            outputs=[table_io.table_path('taxonomy_categories', 'mysql_ready', fmt)],
+            code=code_files('taxonomy', 'table_io'),
+            config={'format': fmt},
+            use_processes=True,
+        ),
+        Stage(
+            'load_taxonomy', run_load_stage, args=('taxonomy_categories',),
+            deps=['clean_taxonomy'],
+            inputs=[table_io.table_path('taxonomy_categories', 'mysql_ready', fmt)],
+            code=code_files('SQL3', 'schema', 'db'),
+            config={'db': db_target, 'method': SQL3.IMPORT_METHOD},
+        ),
+    ]
+
+    if SQL3.REFRESH_SUMMARIES:
+        stages.append(Stage(
+            'summaries', run_summary_stage,
+            deps=[f'load_{table}' for table in TABLES],
+            code=code_files('summary_tables'),
+            config={'db': db_target},
+        ))
+
+    return {stage.name: stage for stage in stages}
+
+# -------------------------------
+# FINGERPRINTS AND STATE
+# -------------------------------
+
+def load_state():
+    if not os.path.exists(PIPELINE_STATE_FILE):
+        return {'stages': {}, 'files': {}}
+    with open(PIPELINE_STATE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state):
+    """Write the state atomically so a crash never leaves a half-written file"""
+    tmp_path = PIPELINE_STATE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, PIPELINE_STATE_FILE)
+
+def file_hash(path, state):
+    """sha256 of a file, re-read only when its size or mtime changed since the last hash"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    cached = state['files'].get(path)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    state['files'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+def fingerprint(stage, stages, state):
+    payload = {
+        'code': {os.path.basename(path): file_hash(path, state) for path in stage.code},
+        'config': stage.config,
+        'inputs': {path: file_hash(path, state) for path in stage.inputs},
+        # Database-only stages have no files to hash, so every run of them counts as a change
+        # (reloading trials empties the child tables even when nothing else changed)
+        'deps': {dep: state['stages'].get(dep, {}).get('finished')
+                 for dep in stage.deps if not stages[dep].outputs},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def stale_reason(stage, current, state):
+    """Why a stage has to run again, or None when it is up to date"""
+    recorded = state['stages'].get(stage.name)
+    if not recorded:
+        return "never ran"
+    if recorded['fingerprint'] != current:
+        return "code, settings or inputs changed"
+    if stage.max_age_hours is not None and time.time() - recorded['finished'] > stage.max_age_hours * 3600:
+        return f"older than {stage.max_age_hours:g}h"
+    # Output files deleted or edited since the stage wrote them
+    if any(file_hash(path, state) != recorded['outputs'].get(path) for path in stage.outputs):
+        return "outputs changed"
+    return None
+
+def is_up_to_date(stage, current, state):
+    return stale_reason(stage, current, state) is None
+
+def with_dependencies(names, stages):
+    selected = set()
+    todo = list(names)
+    while todo:
+        name = todo.pop()
+        if name not in stages:
+            raise ValueError(f"Unknown stage: {name} (stages: {', '.join(stages)})")
+        if name not in selected:
+            selected.add(name)
+            todo.extend(stages[name].deps)
+    return selected
+
+# -------------------------------
+# SCHEDULER
+# -------------------------------
+
+def process_context():
+    """Start method of the cleaning processes: never fork a process whose threads are running.
+
+    The extract thread imports pandas and pyarrow lazily while the process pool
+    starts its workers. A forked worker inherits the import lock that thread
+    holds and waits for it forever. A forkserver (spawn where there is none)
+    starts the workers from a clean process. It imports the stage modules once,
+    so each worker does not import pandas again.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__, 'Clean_files', 'taxonomy'])
+    return context
+
+def run_pipeline(targets=None, force=(), workers=PIPELINE_WORKERS):
+    """Bring the target stages (default: all) up to date, running ready stages side by side.
+
+    force lists stage names to rerun even when their fingerprint matches ('all' for every
+    stage). Returns {stage: 'ran' | 'skipped' | 'failed' | 'not run'}.
+    """
+    stages = build_stages()
+    selected = with_dependencies(targets or list(stages), stages)
+    state = load_state()
+    status = {}
+    running = {}
+    failed = False
+    start = time.perf_counter()
+
+    context = process_context()
+    with ThreadPoolExecutor(max_workers=workers) as threads, ProcessPoolExecutor(workers, context) as processes:
+        while True:
+            # Schedule every stage whose dependencies are finished, in declaration order
+            progress = True
+            while progress and not failed:
+                progress = False
+                for name in stages:
+                    if name not in selected or name in status or name in running:
+                        continue
+                    stage = stages[name]
+                    if any(status.get(dep) not in ('ran', 'skipped') for dep in stage.deps):
+                        continue
+
+                    current = fingerprint(stage, stages, state)
+                    if 'all' not in force and name not in force and is_up_to_date(stage, current, state):
+                        print(f"⏭️  {name}: up to date")
+                        status[name] = 'skipped'
+                        progress = True
+                        continue
+
+                    print(f"▶️  {name}: running")
+                    executor = processes if stage.use_processes else threads
+                    running[name] = (executor.submit(stage.func, *stage.args), current, time.perf_counter())
+
+            if not running:
+                break
+
+            done, _ = wait([future for future, _, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name in [name for name, (future, _, _) in running.items() if future in done]:
+                future, current, stage_start = running.pop(name)
+                elapsed = time.perf_counter() - stage_start
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"❌ {name} failed after {elapsed:.1f}s: {e}")
+                    status[name] = 'failed'
+                    failed = True
+                    continue
+
+                stage = stages[name]
+                state['stages'][name] = {
+                    'fingerprint': current,
+                    'finished': time.time(),
+                    'seconds': round(elapsed, 3),
+                    'outputs': {path: file_hash(path, state) for path in stage.outputs},
+                }
+                save_state(state)
+                status[name] = 'ran'
+                print(f"✅ {name}: done in {elapsed:.1f}s")
+
+    for name in stages:
+        if name in selected and name not in status:
+            status[name] = 'not run'
+
+    print(f"\n=== PIPELINE SUMMARY ({time.perf_counter() - start:.1f}s) ===")
+    for name, result in sorted(status.items(), key=lambda item: list(stages).index(item[0])):
+        print(f"{name}: {result}")
+    return status
+
+def plan_pipeline(targets=None, force=()):
+    """What run_pipeline would do, without running anything or touching the state file.
+
+    Returns {stage: None | reason}: None for a stage that would be skipped, else why
+    it would run. A stage after one that runs is reported as running too, since its
+    inputs are about to change.
+    """
+    stages = build_stages()
+    selected = with_dependencies(targets or list(stages), stages)
+    state = load_state()
+    plan = {}
+
+    for name, stage in stages.items():
+        if name not in selected:
+            continue
+        if 'all' in force or name in force:
+            plan[name] = "forced"
+        elif any(plan[dep] for dep in stage.deps):
+            plan[name] = "dependency runs"
+        else:
+            plan[name] = stale_reason(stage, fingerprint(stage, stages, state), state)
+
+    for name, reason in plan.items():
+        print(f"▶️  {name}: would run ({reason})" if reason else f"⏭️  {name}: up to date")
+    return plan
+
+def add_arguments(parser):
+    parser.add_argument("targets", nargs="*", help="stages to bring up to date, with their dependencies (default: all)")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE",
+                        help="rerun these stages even if they are up to date ('all' for every stage)")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only show which stages are up to date and which would run")
+
+def main(args):
+    if args.dry_run:
+        plan_pipeline(args.targets, args.force)
+        return 0
+    results = run_pipeline(args.targets, args.force, args.workers)
+    return 1 if 'failed' in results.values() else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run extract -> clean -> load -> summaries, skipping up-to-date stages")
+    add_arguments(parser)
+    sys.exit(main(parser.parse_args()))
\ No newline at end of file
@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+class ResponseCache:
+    """Content-addressed on-disk cache for decoded JSON API responses.
+
+    Every entry is a gzip-compressed JSON file named after the SHA-256 of the URL
+    plus the sorted query parameters. Entries older than ttl_seconds are treated as
+    missing, and once the cache grows past max_bytes the least recently used
+    entries are deleted. In offline mode the TTL is ignored so a recorded cache
+    can be replayed without network access.
+    """
+
+    def __init__(self, cache_dir, ttl_seconds=24 * 3600, max_bytes=500 * 1024 * 1024, offline=False):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.total_bytes = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, params):
+        key_source = url + "?" + json.dumps(params or {}, sort_keys=True, default=str)
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + ".json.gz")
+
+    def get(self, url, params):
+        """Return the cached JSON for this request, or None on a miss"""
+        path = self._path(url, params)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        if not self.offline and time.time() - stat.st_mtime > self.ttl_seconds:
+            return None
+
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # Truncated or corrupt entry: behave like a miss, it gets rewritten
+            return None
+
+        # Access time drives LRU eviction, modification time drives the TTL
+        os.utime(path, (time.time(), stat.st_mtime))
+        return data
+
+    def put(self, url, params, data):
+        """Store a decoded JSON response and evict old entries if over the size limit"""
+        path = self._path(url, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            else:
+                self.total_bytes += os.path.getsize(path) - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    path = os.path.join(root, name)
+                    try:
+                        yield path, os.stat(path)
+                    except FileNotFoundError:
+                        continue
+
+    def _scan_size(self):
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is back under 90% of max_bytes"""
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_atime)
+        self.total_bytes = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self.total_bytes -= stat.st_size
+            except FileNotFoundError:
+                continue
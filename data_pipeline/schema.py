@@ -0,0 +1,236 @@
+import os
+import re
+import sys
+
+# 'flat' keeps condition/intervention names inline, 'lookup' stores each distinct
+# name once and exposes the old tables as views
+SCHEMA_LAYOUT = os.environ.get("SQL_SCHEMA_LAYOUT", "flat")
+
+# Partition trials by start year (read-mostly reporting copies, see build_schema)
+PARTITION_BY_START_DATE = os.environ.get("SQL_PARTITION_BY_START_DATE", "0") == "1"
+
+# Child tables that move their names into a lookup table in the 'lookup' layout:
+# table -> (physical link table, lookup table, name column, columns that depend on the name only)
+LOOKUP_CHILDREN = {
+    'conditions': ('trial_conditions', 'condition_names', 'condition_name', ['condition_category']),
+    'interventions': ('trial_interventions', 'intervention_names', 'intervention_name', ['intervention_category']),
+}
+
+# Column definitions of the per-import staging tables (always the flat shape of the files)
+STAGING_COLUMNS = {
+    'trials': """nct_id VARCHAR(20) PRIMARY KEY, title TEXT, status VARCHAR(50), phase VARCHAR(20),
+                 study_type VARCHAR(50), sponsor VARCHAR(255), start_date DATE, completion_date DATE,
+                 enrollment INT, start_date_month_only BOOLEAN, completion_date_month_only BOOLEAN,
+                 sponsor_id VARCHAR(16)""",
+    'locations': """nct_id VARCHAR(20), country VARCHAR(100), state VARCHAR(100), city VARCHAR(100),
+                    facility VARCHAR(255), facility_id VARCHAR(16)""",
+    'conditions': "nct_id VARCHAR(20), condition_name VARCHAR(255), condition_category VARCHAR(255)",
+    'interventions': """nct_id VARCHAR(20), intervention_type VARCHAR(100), intervention_name VARCHAR(255),
+                        intervention_category VARCHAR(255)""",
+    'taxonomy_categories': "kind VARCHAR(20), category VARCHAR(255), category_group VARCHAR(100)",
+}
+
+def trials_ddl(partition):
+    """trials with composite indexes for the status/phase/year visuals and a FULLTEXT title index"""
+    if partition:
+        # Every unique key of a partitioned table must contain the partitioning column,
+        # and partitioned InnoDB tables cannot take part in foreign keys or FULLTEXT indexes
+        key = "PRIMARY KEY (nct_id, start_year)"
+        title_index = ""
+        partitions = ",\n        ".join(
+            [f"PARTITION p{year} VALUES LESS THAN ({year + 5})" for year in range(2000, 2035, 5)]
+            + ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+        partition_clause = f"""
+    PARTITION BY RANGE (start_year) (
+        PARTITION p_before_2000 VALUES LESS THAN (2000),
+        {partitions}
+    )"""
+    else:
+        key = "PRIMARY KEY (nct_id)"
+        title_index = ",\n    FULLTEXT INDEX ft_title (title)"
+        partition_clause = ""
+
+    return f"""CREATE TABLE trials (
+    nct_id VARCHAR(20) NOT NULL,
+    title TEXT,
+    status VARCHAR(50),
+    phase VARCHAR(20),
+    study_type VARCHAR(50),
+    sponsor VARCHAR(255) DEFAULT 'Unknown',
+    sponsor_id VARCHAR(16),
+    start_date DATE,
+    completion_date DATE,
+    enrollment INT DEFAULT 0,
+    start_date_month_only BOOLEAN DEFAULT FALSE,
+    completion_date_month_only BOOLEAN DEFAULT FALSE,
+    start_year SMALLINT AS (COALESCE(YEAR(start_date), 0)) STORED NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    {key},
+    INDEX idx_status_phase_start (status, phase, start_date),
+    INDEX idx_status (status),
+    INDEX idx_status_nct_phase (status, nct_id, phase),
+    INDEX idx_status_dates (status, start_date, completion_date),
+    INDEX idx_start_status (start_date, status),
+    INDEX idx_phase_status (phase, status),
+    INDEX idx_study_type (study_type),
+    INDEX idx_sponsor (sponsor),
+    INDEX idx_sponsor_id (sponsor_id){title_index}
+){partition_clause}"""
+
+def child_fk(partition):
+    return "" if partition else ",\n    FOREIGN KEY (nct_id) REFERENCES trials(nct_id) ON DELETE CASCADE"
+
+def build_schema(layout=SCHEMA_LAYOUT, partition=PARTITION_BY_START_DATE):
+    """Return the CREATE statements of the redesigned schema as a list.
+
+    Both layouts expose the same trials/locations/conditions/interventions columns,
+    so Power BI, summary_tables.py and the benchmark queries work on either one.
+    With partition=True trials is range-partitioned on its start year; nct_id is
+    then only unique together with start_year and the child tables lose their
+    foreign keys, so use it for reporting copies loaded with SQL_IMPORT_MODE=insert.
+    """
+    fk = child_fk(partition)
+    statements = [trials_ddl(partition), f"""CREATE TABLE locations (
+    location_id INT AUTO_INCREMENT PRIMARY KEY,
+    nct_id VARCHAR(20),
+    country VARCHAR(100),
+    state VARCHAR(100),
+    city VARCHAR(100),
+    facility VARCHAR(255),
+    facility_id VARCHAR(16),
+    INDEX idx_nct_country (nct_id, country),
+    INDEX idx_country_nct (country, nct_id),
+    INDEX idx_country_state_city (country, state, city),
+    INDEX idx_facility_id (facility_id){fk}
+)"""]
+
+    if layout == 'lookup':
+        statements += [
+            """CREATE TABLE condition_names (
+    condition_name_id INT AUTO_INCREMENT PRIMARY KEY,
+    condition_name VARCHAR(255) NOT NULL,
+    condition_category VARCHAR(255),
+    UNIQUE KEY uq_condition_name (condition_name),
+    INDEX idx_condition_category (condition_category)
+)""",
+            f"""CREATE TABLE trial_conditions (
+    condition_id INT AUTO_INCREMENT PRIMARY KEY,
+    nct_id VARCHAR(20),
+    condition_name_id INT NOT NULL,
+    INDEX idx_nct_condition (nct_id, condition_name_id),
+    INDEX idx_condition_nct (condition_name_id, nct_id),
+    FOREIGN KEY (condition_name_id) REFERENCES condition_names(condition_name_id){fk}
+)""",
+            """CREATE VIEW conditions AS
+SELECT tc.condition_id, tc.nct_id, cn.condition_name, cn.condition_category
+FROM trial_conditions tc
+JOIN condition_names cn ON cn.condition_name_id = tc.condition_name_id""",
+            """CREATE TABLE intervention_names (
+    intervention_name_id INT AUTO_INCREMENT PRIMARY KEY,
+    intervention_name VARCHAR(255) NOT NULL,
+    intervention_category VARCHAR(255),
+    UNIQUE KEY uq_intervention_name (intervention_name),
+    INDEX idx_intervention_category (intervention_category)
+)""",
+            f"""CREATE TABLE trial_interventions (
+    intervention_id INT AUTO_INCREMENT PRIMARY KEY,
+    nct_id VARCHAR(20),
+    intervention_type VARCHAR(100),
+    intervention_name_id INT NOT NULL,
+    INDEX idx_nct_type_name (nct_id, intervention_type, intervention_name_id),
+    INDEX idx_type_nct (intervention_type, nct_id),
+    INDEX idx_name_nct (intervention_name_id, nct_id),
+    FOREIGN KEY (intervention_name_id) REFERENCES intervention_names(intervention_name_id){fk}
+)""",
+            """CREATE VIEW interventions AS
+SELECT ti.intervention_id, ti.nct_id, ti.intervention_type, iname.intervention_name, iname.intervention_category
+FROM trial_interventions ti
+JOIN intervention_names iname ON iname.intervention_name_id = ti.intervention_name_id""",
+        ]
+    else:
+        statements += [
+            f"""CREATE TABLE conditions (
+    condition_id INT AUTO_INCREMENT PRIMARY KEY,
+    nct_id VARCHAR(20),
+    condition_name VARCHAR(255),
+    condition_category VARCHAR(255),
+    INDEX idx_nct_condition (nct_id, condition_name),
+    INDEX idx_condition_nct (condition_name, nct_id),
+    INDEX idx_condition_category_nct (condition_category, nct_id){fk}
+)""",
+            f"""CREATE TABLE interventions (
+    intervention_id INT AUTO_INCREMENT PRIMARY KEY,
+    nct_id VARCHAR(20),
+    intervention_type VARCHAR(100),
+    intervention_name VARCHAR(255),
+    intervention_category VARCHAR(255),
+    INDEX idx_nct_type_name (nct_id, intervention_type, intervention_name),
+    INDEX idx_type_nct (intervention_type, nct_id),
+    INDEX idx_name_nct (intervention_name, nct_id),
+    INDEX idx_intervention_category_nct (intervention_category, nct_id){fk}
+)""",
+        ]
+
+    statements.append("""CREATE TABLE taxonomy_categories (
+    kind VARCHAR(20) NOT NULL,
+    category VARCHAR(255) NOT NULL,
+    category_group VARCHAR(100),
+    PRIMARY KEY (kind, category)
+)""")
+    return statements
+
+def flat_indexes():
+    """Table -> [(index name, column list)] of the flat layout, read from its DDL.
+
+    FULLTEXT indexes are MySQL-specific and left out.
+    """
+    indexes = {}
+    for statement in build_schema('flat', partition=False):
+        table = re.match(r"CREATE TABLE (\w+)", statement).group(1)
+        indexes[table] = re.findall(r"^\s*INDEX (\w+) \(([^)]+)\)", statement, re.MULTILINE)
+    return indexes
+
+def physical_table(table, layout=SCHEMA_LAYOUT):
+    """Table that actually stores the rows of a (possibly view-backed) table"""
+    if layout == 'lookup' and table in LOOKUP_CHILDREN:
+        return LOOKUP_CHILDREN[table][0]
+    return table
+
+def uses_lookup(table, layout=SCHEMA_LAYOUT):
+    return layout == 'lookup' and table in LOOKUP_CHILDREN
+
+def staging_table_sql(table, name):
+    """CREATE TEMPORARY TABLE statement for the staging copy of a table"""
+    return f"CREATE TEMPORARY TABLE {name} ({STAGING_COLUMNS[table]})"
+
+def child_insert_statements(table, source, columns, layout=SCHEMA_LAYOUT):
+    """Statements copying flat rows from source (staging table or query) into a child table"""
+    if not uses_lookup(table, layout):
+        column_list = ', '.join(columns)
+        return [f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {source}"]
+
+    link_table, lookup_table, name_column, name_attributes = LOOKUP_CHILDREN[table]
+    other_columns = [col for col in columns if col != name_column and col not in name_attributes]
+    attributes = [col for col in name_attributes if col in columns]
+    # New names get an id first; existing ones keep it but take the latest attributes
+    insert = (f"""INSERT INTO {lookup_table} ({', '.join([name_column] + attributes)})
+            SELECT {name_column}{''.join(f', MAX({col})' for col in attributes)}
+            FROM {source} WHERE {name_column} IS NOT NULL GROUP BY {name_column}
+            ON DUPLICATE KEY UPDATE {', '.join(f'{col} = VALUES({col})' for col in attributes)}"""
+              if attributes else
+              f"""INSERT IGNORE INTO {lookup_table} ({name_column})
+            SELECT DISTINCT {name_column} FROM {source} WHERE {name_column} IS NOT NULL""")
+    return [
+        insert,
+        f"""INSERT INTO {link_table} ({', '.join(other_columns)}, {name_column}_id)
+            SELECT {', '.join('s.' + col for col in other_columns)}, n.{name_column}_id
+            FROM {source} AS s
+            JOIN {lookup_table} AS n ON n.{name_column} = s.{name_column}""",
+    ]
+
+if __name__ == "__main__":
+    # Print the DDL, e.g.  python schema.py lookup > schema_lookup.sql
+    layout = sys.argv[1] if len(sys.argv) > 1 else SCHEMA_LAYOUT
+    print("CREATE DATABASE clinical_trials;\nUSE clinical_trials;\n")
+    for statement in build_schema(layout):
+        print(statement + ";\n")
\ No newline at end of file
@@ -0,0 +1,182 @@
+import json
+from functools import lru_cache
+
+from date_parsing import normalize_date_text
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Every value the extractor keeps, declared once: table -> (path of the repeated item or
+# None for one row per study, [(column, API field name, candidate paths, converter)]).
+# Paths are relative to protocolSection (trials) or to the repeated item; '' is the item
+# itself, 0 the first list element. The first candidate path that exists wins.
+PROJECTION = {
+    'trials': (None, [
+        ('nct_id', 'NCTId', ['identificationModule.nctId'], None),
+        ('title', 'BriefTitle', ['identificationModule.briefTitle'], None),
+        ('status', 'OverallStatus', ['statusModule.overallStatus'], None),
+        ('phase', 'Phase', ['designModule.phases.0'], None),
+        ('study_type', 'StudyType', ['designModule.studyType'], None),
+        # v2 calls it sponsorCollaboratorsModule; the older spelling is kept as a fallback
+        ('sponsor', 'LeadSponsorName', ['sponsorCollaboratorsModule.leadSponsor.name',
+                                        'sponsorsCollaboratorsModule.leadSponsor.name'], None),
+        ('start_date', 'StartDate', ['statusModule.startDateStruct.date'], 'normalize_date_text'),
+        ('completion_date', 'PrimaryCompletionDate', ['statusModule.primaryCompletionDateStruct.date'],
+         'normalize_date_text'),
+        # v2 reports enrollment in designModule.enrollmentInfo, older payloads in statusModule
+        ('enrollment', 'EnrollmentCount', ['designModule.enrollmentInfo.count', 'statusModule.enrollment.count',
+                                           'statusModule.enrollment'], None),
+    ]),
+    'locations': ('contactsLocationsModule.locations', [
+        ('country', 'LocationCountry', ['country'], None),
+        ('state', 'LocationState', ['state'], None),
+        ('city', 'LocationCity', ['city'], None),
+        ('facility', 'LocationFacility', ['facility'], None),
+    ]),
+    'conditions': ('conditionsModule.conditions', [
+        ('condition', 'Condition', [''], None),
+    ]),
+    'interventions': ('armsInterventionsModule.interventions', [
+        ('intervention_type', 'InterventionType', ['type'], None),
+        ('intervention_name', 'InterventionName', ['name'], None),
+    ]),
+}
+
+# Converters a column may name. Registry dates repeat a lot (a few
+# thousand distinct days per decade), so each distinct string is parsed once.
+CONVERTERS = {'normalize_date_text': lru_cache(maxsize=65536)(normalize_date_text)}
+
+def api_fields():
+    """API field names for the 'fields' query parameter, in declaration order"""
+    return [field for _, columns in PROJECTION.values() for _, field, _, _ in columns]
+
+def table_headers():
+    """CSV header of every table: nct_id first, then the projected columns"""
+    return {table: [name for name, _, _, _ in columns] if item_path is None
+            else ['nct_id'] + [name for name, _, _, _ in columns]
+            for table, (item_path, columns) in PROJECTION.items()}
+
+def decode_json(data):
+    """Decode a response body, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def path_getter(path, default=None):
+    """Function item -> value at path, or default when a step is missing or the value is null"""
+    steps = [int(step) if step.isdigit() else step for step in path.split('.') if step]
+    if not steps:
+        return lambda item: default if item is None else item
+    if all(type(step) is str for step in steps):
+        def get_keys(value):
+            for key in steps:
+                if type(value) is not dict:
+                    return default
+                value = value.get(key)
+            return default if value is None else value
+        return get_keys
+
+    def get(value):
+        for step in steps:
+            if type(step) is int:
+                value = value[step] if type(value) is list and len(value) > step else None
+            else:
+                value = value.get(step) if type(value) is dict else None
+        return default if value is None else value
+    return get
+
+def value_getter(paths, converter):
+    """Function item -> first existing candidate path ('' when none exists), converted"""
+    convert = CONVERTERS[converter] if converter else None
+    if len(paths) == 1 and convert is None:
+        return path_getter(paths[0], '')
+    getters = [(path_getter(path), index > 0 and any(other.startswith(path + '.') for other in paths))
+               for index, path in enumerate(paths)]
+
+    def get(item):
+        value = None
+        for getter, scalar_only in getters:
+            value = getter(item)
+            # A parent of another candidate (enrollment vs enrollment.count) only counts as a scalar
+            if value is not None and not (scalar_only and type(value) is dict):
+                break
+            value = None
+        if value is None:
+            value = ''
+        return convert(value) if convert else value
+    return get
+
+def column_getter(paths, converter):
+    """Function items -> the value_getter values of every item in a list"""
+    steps = paths[0].split('.')
+    if len(paths) == 1 and converter is None and len(steps) == 1 and steps[0] and not steps[0].isdigit():
+        # Most item columns are one key of the item, e.g. a location's city
+        key = steps[0]
+        return lambda items: ['' if value is None else value for item in items
+                              for value in [item.get(key) if type(item) is dict else None]]
+    get = value_getter(paths, converter)
+    return lambda items: [get(item) for item in items]
+
+def build_projection():
+    """Build a function project(studies, seen, columns) -> studies added.
+
+    It walks each study once and appends the values straight to the column lists
+    in columns[table][column]. Studies without an NCT ID or whose ID is already in
+    seen are skipped; added IDs go into seen.
+    """
+    trial_columns = PROJECTION['trials'][1]
+    nct_id_of = value_getter(trial_columns[0][2], trial_columns[0][3])
+    trial_getters = [(name, value_getter(paths, converter)) for name, _, paths, converter in trial_columns[1:]]
+    child_getters = [(table, path_getter(item_path),
+                      [(name, column_getter(paths, converter)) for name, _, paths, converter in columns])
+                     for table, (item_path, columns) in PROJECTION.items() if item_path is not None]
+
+    def project(studies, seen, columns):
+        trials = [(columns['trials'][name].append, get) for name, get in trial_getters]
+        append_nct_id = columns['trials']['nct_id'].append
+        children = [(columns[table], items_of, columns[table]['nct_id'].extend,
+                     [(columns[table][name].extend, get) for name, get in getters])
+                    for table, items_of, getters in child_getters]
+        added = 0
+        for study in studies:
+            protocol = study.get('protocolSection') if type(study) is dict else None
+            if type(protocol) is not dict:
+                continue
+            nct_id = nct_id_of(protocol)
+            if not nct_id or nct_id in seen:
+                continue
+            # Children first: a study whose items fail to project leaves no partial rows behind
+            marks = [len(table_columns['nct_id']) for table_columns, _, _, _ in children]
+            try:
+                for _, items_of, extend_nct_id, extends in children:
+                    items = items_of(protocol)
+                    if type(items) is list:
+                        extend_nct_id([nct_id] * len(items))
+                        for extend, values_of in extends:
+                            extend(values_of(items))
+                trial_values = [get(protocol) for _, get in trials]
+            except Exception as e:
+                print(f'Error processing study {nct_id}: {e}')
+                for (table_columns, _, _, _), mark in zip(children, marks):
+                    for values in table_columns.values():
+                        del values[mark:]
+                continue
+            append_nct_id(nct_id)
+            for (append, _), value in zip(trials, trial_values):
+                append(value)
+            seen.add(nct_id)
+            added += 1
+        return added
+    return project
+
+project = build_projection()
+
+def new_columns():
+    """Empty column buffers for one page: {table: {column: []}}"""
+    return {table: {name: [] for name in header} for table, header in table_headers().items()}
+
+def column_rows(columns, table):
+    """Rows of one table from its column buffers, in header order"""
+    return zip(*columns[table].values())
\ No newline at end of file
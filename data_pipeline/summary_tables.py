@@ -0,0 +1,195 @@
+# Pre-aggregated tables for the Power BI pages, refreshed after every import.
+#
+# Each summary is rebuilt only for the groups that contain imported trials: their keys
+# are captured before and after the merge, the matching summary rows are deleted,
+# and just those groups are re-aggregated from the detail tables.
+
+import time
+
+import metrics
+
+# SQL that differs between the backends
+DIALECTS = {
+    'mysql': {
+        'year': "YEAR(start_date)",
+        'days': "DATEDIFF(completion_date, start_date)",
+        'today': "CURDATE()",
+        'insert_ignore': "INSERT IGNORE",
+        'drop_temporary': "DROP TEMPORARY TABLE IF EXISTS {table}",
+        'delete_keys': "DELETE s FROM {summary} s JOIN {affected} a ON ({s_keys}) = ({a_keys})",
+    },
+    'sqlite': {
+        'year': "CAST(strftime('%Y', start_date) AS INTEGER)",
+        'days': "CAST(julianday(completion_date) - julianday(start_date) AS INTEGER)",
+        'today': "date('now')",
+        'insert_ignore': "INSERT OR IGNORE",
+        'drop_temporary': "DROP TABLE IF EXISTS temp.{table}",
+        'delete_keys': "DELETE FROM {summary} WHERE ({keys}) IN (SELECT {keys} FROM {affected})",
+    },
+}
+
+# Summary table -> (key columns of the affected-keys table, CREATE TABLE statement)
+SUMMARY_DDL = {
+    'summary_trials': ('status VARCHAR(50), phase VARCHAR(20), start_year INT', """
+        CREATE TABLE IF NOT EXISTS summary_trials (
+            status VARCHAR(50) NOT NULL,
+            phase VARCHAR(20) NOT NULL,
+            start_year INT NOT NULL,
+            trial_count INT NOT NULL,
+            enrollment_sum BIGINT NOT NULL,
+            duration_days_sum BIGINT NOT NULL,
+            duration_count INT NOT NULL,
+            PRIMARY KEY (status, phase, start_year)
+        )
+    """),
+    'summary_country': ('country VARCHAR(100)', """
+        CREATE TABLE IF NOT EXISTS summary_country (
+            country VARCHAR(100) NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            trial_count INT NOT NULL,
+            location_count INT NOT NULL,
+            PRIMARY KEY (country, status)
+        )
+    """),
+    'summary_conditions': ('condition_name VARCHAR(255)', """
+        CREATE TABLE IF NOT EXISTS summary_conditions (
+            condition_name VARCHAR(255) NOT NULL,
+            phase VARCHAR(20) NOT NULL,
+            trial_count INT NOT NULL,
+            enrollment_sum BIGINT NOT NULL,
+            PRIMARY KEY (condition_name, phase)
+        )
+    """),
+    'summary_interventions': ('intervention_type VARCHAR(100), intervention_name VARCHAR(255)', """
+        CREATE TABLE IF NOT EXISTS summary_interventions (
+            intervention_type VARCHAR(100) NOT NULL,
+            intervention_name VARCHAR(255) NOT NULL,
+            phase VARCHAR(20) NOT NULL,
+            trial_count INT NOT NULL,
+            enrollment_sum BIGINT NOT NULL,
+            PRIMARY KEY (intervention_type, intervention_name, phase)
+        )
+    """),
+}
+
+# Summary table -> SELECT of the keys touched by the trials listed in {ids} ({year} etc. come from DIALECTS)
+AFFECTED_KEYS_SQL = {
+    'summary_trials': """
+        SELECT DISTINCT COALESCE(status, 'Unknown'), COALESCE(phase, 'N/A'), COALESCE({year}, 0)
+        FROM trials WHERE nct_id IN (SELECT nct_id FROM {ids})
+    """,
+    'summary_country': """
+        SELECT DISTINCT COALESCE(country, 'Unknown')
+        FROM locations WHERE nct_id IN (SELECT nct_id FROM {ids})
+    """,
+    'summary_conditions': """
+        SELECT DISTINCT COALESCE(condition_name, 'Unknown')
+        FROM conditions WHERE nct_id IN (SELECT nct_id FROM {ids})
+    """,
+    'summary_interventions': """
+        SELECT DISTINCT COALESCE(intervention_type, 'Unknown'), COALESCE(intervention_name, 'Unknown')
+        FROM interventions WHERE nct_id IN (SELECT nct_id FROM {ids})
+    """,
+}
+
+# Summary table -> (aggregation with a {join} placeholder for the affected keys, join condition).
+# Only trials has date columns, so {year} and {days} need no table alias.
+REBUILD_SQL = {
+    'summary_trials': ("""
+        INSERT INTO summary_trials
+        SELECT COALESCE(t.status, 'Unknown'), COALESCE(t.phase, 'N/A'), COALESCE({year}, 0),
+               COUNT(*),
+               COALESCE(SUM(t.enrollment), 0),
+               COALESCE(SUM(CASE WHEN t.start_date >= '2000-01-01' AND t.completion_date <= {today}
+                                 THEN {days} END), 0),
+               COUNT(CASE WHEN t.start_date >= '2000-01-01' AND t.completion_date <= {today} THEN 1 END)
+        FROM trials t
+        {join}
+        GROUP BY 1, 2, 3
+    """, """a.status = COALESCE(t.status, 'Unknown') AND a.phase = COALESCE(t.phase, 'N/A')
+            AND a.start_year = COALESCE({year}, 0)"""),
+    'summary_country': ("""
+        INSERT INTO summary_country
+        SELECT COALESCE(l.country, 'Unknown'), COALESCE(t.status, 'Unknown'),
+               COUNT(DISTINCT l.nct_id), COUNT(*)
+        FROM locations l
+        JOIN trials t ON t.nct_id = l.nct_id
+        {join}
+        GROUP BY 1, 2
+    """, "a.country = COALESCE(l.country, 'Unknown')"),
+    'summary_conditions': ("""
+        INSERT INTO summary_conditions
+        SELECT COALESCE(c.condition_name, 'Unknown'), COALESCE(t.phase, 'N/A'),
+               COUNT(DISTINCT c.nct_id), COALESCE(SUM(t.enrollment), 0)
+        FROM conditions c
+        JOIN trials t ON t.nct_id = c.nct_id
+        {join}
+        GROUP BY 1, 2
+    """, "a.condition_name = COALESCE(c.condition_name, 'Unknown')"),
+    'summary_interventions': ("""
+        INSERT INTO summary_interventions
+        SELECT COALESCE(i.intervention_type, 'Unknown'), COALESCE(i.intervention_name, 'Unknown'),
+               COALESCE(t.phase, 'N/A'), COUNT(DISTINCT i.nct_id), COALESCE(SUM(t.enrollment), 0)
+        FROM interventions i
+        JOIN trials t ON t.nct_id = i.nct_id
+        {join}
+        GROUP BY 1, 2, 3
+    """, """a.intervention_type = COALESCE(i.intervention_type, 'Unknown')
+            AND a.intervention_name = COALESCE(i.intervention_name, 'Unknown')"""),
+}
+
+def affected_name(summary):
+    return f"affected_{summary}"
+
+def key_columns(summary):
+    return [definition.split()[0] for definition in SUMMARY_DDL[summary][0].split(', ')]
+
+def create_summary_tables(cursor):
+    """Create the summary tables if missing (DDL commits, so call this before loading data)"""
+    for _, ddl in SUMMARY_DDL.values():
+        cursor.execute(ddl)
+
+def create_affected_key_tables(cursor, backend='mysql'):
+    """Create empty temporary tables that collect the summary keys touched by an import"""
+    for summary, (columns, _) in SUMMARY_DDL.items():
+        cursor.execute(DIALECTS[backend]['drop_temporary'].format(table=affected_name(summary)))
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {affected_name(summary)} (
+                {columns},
+                PRIMARY KEY ({', '.join(key_columns(summary))})
+            )
+        """)
+
+def capture_affected_keys(cursor, ids_table, backend='mysql'):
+    """Record the summary keys of the trials in ids_table as they are right now.
+
+    Call it before the merge (old keys) and after it (new keys), so groups a trial
+    moved out of are refreshed as well as the groups it moved into.
+    """
+    dialect = DIALECTS[backend]
+    for summary, sql in AFFECTED_KEYS_SQL.items():
+        cursor.execute(f"{dialect['insert_ignore']} INTO {affected_name(summary)} "
+                       + sql.format(ids=ids_table, **dialect))
+
+@metrics.stage('summaries')
+def refresh_summaries(cursor, incremental=False, backend='mysql'):
+    """Rebuild the summary tables, either fully or only for the captured affected keys"""
+    dialect = DIALECTS[backend]
+    for summary, (rebuild_sql, join_condition) in REBUILD_SQL.items():
+        summary_start = time.perf_counter()
+        if incremental:
+            keys = ', '.join(key_columns(summary))
+            cursor.execute(dialect['delete_keys'].format(
+                summary=summary, affected=affected_name(summary), keys=keys,
+                s_keys=', '.join('s.' + k for k in key_columns(summary)),
+                a_keys=', '.join('a.' + k for k in key_columns(summary))))
+            deleted = cursor.rowcount
+            join = f"JOIN {affected_name(summary)} a ON {join_condition.format(**dialect)}"
+            cursor.execute(rebuild_sql.format(join=join, **dialect))
+            print(f"📊 Refreshed {summary} for touched groups ({deleted:,} rows replaced by {cursor.rowcount:,}, keys: {keys})")
+        else:
+            # DELETE rather than TRUNCATE: TRUNCATE would commit the open transaction
+            cursor.execute(f"DELETE FROM {summary}")
+            cursor.execute(rebuild_sql.format(join="", **dialect))
+            print(f"📊 Rebuilt {summary} ({cursor.rowcount:,} rows)")
+        metrics.current().set(f'{summary}_seconds', round(time.perf_counter() - summary_start, 4))
\ No newline at end of file
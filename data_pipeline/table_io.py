@@ -0,0 +1,278 @@
+import csv
+import glob
+import importlib.util
+import os
+
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+# 'csv' (default) or 'parquet' for the intermediate files between pipeline stages
+PIPELINE_FORMAT = os.environ.get("PIPELINE_FORMAT", "csv")
+
+# Also write a CSV copy next to every Parquet file
+EXPORT_CSV = os.environ.get("PIPELINE_EXPORT_CSV", "0") == "1"
+
+# Line ending of every CSV the pipeline writes (to_csv would use os.linesep, \r\n on Windows).
+# SQL3's LOAD DATA path reads the files with the same terminator.
+CSV_LINE_TERMINATOR = "\n"
+
+# Explicit column types used for Parquet output. Low-cardinality columns are
+# dictionary-encoded as categoricals; dates and enrollment keep real null values.
+SCHEMAS = {
+    'trials': {
+        'nct_id': 'string',
+        'title': 'string',
+        'status': 'category',
+        'phase': 'category',
+        'study_type': 'category',
+        'sponsor': 'string',
+        'start_date': 'datetime64[ns]',
+        'completion_date': 'datetime64[ns]',
+        'enrollment': 'Int64',
+        'start_date_month_only': 'boolean',
+        'completion_date_month_only': 'boolean',
+        'sponsor_id': 'string'
+    },
+    'locations': {
+        'nct_id': 'string',
+        'country': 'category',
+        'state': 'category',
+        'city': 'string',
+        'facility': 'string',
+        'facility_id': 'string'
+    },
+    'conditions': {
+        'nct_id': 'string',
+        'condition': 'string',
+        'condition_category': 'category'
+    },
+    'interventions': {
+        'nct_id': 'string',
+        'intervention_type': 'category',
+        'intervention_name': 'string',
+        'intervention_category': 'category'
+    },
+    'taxonomy_categories': {
+        'kind': 'category',
+        'category': 'string',
+        'category_group': 'category'
+    }
+}
+
+# String values that mean "missing" once text has passed through astype(str)
+NULL_STRINGS = ['nan', 'Nan', 'NaN', 'NaT', 'None', '']
+
+# Strings read_csv turns into missing values by default. The columnar extract output
+# stores them as nulls, so the cleaners see the same values in either format.
+CSV_NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                 '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+# The only null sentinels of the MySQL-ready files: the ones apply_schema turns into nulls
+# before a Parquet write. Read with the read_csv defaults, the cleaner's 'N/A' phase would
+# load as NULL from CSV but as 'N/A' from Parquet.
+MYSQL_READY_NA_VALUES = NULL_STRINGS
+
+# Raw extract columns stored as integers in the columnar extract output (the rest is text)
+RAW_INT_COLUMNS = ['enrollment']
+
+def normalize_nulls(df):
+    """Turn every null sentinel string in the text columns into a real null, one column at a time"""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].mask(df[col].isin(NULL_STRINGS))
+        elif isinstance(df[col].dtype, pd.CategoricalDtype):
+            sentinels = [c for c in df[col].cat.categories if c in NULL_STRINGS]
+            if sentinels:
+                df[col] = df[col].cat.remove_categories(sentinels)
+    return df
+
+def parquet_available():
+    """True when a Parquet engine (pyarrow) is installed, without paying for its import"""
+    return importlib.util.find_spec('pyarrow') is not None
+
+def active_format():
+    """Format intermediate files are actually written in (CSV when pyarrow is missing)"""
+    if PIPELINE_FORMAT == 'parquet' and parquet_available():
+        return 'parquet'
+    return 'csv'
+
+def table_path(table, stage="", fmt=None):
+    """File name of a table at a pipeline stage, e.g. ('trials', 'mysql_ready') -> trials_mysql_ready.csv"""
+    fmt = fmt or PIPELINE_FORMAT
+    suffix = f"_{stage}" if stage else ""
+    return f"{table}{suffix}.{fmt}"
+
+def apply_schema(df, table):
+    """Cast the columns of a table to its explicit schema, turning null sentinels into real nulls"""
+    df = df.copy()
+    for col, dtype in SCHEMAS.get(table, {}).items():
+        if col not in df.columns:
+            continue
+        if dtype == 'datetime64[ns]':
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif dtype == 'Int64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+        elif dtype == 'boolean':
+            flags = df[col].astype('string').str.strip().str.lower()
+            df[col] = flags.map({'true': True, 'false': False, '1': True, '0': False}).astype('boolean')
+        else:
+            values = df[col].astype('string').str.strip()
+            df[col] = values.mask(values.isin(NULL_STRINGS)).astype(dtype)
+    return df
+
+def write_table(df, table, stage=""):
+    """Write a table in the configured intermediate format and return the file name"""
+    if PIPELINE_FORMAT == 'parquet' and parquet_available():
+        path = table_path(table, stage, 'parquet')
+        apply_schema(df, table).to_parquet(path, index=False)
+        if EXPORT_CSV:
+            df.to_csv(table_path(table, stage, 'csv'), index=False, lineterminator=CSV_LINE_TERMINATOR)
+        return path
+
+    if PIPELINE_FORMAT == 'parquet':
+        print("⚠️ pyarrow is not installed, writing CSV instead (pip install pyarrow)")
+    path = table_path(table, stage, 'csv')
+    df.to_csv(path, index=False, lineterminator=CSV_LINE_TERMINATOR)
+    return path
+
+def read_table(table, stage="", dtype=None):
+    """Read a table, preferring the configured format and falling back to CSV.
+
+    Parquet files are memory-mapped instead of parsed, and come back with the
+    dtypes they were written with. dtype only applies to CSV input, and MySQL-ready
+    CSV files only treat MYSQL_READY_NA_VALUES as missing.
+    """
+    parquet_file = table_path(table, stage, 'parquet')
+    if PIPELINE_FORMAT == 'parquet' and os.path.exists(parquet_file) and parquet_available():
+        return pd.read_parquet(parquet_file, memory_map=True)
+    if stage == 'mysql_ready':
+        return pd.read_csv(table_path(table, stage, 'csv'), dtype=dtype,
+                           keep_default_na=False, na_values=MYSQL_READY_NA_VALUES)
+    return pd.read_csv(table_path(table, stage, 'csv'), dtype=dtype)
+
+class ChunkWriter:
+    """Append DataFrame chunks to one table file without holding the whole table in memory"""
+
+    def __init__(self, table, stage=""):
+        self.table = table
+        self.use_parquet = PIPELINE_FORMAT == 'parquet' and parquet_available()
+        self.path = table_path(table, stage, 'parquet' if self.use_parquet else 'csv')
+        self.parquet_writer = None
+        self.first = True
+
+    def write(self, df):
+        if self.use_parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            # Category dictionaries differ between chunks, so chunks are stored as plain
+            # strings (Parquet still dictionary-encodes them on disk)
+            df = apply_schema(df, self.table)
+            df = df.astype({col: 'string' for col in df.columns
+                            if isinstance(df[col].dtype, pd.CategoricalDtype)})
+            schema = self.parquet_writer.schema if self.parquet_writer else None
+            arrow_table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.path, arrow_table.schema)
+            self.parquet_writer.write_table(arrow_table)
+        else:
+            df.to_csv(self.path, mode='w' if self.first else 'a', header=self.first, index=False,
+                      lineterminator=CSV_LINE_TERMINATOR)
+        self.first = False
+
+    def close(self):
+        if self.parquet_writer:
+            self.parquet_writer.close()
+
+def raw_array(values, column):
+    """Arrow array of one raw extract column, with CSV_NA_VALUES as nulls"""
+    import pyarrow as pa
+
+    if column in RAW_INT_COLUMNS:
+        numbers = [value if type(value) is int else
+                   int(value) if type(value) is str and value.strip().isdigit() else None
+                   for value in values]
+        return pa.array(numbers, pa.int64())
+    return pa.array([(None if value in CSV_NA_VALUES else value) if type(value) is str else str(value)
+                     for value in values], pa.string())
+
+class ColumnBlockWriter:
+    """Append blocks of column buffers ({column: [values]}) to one raw extract table.
+
+    CSV output goes through a single buffered csv.writer. Parquet output writes each
+    block as its own part file, so every flushed block survives a crash and a resumed
+    extract keeps adding parts; close(complete=True) joins them into the table file.
+    position() marks the end of the blocks written so far; appending with resume_at
+    set to a saved mark first drops whatever was written after it.
+    """
+
+    def __init__(self, table, header, stage="", append=False, resume_at=None):
+        self.table = table
+        self.header = header
+        self.use_parquet = active_format() == 'parquet'
+        self.path = table_path(table, stage, 'parquet' if self.use_parquet else 'csv')
+        self.file = None
+
+        if self.use_parquet:
+            self.part_pattern = self.path[:-len('.parquet')] + '.part{:05d}.parquet'
+            self.parts = sorted(glob.glob(self.path[:-len('.parquet')] + '.part*.parquet'))
+            keep = resume_at if append and resume_at is not None else len(self.parts) if append else 0
+            for part in self.parts[keep:]:
+                os.remove(part)
+            self.parts = self.parts[:keep]
+        else:
+            if append and resume_at is not None and os.path.exists(self.path):
+                os.truncate(self.path, resume_at)
+            write_header = not append or not os.path.exists(self.path)
+            self.file = open(self.path, "a" if append else "w", newline="", encoding="utf-8", buffering=1 << 20)
+            self.writer = csv.writer(self.file)
+            if write_header:
+                self.writer.writerow(header)
+
+    def write(self, columns):
+        """Write one block and push it to disk"""
+        if not columns[self.header[0]]:
+            return
+        if not self.use_parquet:
+            self.writer.writerows(zip(*(columns[column] for column in self.header)))
+            self.file.flush()
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        block = pa.table([raw_array(columns[column], column) for column in self.header], names=self.header)
+        part = self.part_pattern.format(len(self.parts))
+        pq.write_table(block, part + ".tmp")
+        os.replace(part + ".tmp", part)
+        self.parts.append(part)
+
+    def position(self):
+        """Bytes written (CSV) or parts written (Parquet) so far"""
+        if self.use_parquet:
+            return len(self.parts)
+        return os.path.getsize(self.path)
+
+    def close(self, complete=False):
+        """Close the table; complete=True also joins the Parquet parts into the table file"""
+        if self.file:
+            self.file.close()
+            self.file = None
+        if not (self.use_parquet and complete):
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(column, pa.int64() if column in RAW_INT_COLUMNS else pa.string())
+                            for column in self.header])
+        # Part by part, so joining never holds more than one block in memory
+        with pq.ParquetWriter(self.path + ".tmp", schema) as writer:
+            for part in self.parts:
+                writer.write_table(pq.read_table(part, schema=schema))
+        os.replace(self.path + ".tmp", self.path)
+        for part in self.parts:
+            os.remove(part)
+        self.parts = []
\ No newline at end of file
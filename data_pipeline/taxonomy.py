@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import unicodedata
+from collections import deque
+
+import metrics
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+# Synonym vocabulary: {table: {category group: {category: [synonyms]}}}
+TAXONOMY_FILE = os.environ.get("TAXONOMY_FILE",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "taxonomy.json"))
+
+# One automaton per table, built on first use in each process
+_automata = {}
+
+def text_key(text):
+    """Matching form of a name: lower case ASCII words separated and surrounded by single spaces.
+
+    "Lung Cancer, Non-Small Cell" -> " lung cancer non small cell ". The outer
+    spaces make every match start and end on a word boundary.
+    """
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    text = re.sub(r"['’]", '', text.replace('&', ' and '))
+    return f" {' '.join(re.findall(r'[a-z0-9]+', text))} "
+
+class Automaton:
+    """Aho-Corasick automaton over characters: finds every pattern in a text in one pass.
+
+    States form a trie of the patterns; each state's failure link points to the
+    state of its longest proper suffix that is also in the trie, so the scan never
+    steps back in the text. Every state remembers the longest pattern that ends
+    there, directly or through its failure links.
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.longest = [None]
+        for pattern, value in patterns.items():
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto[state][char] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.longest.append(None)
+                state = self.goto[state][char]
+            self.longest[state] = (len(pattern), value)
+
+        # Breadth first, so the failure target of a state is always finished before it
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.longest[child] is None:
+                    self.longest[child] = self.longest[self.fail[child]]
+
+    def longest_match(self, text):
+        """Value of the longest pattern found in text (the first one on ties), or None"""
+        goto, fail, longest = self.goto, self.fail, self.longest
+        state = 0
+        best = None
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match = longest[state]
+            if match is not None and (best is None or match[0] > best[0]):
+                best = match
+        return best[1] if best else None
+
+def load_vocabulary(path=None):
+    """The synonym vocabulary, or an empty one when the file does not exist"""
+    path = path or TAXONOMY_FILE
+    if not os.path.exists(path):
+        print(f"⚠️ No taxonomy vocabulary at {path}, categories stay empty")
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def build_automaton(vocabulary, table):
+    """Automaton of every synonym (and category name) of one table, each pointing at its category"""
+    patterns = {}
+    for categories in vocabulary.get(table, {}).values():
+        for category, synonyms in categories.items():
+            for synonym in [category] + synonyms:
+                key = text_key(synonym)
+                if patterns.setdefault(key, category) != category:
+                    print(f"⚠️ Taxonomy synonym '{synonym}' is listed under both "
+                          f"'{patterns[key]}' and '{category}', keeping the first")
+    return Automaton(patterns)
+
+def automaton(table):
+    if table not in _automata:
+        _automata[table] = build_automaton(load_vocabulary(), table)
+    return _automata[table]
+
+def classify(names, table):
+    """Category of every name in a Series (None when no synonym occurs in it).
+
+    Each distinct name is scanned once; the longest synonym found in it decides,
+    so "Non-Small Cell Lung Cancer" is not filed under the shorter "Lung Cancer".
+    """
+    codes, uniques = pd.factorize(names.astype(object).where(names.notna(), ''))
+    matcher = automaton(table)
+    categories = pd.Series([matcher.longest_match(text_key(str(name))) for name in uniques], dtype=object)
+
+    matched = int(categories.notna().sum())
+    metrics.current().add(f'{table}_classified_names', matched)
+    print(f"🏷️ {table}: {matched:,} of {len(uniques):,} distinct names classified "
+          f"into {categories.nunique():,} categories")
+    return pd.Series(categories.to_numpy()[codes], index=names.index, dtype=object)
+
+def lookup_table(path=None):
+    """One row per category for the optional taxonomy_categories table: kind (table), category, group"""
+    vocabulary = load_vocabulary(path)
+    rows = [(table, category, group)
+            for table, groups in vocabulary.items()
+            for group, categories in groups.items()
+            for category in categories]
+    return pd.DataFrame(rows, columns=['kind', 'category', 'category_group'])
\ No newline at end of file
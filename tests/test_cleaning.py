@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+import Clean_files
+import pipeline
+import table_io
+from name_cache import NameCache
+
+RAW = {
+    'locations': pd.DataFrame({
+        'nct_id': ['nct01', 'NCT02', 'NCT03', 'NCT04', 'NCT05', 'NCT06', 'NCT07', 'NCT08'],
+        'country': ['United States', 'Usa', 'United Kingdom', None, 'Germany', 'usa', 'Uk', 'Germany'],
+        'state': ['Massachusetts', 'massachusetts', None, None, 'Bavaria', 'Texas', None, 'Bavaria'],
+        'city': ['Boston', 'boston', 'London', None, 'Munich', 'Houston', 'london', 'Munich'],
+        'facility': ['General Hospital', 'General Hospital Inc.', "St Thomas' Hospital", None,
+                     'Klinikum Rechts der Isar', 'MD Anderson', "St. Thomas Hospital", 'Klinikum rechts der Isar'],
+    }),
+    'conditions': pd.DataFrame({
+        'nct_id': ['NCT01', 'NCT01', 'NCT02', 'NCT03', 'nct01', 'NCT04', 'NCT02', 'NCT05'],
+        'condition': ['Stroke', 'NSCLC', 'asthma', '', 'stroke', None, 'Asthma ', 'Breast Cancer'],
+    }),
+}
+
+def mysql_ready_rows(table):
+    df = table_io.read_table(table, 'mysql_ready')
+    return df.astype('string').fillna('<null>').values.tolist()
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+@pytest.mark.parametrize('table', ['locations', 'conditions'])
+def test_chunked_cleaning_writes_the_same_rows_as_whole_table_cleaning(table, fmt, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(table_io, 'PIPELINE_FORMAT', fmt)
+    monkeypatch.setattr(Clean_files, 'name_cache', NameCache(None))
+    raw = RAW[table].astype('string')
+    if fmt == 'parquet':
+        raw.to_parquet(table_io.table_path(table, fmt='parquet'), index=False)
+    else:
+        raw.to_csv(table_io.table_path(table, fmt='csv'), index=False)
+
+    monkeypatch.setattr(Clean_files, 'CLEAN_CHUNK_ROWS', 0)
+    whole_count = pipeline.run_clean_stage(table)
+    whole = mysql_ready_rows(table)
+
+    monkeypatch.setattr(Clean_files, 'CLEAN_CHUNK_ROWS', 3)
+    assert pipeline.run_clean_stage(table) == whole_count
+    assert mysql_ready_rows(table) == whole
@@ -0,0 +1,27 @@
+import pandas as pd
+
+import entity_resolution
+
+def entity_ids(df, name_column, block_columns, **kwargs):
+    resolved = entity_resolution.resolve_entities(df, name_column, block_columns, 'test', 'entity_id', **kwargs)
+    return resolved['entity_id'].tolist()
+
+def test_non_latin_names_keep_their_own_entities():
+    hospitals = ['北京协和医院', '北京大学第一医院', '北京天坛医院', '中国医学科学院肿瘤医院']
+    df = pd.DataFrame({'country': 'China', 'city': 'Beijing', 'facility': hospitals + ['北京协和医院']})
+    ids = entity_ids(df, 'facility', ['country', 'city'])
+    assert len(set(ids[:4])) == 4
+    assert ids[4] == ids[0]
+
+    sponsors = ['中山大学', '复旦大学', '浙江大学', 'Пироговский университет', 'Первый МГМУ им. Сеченова']
+    assert len(set(entity_ids(pd.DataFrame({'sponsor': sponsors}), 'sponsor', [], prefix_block=True))) == 5
+
+def test_accented_spellings_still_merge():
+    df = pd.DataFrame({'sponsor': ['Hôpital Necker-Enfants Malades', 'HOPITAL NECKER ENFANTS MALADES',
+                                   'Пироговский Университет', 'пироговский университет']})
+    ids = entity_ids(df, 'sponsor', [], prefix_block=True)
+    assert ids[0] == ids[1] and ids[2] == ids[3] and ids[0] != ids[2]
+
+def test_names_without_a_usable_key_are_never_merged():
+    df = pd.DataFrame({'country': 'China', 'city': 'Beijing', 'facility': ['Inc.', '---', 'Ltd', '中山大学']})
+    assert len(set(entity_ids(df, 'facility', ['country', 'city']))) == 4
@@ -0,0 +1,62 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import clinicaltrials_extract
+import table_io
+
+def endless_pages(params, session, limiter):
+    while True:
+        yield [{'protocolSection': {}}], None
+
+def test_consumer_error_stops_the_slice_workers(monkeypatch):
+    monkeypatch.setattr(clinicaltrials_extract, "fetch_pages", endless_pages)
+    monkeypatch.setattr(clinicaltrials_extract, "REQUESTS_PER_SECOND", 0)
+
+    def consume():
+        pages = clinicaltrials_extract.fetch_pages_concurrent(slices=['A', 'B', 'C'], concurrency=2)
+        try:
+            for _ in pages:
+                raise ValueError("writer failed")
+        except ValueError:
+            pages.close()
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    consumer.join(timeout=10)
+    assert not consumer.is_alive(), "fetch_pages_concurrent hung after the consumer failed"
+
+def write_extract(rows, suffix, fmt):
+    for table, header in clinicaltrials_extract.TABLE_HEADERS.items():
+        df = pd.DataFrame(rows.get(table, []), columns=header, dtype="string")
+        if fmt == "parquet":
+            df.to_parquet(table_io.table_path(table, suffix, "parquet"), index=False)
+        else:
+            df.to_csv(table_io.table_path(table, suffix, "csv"), index=False)
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_delta_merge_replaces_the_child_rows_of_each_changed_study(fmt, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trial = ["", "", "", "", "", "", "", ""]
+    ward = ["US", "MA", "Boston", "General Hospital"]
+    write_extract({
+        "trials": [["NCT1", *trial], ["NCT2", *trial]],
+        "locations": [["NCT1", *ward], ["NCT2", *ward], ["NCT2", "US", "NY", "Albany", "Old Clinic"]],
+    }, "", fmt)
+    # NCT2 lists the same site twice, and its page was fetched a second time after a resume
+    page = {"trials": [["NCT2", *trial], ["NCT3", *trial]],
+            "locations": [["NCT2", *ward], ["NCT2", *ward], ["NCT3", *ward]]}
+    write_extract({table: rows + rows for table, rows in page.items()}, "delta", fmt)
+
+    if fmt == "parquet":
+        clinicaltrials_extract.merge_delta_columnar()
+        read = pd.read_parquet
+    else:
+        clinicaltrials_extract.merge_delta_files()
+        read = pd.read_csv
+    trials = read(table_io.table_path("trials", fmt=fmt))
+    locations = read(table_io.table_path("locations", fmt=fmt))
+    assert trials["nct_id"].tolist() == ["NCT1", "NCT2", "NCT3"]
+    assert locations["nct_id"].tolist() == ["NCT1", "NCT2", "NCT2", "NCT3"]
+    assert locations["facility"].tolist() == ["General Hospital"] * 4
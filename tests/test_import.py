@@ -0,0 +1,111 @@
+import sqlite3
+
+import pandas as pd
+
+import db
+import SQL3
+import summary_tables
+import table_io
+
+MYSQL_READY = {
+    'trials': pd.DataFrame({
+        'nct_id': ['NCT00000001', 'NCT00000002', 'NCT00000003'],
+        'title': ['Aspirin in stroke', 'NA', None],
+        'status': ['Completed', 'Recruiting', 'Unknown'],
+        'phase': ['Phase 2', 'N/A', 'N/A'],
+        'study_type': ['Interventional', 'Observational', 'Interventional'],
+        'sponsor': ['Acme', 'Unknown', 'NULL'],
+        'start_date': ['2020-01-15', None, '2019-06-01'],
+        'completion_date': ['2021-03-01', '2022-05-01', None],
+        'enrollment': [120, None, 40],
+        'start_date_month_only': [False, None, True],
+        'completion_date_month_only': [True, False, None],
+        'sponsor_id': ['s1', 's2', 's3'],
+    }),
+    'locations': pd.DataFrame({
+        'nct_id': ['NCT00000001', 'NCT00000002'], 'country': ['United States', 'Namibia'],
+        'state': ['NA', None], 'city': ['Boston', 'Windhoek'], 'facility': ['N/A', 'Central Hospital'],
+        'facility_id': ['f1', 'f2'],
+    }),
+    'conditions': pd.DataFrame({
+        'nct_id': ['NCT00000001', 'NCT00000003'], 'condition': ['Stroke', 'n/a'],
+        'condition_category': ['Cardiovascular', None],
+    }),
+    'interventions': pd.DataFrame({
+        'nct_id': ['NCT00000001'], 'intervention_type': ['Drug'], 'intervention_name': ['Aspirin'],
+        'intervention_category': ['Drug'],
+    }),
+}
+
+# NCT00000001 only: it moves to phase 3, has one site elsewhere and no conditions or interventions
+DELTA = {
+    'trials': MYSQL_READY['trials'].iloc[[0]].assign(phase='Phase 3'),
+    'locations': MYSQL_READY['locations'].iloc[[0]].assign(country='Canada', city='Toronto'),
+    'conditions': MYSQL_READY['conditions'].iloc[:0],
+    'interventions': MYSQL_READY['interventions'].iloc[:0],
+}
+
+def use_database(directory, monkeypatch, fmt='csv', mode='insert'):
+    """Point the import at a SQLite file in directory, reading and writing files there"""
+    monkeypatch.chdir(directory)
+    monkeypatch.setattr(table_io, 'PIPELINE_FORMAT', fmt)
+    monkeypatch.setattr(SQL3, 'IMPORT_MODE', mode)
+    monkeypatch.setattr(db, '_pool', None)
+    monkeypatch.setenv('DB_BACKEND', 'sqlite')
+    monkeypatch.setenv('DB_DATABASE', str(directory / 'trials.sqlite'))
+
+def import_tables(tables):
+    """Write MySQL-ready files of tables, import them and return every row of the database"""
+    for table, df in tables.items():
+        table_io.write_table(df, table, 'mysql_ready')
+    assert SQL3.import_mysql_ready_files()
+    connection = sqlite3.connect('trials.sqlite')
+    rows = {table: connection.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall() for table in SQL3.TABLES}
+    connection.close()
+    return rows
+
+def import_as(fmt, tmp_path, monkeypatch):
+    directory = tmp_path / fmt
+    directory.mkdir()
+    use_database(directory, monkeypatch, fmt)
+    return import_tables(MYSQL_READY)
+
+def test_csv_and_parquet_files_import_the_same_rows(tmp_path, monkeypatch):
+    csv_rows = import_as('csv', tmp_path, monkeypatch)
+    parquet_rows = import_as('parquet', tmp_path, monkeypatch)
+    assert csv_rows == parquet_rows
+    phases = [row[3] for row in csv_rows['trials']]
+    assert phases == ['Phase 2', 'N/A', 'N/A']
+
+def summary_rows(connection):
+    return {summary: connection.execute(f"SELECT * FROM {summary} ORDER BY 1, 2, 3").fetchall()
+            for summary in summary_tables.SUMMARY_DDL}
+
+def test_upsert_is_idempotent_and_replaces_changed_studies(tmp_path, monkeypatch):
+    use_database(tmp_path, monkeypatch, mode='upsert')
+    first = import_tables(MYSQL_READY)
+    assert import_tables(MYSQL_READY) == first
+
+    rows = import_tables(DELTA)
+    assert [row[3] for row in rows['trials']] == ['Phase 3', 'N/A', 'N/A']
+    assert [(row[0], row[3]) for row in rows['locations']] == [('NCT00000001', 'Toronto'), ('NCT00000002', 'Windhoek')]
+    assert [row[0] for row in rows['conditions']] == ['NCT00000003']
+    assert rows['interventions'] == []
+    assert import_tables(DELTA) == rows
+
+def test_summaries_after_a_delta_import_match_a_full_rebuild(tmp_path, monkeypatch):
+    use_database(tmp_path, monkeypatch, mode='upsert')
+    import_tables(MYSQL_READY)
+    import_tables(DELTA)
+
+    connection = sqlite3.connect('trials.sqlite')
+    refreshed = summary_rows(connection)
+    summary_tables.refresh_summaries(connection.cursor(), backend='sqlite')
+    assert summary_rows(connection) == refreshed
+    connection.close()
+
+    # The trial left its (Completed, Phase 2, 2020) group and its United States site
+    assert ('Completed', 'Phase 3', 2020, 1, 120, 411, 1) in refreshed['summary_trials']
+    assert not [row for row in refreshed['summary_trials'] if row[1] == 'Phase 2']
+    assert [row[0] for row in refreshed['summary_country']] == ['Canada', 'Namibia']
+    assert [row[:2] for row in refreshed['summary_conditions']] == [('n/a', 'N/A')]
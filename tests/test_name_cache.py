@@ -0,0 +1,43 @@
+import json
+
+import pandas as pd
+
+from name_cache import NameCache, read_synonyms
+
+def title(values):
+    return values.str.strip().str.title()
+
+def test_synonym_edits_apply_to_cached_names(tmp_path):
+    path = tmp_path / "name_cache.json"
+    cache = NameCache(str(path))
+    assert cache.canonicalize(pd.Series(['md anderson']), 'sponsor', title).tolist() == ['Md Anderson']
+    cache.save()
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["synonyms"] = {'sponsor': {'Md Anderson': 'MD Anderson Cancer Center'}}
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+    cache = NameCache(str(path))
+    result = cache.canonicalize(pd.Series(['md anderson', 'MD ANDERSON']), 'sponsor', title)
+    assert result.tolist() == ['MD Anderson Cancer Center'] * 2
+    assert cache.hits == 1
+
+    # Removing the rule brings the cached name back
+    data["synonyms"] = {}
+    path.write_text(json.dumps(data), encoding="utf-8")
+    assert NameCache(str(path)).canonicalize(pd.Series(['md anderson']), 'sponsor', title).tolist() == ['Md Anderson']
+
+def test_read_synonyms_matches_the_full_load(tmp_path):
+    path = tmp_path / "name_cache.json"
+    cache = NameCache(str(path))
+    cache.canonicalize(pd.Series([f'site {i}' for i in range(2000)]), 'facility', title)
+    cache._synonyms = {'sponsor': {'Md Anderson': 'MD Anderson Cancer Center', 'Nci': 'National Cancer Institute'}}
+    cache.save()
+    assert read_synonyms(str(path), block_size=16) == NameCache(str(path)).synonyms == cache.synonyms
+
+    # Hand-edited files may list the entries first
+    data = json.loads(path.read_text(encoding="utf-8"))
+    path.write_text(json.dumps({'entries': data['entries'], 'version': data['version'],
+                                'synonyms': data['synonyms']}, indent=2), encoding="utf-8")
+    assert read_synonyms(str(path), block_size=64) == cache.synonyms
+    assert read_synonyms(str(tmp_path / "missing.json")) == {}
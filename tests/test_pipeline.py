@@ -0,0 +1,67 @@
+import pipeline
+from pipeline import Stage
+
+runs = []
+
+def shout(source, target):
+    runs.append(target)
+    with open(source, encoding="utf-8") as f:
+        text = f.read().strip().upper()
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def join(target, *sources):
+    runs.append(target)
+    with open(target, "w", encoding="utf-8") as out:
+        for source in sources:
+            with open(source, encoding="utf-8") as f:
+                out.write(f.read() + "\n")
+
+def small_dag():
+    stages = [
+        Stage('a', shout, args=('a.txt', 'a.out'), inputs=['a.txt'], outputs=['a.out']),
+        Stage('b', shout, args=('b.txt', 'b.out'), inputs=['b.txt'], outputs=['b.out']),
+        Stage('both', join, args=('both.out', 'a.out', 'b.out'), deps=['a', 'b'],
+              inputs=['a.out', 'b.out'], outputs=['both.out']),
+    ]
+    return {stage.name: stage for stage in stages}
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def use_small_dag(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, 'PIPELINE_STATE_FILE', str(tmp_path / 'state.json'))
+    monkeypatch.setattr(pipeline, 'build_stages', small_dag)
+    write('a.txt', 'alpha')
+    write('b.txt', 'beta')
+    runs.clear()
+
+def test_second_run_skips_every_stage(tmp_path, monkeypatch):
+    use_small_dag(tmp_path, monkeypatch)
+    assert pipeline.run_pipeline(workers=2) == {'a': 'ran', 'b': 'ran', 'both': 'ran'}
+    assert pipeline.plan_pipeline() == {'a': None, 'b': None, 'both': None}
+
+    runs.clear()
+    assert pipeline.run_pipeline(workers=2) == {'a': 'skipped', 'b': 'skipped', 'both': 'skipped'}
+    assert runs == []
+    assert pipeline.run_pipeline(force=['b'], workers=2) == {'a': 'skipped', 'b': 'ran', 'both': 'skipped'}
+
+def test_only_stages_whose_inputs_changed_run_again(tmp_path, monkeypatch):
+    use_small_dag(tmp_path, monkeypatch)
+    pipeline.run_pipeline(workers=2)
+
+    write('a.txt', 'alpha, again')
+    assert pipeline.plan_pipeline() == {'a': "code, settings or inputs changed", 'b': None,
+                                        'both': "dependency runs"}
+    assert pipeline.run_pipeline(workers=2) == {'a': 'ran', 'b': 'skipped', 'both': 'ran'}
+
+    # a runs again but writes the same file, so both is still up to date
+    write('a.txt', 'ALPHA, AGAIN\n')
+    assert pipeline.run_pipeline(workers=2) == {'a': 'ran', 'b': 'skipped', 'both': 'skipped'}
+
+    # An output edited or deleted by hand is rebuilt
+    write('both.out', 'edited')
+    assert pipeline.plan_pipeline()['both'] == "outputs changed"
+    assert pipeline.run_pipeline(workers=2)['both'] == 'ran'